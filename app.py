@@ -1,19 +1,57 @@
 import contextlib
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
+from config import DB_DRAIN_TIMEOUT, Constants
+from db_control import (
+    AccessDB,
+    BaseDB,
+    ChangeLog,
+    CredentialsDB,
+    PermaLimitDB,
+    PlayerCharDB,
+    TimedLimitDB,
+    TimedLimitExpiry,
+    UserProvisioningDB,
+    WriteQueueFull,
+)
+from metrics import HTTPMetricsMiddleware
+from router.changes_api import router as changes_api_router
 from router.info_api import router as info_api_router
+from router.list_api import router as list_api_router
+from router.metrics_api import router as metrics_api_router
 from router.overlord_api import router as overlord_api_router
 from router.user_api import router as user_api_router
 
 
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
+    for db in (CredentialsDB, AccessDB, PermaLimitDB, TimedLimitDB, PlayerCharDB):
+        db.set_up()
+    UserProvisioningDB.set_up()
+
+    AccessDB.warm()
+    Constants.start()
+    TimedLimitExpiry.start()
+    ChangeLog.start()
+
     try:
         yield
 
     finally:
-        pass
+        # Файлы БД закрываются, даже если остановка или дренаж упали
+        try:
+            await Constants.stop()
+            await TimedLimitExpiry.stop()
+            await BaseDB.drain_all(DB_DRAIN_TIMEOUT)
+
+        finally:
+            try:
+                await ChangeLog.stop()
+
+            finally:
+                BaseDB.close_all()
 
 
 app = FastAPI(
@@ -22,7 +60,21 @@ app = FastAPI(
     redoc_url=None,
     openapi_url=None,
 )
+app.add_middleware(HTTPMetricsMiddleware)
+
+
+@app.exception_handler(WriteQueueFull)
+async def write_queue_full(request: Request, exc: WriteQueueFull):
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
 
 app.include_router(info_api_router)
 app.include_router(user_api_router)
+app.include_router(list_api_router)
 app.include_router(overlord_api_router)
+app.include_router(changes_api_router)
+app.include_router(metrics_api_router)
@@ -0,0 +1,103 @@
+"""
+Общие помощники микро-бенчмарков. Скрипты запускаются из корня репозитория:
+python bench/<name>.py, БД создаются во временном каталоге.
+"""
+
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def parse_args(description: str, **defaults: int | float) -> argparse.Namespace:
+    """--n и прочие числовые параметры с умолчаниями из defaults"""
+    parser = argparse.ArgumentParser(description=description)
+    for name, value in defaults.items():
+        flag = f"--{name.replace('_', '-')}"
+        parser.add_argument(flag, type=type(value), default=value)
+
+    return parser.parse_args()
+
+
+def sample(fn: Callable[[], object], n: int, warmup: int = 100) -> list[float]:
+    """Время каждого из n вызовов fn в секундах"""
+    for _ in range(warmup):
+        fn()
+
+    out = []
+    perf = time.perf_counter
+    for _ in range(n):
+        start = perf()
+        fn()
+        out.append(perf() - start)
+
+    return out
+
+
+async def asample(
+    fn: Callable[[], Awaitable[object]],
+    n: int,
+    warmup: int = 100,
+) -> list[float]:
+    """sample для корутин, вызовы идут по очереди в одном event loop"""
+    for _ in range(warmup):
+        await fn()
+
+    out = []
+    perf = time.perf_counter
+    for _ in range(n):
+        start = perf()
+        await fn()
+        out.append(perf() - start)
+
+    return out
+
+
+def summary(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50": ordered[len(ordered) // 2],
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        "mean": statistics.fmean(ordered),
+    }
+
+
+def report(name: str, samples: list[float]) -> dict[str, float]:
+    stats = summary(samples)
+    print(
+        f"{name:<44} p50 {stats['p50'] * 1e6:9.1f} us"
+        f"   p99 {stats['p99'] * 1e6:9.1f} us"
+        f"   mean {stats['mean'] * 1e6:9.1f} us"
+    )
+    return stats
+
+
+def report_total(name: str, count: int, seconds: float) -> None:
+    rate = count / seconds
+    print(f"{name:<44} {count} ops in {seconds * 1e3:8.1f} ms ({rate:,.0f}/s)")
+
+
+@contextlib.contextmanager
+def temp_dbs(*dbs) -> Iterator[Path]:
+    """Каталог data/dbs во временной папке и set_up переданных БД"""
+    from db_control import BaseDB
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="spf-bench-") as tmp:
+        os.chdir(tmp)
+        try:
+            for db in dbs:
+                db.set_up()
+            yield Path(tmp)
+
+        finally:
+            BaseDB.close_all()
+            os.chdir(cwd)
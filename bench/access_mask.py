@@ -0,0 +1,103 @@
+"""
+Права доступа: JSON в access (как до маски) против целочисленной маски.
+Проверка одного права в памяти, AccessDB.has через пул и через warm-кэш,
+размер хранимых данных и ленивый перевод старых строк на маску.
+"""
+
+import asyncio
+import json
+import random
+import sys
+
+from _util import parse_args, report, sample, temp_dbs
+
+from config import AccessKeys
+from db_control import AccessDB, SQLTask
+
+_ALL = AccessKeys.ALL.value[0]
+
+
+def _legacy(ids: list[int]) -> None:
+    """Строки в формате до миграции: JSON в access и mask = NULL"""
+    futures = []
+    for id in ids:
+        access = {x.value[0]: random.random() < 0.5 for x in AccessKeys}
+        futures.append(
+            AccessDB.submit_write(
+                SQLTask(
+                    "INSERT INTO access (id, version, access) VALUES (?, 0, ?)",
+                    (id, json.dumps(access).encode()),
+                )
+            )
+        )
+    for future in futures:
+        future.result()
+
+
+def _legacy_left() -> int:
+    with AccessDB.read() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM access WHERE mask IS NULL"
+        ).fetchone()[0]
+
+
+def main() -> int:
+    args = parse_args(__doc__, users=10_000, n=20_000)
+    ids = list(range(1, args.users + 1))
+    key = AccessKeys.UPDATE_ACCESS
+
+    with temp_dbs(AccessDB):
+        AccessDB._perms = None
+        _legacy(ids)
+
+        with AccessDB.read() as conn:
+            raw = conn.execute("SELECT access FROM access WHERE id = 1").fetchone()[0]
+            json_bytes = conn.execute(
+                "SELECT AVG(length(access)) FROM access"
+            ).fetchone()[0]
+
+        mask = AccessKeys.to_mask(json.loads(raw))
+        print("decode + check one key, in memory")
+        report(
+            "json.loads + lookup (old)",
+            sample(
+                lambda: (access := json.loads(raw)).get(_ALL)
+                or access.get(key.value[0]),
+                args.n,
+            ),
+        )
+        bits = AccessKeys.ALL.bit | key.bit
+        report("mask & bit", sample(lambda: mask & bits, args.n))
+
+        # Первое чтение каждой строки ставит её перевод в очередь записи
+        for id in ids:
+            AccessDB.has(id, key)
+        asyncio.run(AccessDB.flush())
+        left = _legacy_left()
+        print(f"legacy rows left after one read of each: {left} of {len(ids)}")
+
+        with AccessDB.read() as conn:
+            mask_bytes = conn.execute(
+                "SELECT AVG(length(access)) FROM access"
+            ).fetchone()[0]
+        print(
+            f"stored access per row: JSON {json_bytes:.0f} bytes (old),"
+            f" now {mask_bytes:.0f} bytes of blob + an integer mask"
+        )
+
+        print("AccessDB.has")
+        report(
+            "pooled read",
+            sample(lambda: AccessDB.has(random.choice(ids), key), args.n),
+        )
+        AccessDB.warm()
+        report(
+            "warm cache",
+            sample(lambda: AccessDB.has(random.choice(ids), key), args.n),
+        )
+
+    return 1 if left else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
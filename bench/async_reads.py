@@ -0,0 +1,88 @@
+"""
+Синхронные чтения прямо в корутине (как до run_read) против run_read.
+Быстрые клиенты крутят поиск по id, пока медленные держат долгий запрос;
+считаются выполненные быстрые запросы и их задержка.
+"""
+
+import asyncio
+import time
+
+from _util import parse_args, summary, temp_dbs
+
+from db_control import CredentialsDB
+
+_SLOW = """
+    WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+    SELECT COUNT(*) FROM n
+"""
+
+
+def _fast(id: int) -> None:
+    with CredentialsDB.read() as conn:
+        conn.execute("SELECT * FROM credentials WHERE id = ?", (id,)).fetchone()
+
+
+def _slow(rows: int) -> None:
+    with CredentialsDB.read() as conn:
+        conn.execute(_SLOW, (rows,)).fetchone()
+
+
+async def _run(on_loop: bool, args) -> None:
+    async def call(func, *a) -> None:
+        if on_loop:
+            func(*a)
+            await asyncio.sleep(0)
+
+        else:
+            await CredentialsDB.run_read(func, *a)
+
+    deadline = time.monotonic() + args.seconds
+    latencies: list[float] = []
+
+    async def fast_client(n: int) -> None:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            await call(_fast, n % 100 + 1)
+            latencies.append(time.perf_counter() - start)
+
+    async def slow_client() -> None:
+        while time.monotonic() < deadline:
+            await call(_slow, args.slow_rows)
+
+    await asyncio.gather(
+        *(fast_client(n) for n in range(args.fast_clients)),
+        *(slow_client() for _ in range(args.slow_clients)),
+    )
+
+    stats = summary(latencies)
+    name = "sync read on the loop (old)" if on_loop else "run_read"
+    print(
+        f"{name:<30} fast requests {len(latencies):7}"
+        f"   p50 {stats['p50'] * 1e3:7.2f} ms"
+        f"   max {max(latencies) * 1e3:7.1f} ms"
+    )
+
+
+def main() -> None:
+    args = parse_args(
+        __doc__,
+        seconds=2,
+        fast_clients=20,
+        slow_clients=2,
+        slow_rows=1_000_000,
+    )
+
+    with temp_dbs(CredentialsDB):
+        for future in [CredentialsDB.create(f"d{i}", None) for i in range(100)]:
+            future.result()
+
+        start = time.perf_counter()
+        _slow(args.slow_rows)
+        print(f"slow query alone: {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+        asyncio.run(_run(True, args))
+        asyncio.run(_run(False, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Итоговые лимиты: PermaLimitDB.get + сумма list_active на каждого пользователя
+(как до EffectiveLimits) против EffectiveLimits.get и get_many на весь набор.
+Перед замером результаты обоих способов сверяются.
+"""
+
+import random
+import sys
+import time
+
+from _util import parse_args, report, report_total, sample, temp_dbs
+
+from db_control import EffectiveLimits, PermaLimitDB, TimedLimitDB
+
+
+def _naive(id: int, now: int) -> dict[str, int]:
+    perma = PermaLimitDB.get(id) or {
+        "char_slot": 0,
+        "lore_char_slot": 0,
+        "weight_bytes": 0,
+    }
+    active = TimedLimitDB.list_active(id, now)
+
+    return {
+        "id": id,
+        "char_slot": perma["char_slot"] + sum(r["char_slot"] for r in active),
+        "lore_char_slot": perma["lore_char_slot"],
+        "weight_bytes": perma["weight_bytes"]
+        + sum(r["weight_bytes"] for r in active),
+    }
+
+
+def main() -> int:
+    args = parse_args(__doc__, users=2_000, rows=10, n=5_000)
+    ids = list(range(1, args.users + 1))
+
+    with temp_dbs(PermaLimitDB, TimedLimitDB):
+        now = int(time.time())
+        futures = []
+        for id in ids:
+            futures.append(PermaLimitDB.create(id, 2, 1, 1_000))
+            for i in range(args.rows):
+                # Часть строк уже истекла, часть помечена expired
+                expired = now + 3_600 if i % 3 else now - 60
+                status = "expired" if i % 5 == 0 else "active"
+                futures.append(
+                    TimedLimitDB.create(id, 1, 100, expired, status=status)
+                )
+        for future in futures:
+            future.result()
+
+        effective = EffectiveLimits.get_many(ids, now)
+        for id in ids:
+            if _naive(id, now) != effective[id]:
+                print(f"FAIL: mismatch for user {id}")
+                return 1
+
+        report(
+            "PermaLimitDB.get + sum(list_active) (old)",
+            sample(lambda: _naive(random.choice(ids), now), args.n),
+        )
+        report(
+            "EffectiveLimits.get",
+            sample(lambda: EffectiveLimits.get(random.choice(ids), now), args.n),
+        )
+
+        start = time.perf_counter()
+        for id in ids:
+            _naive(id, now)
+        report_total("all users, naive (old)", len(ids), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        EffectiveLimits.get_many(ids, now)
+        report_total("EffectiveLimits.get_many", len(ids), time.perf_counter() - start)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
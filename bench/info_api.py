@@ -0,0 +1,87 @@
+"""
+/users/info/*: стоимость сериализации тела и запроса целиком (200 и 304).
+--max-respond-us задаёт потолок p50 для _StaticJSON.respond,
+при превышении скрипт завершается с кодом 1.
+"""
+
+import asyncio
+import json
+import sys
+
+import httpx
+from _util import asample, parse_args, report, sample
+from fastapi import FastAPI
+from starlette.requests import Request
+
+from config import USER_GET_TYPE, AccessKeys
+from router import info_api
+
+
+def _request(if_none_match: str | None = None) -> Request:
+    headers = []
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+async def _http(n: int) -> None:
+    app = FastAPI()
+    app.include_router(info_api.router)
+    etag = {"If-None-Match": info_api._INFO_ACCESS.etag}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+        for name, path, headers in (
+            ("GET /users/info/access 200", "/users/info/access", None),
+            ("GET /users/info/access 304", "/users/info/access", etag),
+            ("GET /users/info/user_get_type 200", "/users/info/user_get_type", None),
+        ):
+            report(name, await asample(lambda: client.get(path, headers=headers), n))
+
+
+def main() -> int:
+    args = parse_args(__doc__, n=20_000, http_n=2_000, max_respond_us=0.0)
+
+    print("serialization")
+    report(
+        "rebuild + json.dumps (per request, old)",
+        sample(
+            lambda: json.dumps(
+                {
+                    "all_access_keys": AccessKeys.get_all_access_keys(),
+                    "base_access": AccessKeys.get_base_access(),
+                },
+                ensure_ascii=False,
+            ),
+            args.n,
+        ),
+    )
+
+    fresh, revalidate = _request(), _request(info_api._INFO_ACCESS.etag)
+    respond = report(
+        "_StaticJSON.respond 200",
+        sample(lambda: info_api._INFO_ACCESS.respond(fresh), args.n),
+    )
+    report(
+        "_StaticJSON.respond 304",
+        sample(lambda: info_api._INFO_ACCESS.respond(revalidate), args.n),
+    )
+    report(
+        "user_get_type json.dumps (per request, old)",
+        sample(lambda: json.dumps(USER_GET_TYPE), args.n),
+    )
+
+    print("http (in-process ASGI)")
+    asyncio.run(_http(args.http_n))
+
+    limit = args.max_respond_us
+    if limit and respond["p50"] * 1e6 > limit:
+        print(f"FAIL: respond p50 above {limit} us")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
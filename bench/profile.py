@@ -0,0 +1,97 @@
+"""
+UserProfileDB.get_profile: отдельные чтения из каждой БД (DB_ATTACH=0)
+против одного JOIN по ATTACH (DB_ATTACH=1). Холодный замер - первый профиль
+после закрытия пулов чтения, тёплый - на уже открытых соединениях.
+Перед замером ответы обоих путей сверяются.
+"""
+
+import random
+import sys
+import time
+from collections.abc import Callable
+
+from _util import parse_args, report, sample, temp_dbs
+
+from db_control import (
+    AccessDB,
+    CredentialsDB,
+    PermaLimitDB,
+    PlayerCharDB,
+    TimedLimitDB,
+    UserProfileDB,
+)
+
+_DBS = (CredentialsDB, AccessDB, PermaLimitDB, TimedLimitDB, PlayerCharDB)
+
+
+def _fill(users: int, now: int) -> list[int]:
+    ids = [
+        future.result().lastrowid
+        for future in [CredentialsDB.create(f"d{i}", f"s{i}") for i in range(users)]
+    ]
+
+    futures = []
+    for id in ids:
+        futures.append(AccessDB.create(id))
+        futures.append(PermaLimitDB.create(id, 2, 1, 1_000))
+        for i in range(3):
+            futures.append(TimedLimitDB.create(id, 1, 100, now + 3_600 + i))
+            futures.append(
+                PlayerCharDB.create(id, f"char{i}", "norm", [f"content{i}"])
+            )
+    for future in futures:
+        future.result()
+
+    return ids
+
+
+def _cold(
+    get: Callable[[int, int], object],
+    ids: list[int],
+    now: int,
+    n: int,
+) -> list[float]:
+    samples = []
+    for _ in range(n):
+        for db in (*_DBS, UserProfileDB):
+            db.close_read_pool()
+
+        id = random.choice(ids)
+        start = time.perf_counter()
+        get(id, now)
+        samples.append(time.perf_counter() - start)
+
+    return samples
+
+
+def main() -> int:
+    args = parse_args(__doc__, users=2_000, n=5_000, cold_n=200)
+
+    with temp_dbs(*_DBS):
+        AccessDB._perms = None
+        now = int(time.time())
+        ids = _fill(args.users, now)
+
+        split = UserProfileDB._get_profile_split
+        joined = UserProfileDB._get_profile_joined
+
+        for id in ids:
+            if split(id, now) != joined(id, now):
+                print(f"FAIL: profiles differ for user {id}")
+                return 1
+
+        for name, get in (
+            ("split (DB_ATTACH=0)", split),
+            ("joined (DB_ATTACH=1)", joined),
+        ):
+            report(f"{name} cold pool", _cold(get, ids, now, args.cold_n))
+            report(
+                f"{name} warm",
+                sample(lambda: get(random.choice(ids), now), args.n),
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
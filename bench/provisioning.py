@@ -0,0 +1,148 @@
+"""
+Создание и удаление пользователя: отдельные записи в очереди каждой БД
+(CredentialsDB.create ради id, затем AccessDB и PermaLimitDB; удаление -
+по очереди на каждую из 5 БД) против одной записи UserProvisioningDB.
+Замеры по одному пользователю подряд и пачкой конкурентных запросов.
+Если UserProvisioningDB где-то не быстрее, скрипт завершается с кодом 1.
+"""
+
+import asyncio
+import sys
+import time
+
+from _util import parse_args, report, report_total, temp_dbs
+
+from db_control import (
+    AccessDB,
+    CredentialsDB,
+    PermaLimitDB,
+    PlayerCharDB,
+    SQLTask,
+    TimedLimitDB,
+    UserProvisioningDB,
+)
+
+_DBS = (CredentialsDB, AccessDB, PermaLimitDB, TimedLimitDB, PlayerCharDB)
+
+_LABELS = (
+    "create, sequential",
+    "delete, sequential",
+    "create, concurrent",
+    "delete, concurrent",
+)
+
+
+async def _create_separate(discord_id: str) -> int:
+    id = (await CredentialsDB.create(discord_id, None)).lastrowid
+    await asyncio.gather(
+        AccessDB.create(id, 0, {"update_note": True}),
+        PermaLimitDB.create(id, 2, 1, 1_000),
+    )
+    return id
+
+
+async def _create_provision(discord_id: str) -> int:
+    future = UserProvisioningDB.create(
+        discord_id,
+        access={"update_note": True},
+        char_slot=2,
+        lore_char_slot=1,
+        weight_bytes=1_000,
+    )
+    return (await future).lastrowid
+
+
+async def _delete_separate(id: int) -> None:
+    await asyncio.gather(
+        PlayerCharDB.submit_write(
+            SQLTask("DELETE FROM player_char_db WHERE id = ?", (id,))
+        ),
+        PlayerCharDB.submit_write(
+            SQLTask("DELETE FROM player_char_weight WHERE id = ?", (id,))
+        ),
+        TimedLimitDB.submit_write(
+            SQLTask("DELETE FROM timed_limit WHERE id = ?", (id,))
+        ),
+        PermaLimitDB.delete(id),
+        AccessDB.delete(id),
+        CredentialsDB.delete(id),
+    )
+
+
+async def _delete_provision(id: int) -> None:
+    await UserProvisioningDB.delete(id)
+
+
+async def _sequential(op, args: list) -> tuple[list, list[float]]:
+    out, samples = [], []
+    for arg in args:
+        start = time.perf_counter()
+        out.append(await op(arg))
+        samples.append(time.perf_counter() - start)
+
+    return out, samples
+
+
+async def _concurrent(op, args: list) -> tuple[list, float]:
+    start = time.perf_counter()
+    out = await asyncio.gather(*(op(arg) for arg in args))
+    return out, time.perf_counter() - start
+
+
+async def _run(args) -> list[float]:
+    """Доли времени UserProvisioningDB от отдельных записей по _LABELS"""
+    n, batch = args.n, args.batch
+    modes = (
+        ("separate writes (old)", _create_separate, _delete_separate),
+        ("UserProvisioningDB", _create_provision, _delete_provision),
+    )
+
+    # Прогрев соединений воркеров и пулов чтения
+    for _, create, delete in modes:
+        for i in range(50):
+            await delete(await create(f"warm-{create.__name__}-{i}"))
+
+    # Время на пользователя: p50 подряд и среднее в конкурентной пачке
+    per_user: dict[str, list[float]] = {}
+
+    for name, create, delete in modes:
+        ids, samples = await _sequential(create, [f"{name}-s{i}" for i in range(n)])
+        create_p50 = report(f"create, sequential: {name}", samples)["p50"]
+        _, samples = await _sequential(delete, ids)
+        delete_p50 = report(f"delete, sequential: {name}", samples)["p50"]
+        per_user[name] = [create_p50, delete_p50]
+
+    for name, create, delete in modes:
+        ids, seconds = await _concurrent(create, [f"{name}-c{i}" for i in range(batch)])
+        report_total(f"create, concurrent: {name}", batch, seconds)
+        per_user[name].append(seconds / batch)
+        _, seconds = await _concurrent(delete, ids)
+        report_total(f"delete, concurrent: {name}", batch, seconds)
+        per_user[name].append(seconds / batch)
+
+    (old_name, old), (new_name, new) = per_user.items()
+    shares = [after / before for before, after in zip(old, new)]
+
+    print(f"{new_name} time as a share of {old_name}:")
+    for label, share in zip(_LABELS, shares):
+        print(f"  {label:<20} {share:5.2f}x")
+
+    return shares
+
+
+def main() -> int:
+    args = parse_args(__doc__, n=1_000, batch=2_000)
+
+    with temp_dbs(*_DBS, UserProvisioningDB):
+        AccessDB._perms = None
+        shares = asyncio.run(_run(args))
+
+    if max(shares) >= 1:
+        print("FAIL: provisioning is not faster than separate writes")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+BaseDB.read: соединение на каждое чтение (как до ReadPool) против пула.
+Индексный поиск по id в credentials, кэш CredentialsDB не участвует.
+"""
+
+import random
+import sqlite3
+
+from _util import parse_args, report, sample, temp_dbs
+
+from db_control import CredentialsDB
+
+_LOOKUP = "SELECT id, discord_id, steam64_id, dirty FROM credentials WHERE id = ?"
+
+
+def main() -> None:
+    args = parse_args(__doc__, users=10_000, n=20_000)
+
+    with temp_dbs(CredentialsDB):
+        futures = [
+            CredentialsDB.create(f"d{i}", f"s{i}") for i in range(args.users)
+        ]
+        for future in futures:
+            future.result()
+
+        path = str(CredentialsDB._db_path())
+
+        def fresh() -> None:
+            conn = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("PRAGMA busy_timeout=5000;")
+            conn.execute(_LOOKUP, (random.randint(1, args.users),)).fetchone()
+            conn.close()
+
+        def pooled() -> None:
+            with CredentialsDB.read() as conn:
+                conn.execute(_LOOKUP, (random.randint(1, args.users),)).fetchone()
+
+        report("connect + PRAGMA per read (old)", sample(fresh, args.n))
+        report("ReadPool", sample(pooled, args.n))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
+import asyncio
 import logging
+import os
+import time
 from enum import Enum
 from pathlib import Path
 from typing import Literal
@@ -7,92 +10,188 @@ import httpx
 
 log = logging.getLogger(__name__)
 
-OVERLORD_SOCKET = Path("/run/spf/overlord.sock")
+OVERLORD_SOCKET = Path(os.environ.get("SPF_OVERLORD_SOCKET", "/run/spf/overlord.sock"))
+OVERLORD_REFRESH_INTERVAL = float(os.environ.get("SPF_OVERLORD_REFRESH", "60"))
+"""Как часто перечитывать конфиг Overlord, секунды"""
 USER_GET_TYPE = ["id", "discord", "steam64"]
 USER_GET_TYPE_L = Literal["id", "discord", "steam64"]
 
+DB_ATTACH = os.environ.get("SPF_DB_ATTACH", "0") == "1"
+"""Читать профиль одним запросом через соединение с ATTACH всех БД пользователя"""
+
+DB_JOURNAL = os.environ.get("SPF_DB_JOURNAL", "0") == "1"
+"""Журналировать принятые записи на диск и доигрывать их при старте"""
+DB_DRAIN_TIMEOUT = float(os.environ.get("SPF_DB_DRAIN_TIMEOUT", "10"))
+"""Сколько секунд ждать досброса очередей записи при остановке"""
+
 
 class Constants:
+    """
+    Конфиг от Overlord. Читатели всегда получают текущий снимок сразу,
+    обновление идёт в фоне: раз в _refresh_interval и при чтении устаревшего
+    снимка (stale-while-revalidate). Запросы ревалидируются по ETag, при ошибке
+    Overlord остаётся последний удачный снимок.
+    """
+
     _data: dict[str, str] = {}
+    _etag: str | None = None
+    _fetched_at: float | None = None
+    """time.monotonic() последнего удачного ответа (200 или 304)"""
+
+    _socket: Path = OVERLORD_SOCKET
+    _url = "http://overlord/config"
+    _refresh_interval: float = OVERLORD_REFRESH_INTERVAL
+
+    _client: httpx.AsyncClient | None = None
+    _task: asyncio.Task | None = None
+    _revalidating: asyncio.Task | None = None
 
     @classmethod
-    async def req_from_over(cls) -> None:
-        transport = httpx.AsyncHTTPTransport(uds=str(OVERLORD_SOCKET))
+    def _get_client(cls) -> httpx.AsyncClient:
+        if cls._client is None:
+            cls._client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=str(cls._socket), retries=1),
+                timeout=5.0,
+            )
+
+        return cls._client
+
+    @classmethod
+    async def req_from_over(cls) -> bool:
+        """Один запрос к Overlord, True - снимок подтверждён или обновлён"""
+        headers = {"If-None-Match": cls._etag} if cls._etag else {}
 
         try:
-            async with httpx.AsyncClient(
-                transport=transport,
-                timeout=5.0,
-            ) as client:
-                resp = await client.get("http://overlord/config")
+            resp = await cls._get_client().get(cls._url, headers=headers)
+
+            if resp.status_code == 304:
+                cls._fetched_at = time.monotonic()
+                return True
 
             if resp.status_code != 200:
-                log.warning(
-                    "Overlord returned %s for %s",
-                    resp.status_code,
-                    "http://overlord/config",
-                )
-                cls._data = {}
+                log.warning("Overlord returned %s for %s", resp.status_code, cls._url)
+                return False
 
-            cls._data = resp.json()
+            data = resp.json()
+            if not isinstance(data, dict):
+                log.warning("Overlord returned non-object config: %r", data)
+                return False
+
+            cls._data = data
+            cls._etag = resp.headers.get("etag")
+            cls._fetched_at = time.monotonic()
+            return True
 
         except httpx.ConnectError:
-            log.warning("Overlord socket not available: %s", OVERLORD_SOCKET)
-            cls._data = {}
+            log.warning("Overlord socket not available: %s", cls._socket)
 
         except httpx.TimeoutException:
-            log.warning("Overlord request timeout: %s", "http://overlord/config")
-            cls._data = {}
+            log.warning("Overlord request timeout: %s", cls._url)
 
         except Exception as exc:
-            log.exception(
-                "Unexpected error while fetching %s: %s",
-                "http://overlord/config",
-                exc,
+            log.exception("Unexpected error while fetching %s: %s", cls._url, exc)
+
+        return False
+
+    @classmethod
+    def is_stale(cls) -> bool:
+        return (
+            cls._fetched_at is None
+            or time.monotonic() - cls._fetched_at > cls._refresh_interval
+        )
+
+    @classmethod
+    def _revalidate_in_background(cls) -> None:
+        if cls._revalidating is not None and not cls._revalidating.done():
+            return
+
+        try:
+            cls._revalidating = asyncio.get_running_loop().create_task(
+                cls.req_from_over()
             )
-            cls._data = {}
+
+        except RuntimeError:
+            # Чтение вне event loop, обновит фоновая задача
+            pass
 
     @classmethod
     def get_all_const(cls) -> dict[str, str]:
+        """Никогда не ждёт Overlord, устаревший снимок отдаётся и обновляется в фоне"""
+        if cls._task is not None and cls.is_stale():
+            cls._revalidate_in_background()
+
         return cls._data
 
+    @classmethod
+    async def _loop(cls) -> None:
+        while True:
+            await cls.req_from_over()
+            await asyncio.sleep(cls._refresh_interval)
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.create_task(cls._loop())
+
+    @classmethod
+    async def stop(cls) -> None:
+        for task in (cls._task, cls._revalidating):
+            if task is None:
+                continue
+
+            task.cancel()
+            try:
+                await task
+
+            except asyncio.CancelledError:
+                pass
+
+        cls._task = None
+        cls._revalidating = None
+
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+
 
 class AccessKeys(Enum):
     """
     Енум с базовыми правами и доступами
     value[0] - ключ
     value[1] - значение по умолчанию
+    value[2] - номер бита в маске прав, хранится в БД, поэтому его нельзя
+    менять или переиспользовать
     """
 
-    ALL = "all_access", False
+    ALL = "all_access", False, 0
     """Позволяет байпасать абсолютно все права"""
 
-    CREATE_USER = "create_user", False
+    CREATE_USER = "create_user", False, 1
     """Позволяет создавать пользователя"""
-    UPDATE_USER = "update_user", False
+    UPDATE_USER = "update_user", False, 2
     """Позволяет обновлять пользователя"""
-    DELETE_USER = "delete_user", False
+    DELETE_USER = "delete_user", False, 3
     """Позволяет удалять пользователя"""
 
-    UPDATE_TIMED_LIMIT = "update_timed_limit", False
+    UPDATE_TIMED_LIMIT = "update_timed_limit", False, 4
     """Позволяет менять временный лимит"""
-    UPDATE_PERMA_LIMIT = "update_perma_limit", False
+    UPDATE_PERMA_LIMIT = "update_perma_limit", False, 5
     """Позволяет менять перманентный лимит"""
 
-    CREATE_DB_CHAR = "create_db_char", False
+    CREATE_DB_CHAR = "create_db_char", False, 6
     """Позволяет создавать персонажей игрока"""
-    UPDATE_DB_CHAR = "update_db_char", False
+    UPDATE_DB_CHAR = "update_db_char", False, 7
     """Позволяет обновлять персонажей игрока"""
-    DELETE_DB_CHAR = "delete_db_char", False
+    DELETE_DB_CHAR = "delete_db_char", False, 8
     """Позволяет удалять персонажей игрока"""
 
-    UPDATE_ACCESS = "update_access", False
+    UPDATE_ACCESS = "update_access", False, 9
     """Позволяет менять доступ"""
 
-    UPDATE_NOTE = "update_note", False
+    UPDATE_NOTE = "update_note", False, 10
     """Позволяет апдейтить записи людей"""
 
-    UPDATE_BLACK_LIST = "update_black_list", False
+    UPDATE_BLACK_LIST = "update_black_list", False, 11
     """Позволяет обновлять чёрный список"""
 
     @classmethod
@@ -102,3 +201,25 @@ class AccessKeys(Enum):
     @classmethod
     def get_base_access(cls) -> dict[str, bool]:
         return {x.value[0]: x.value[1] for x in list(cls)}
+
+    @property
+    def bit(self) -> int:
+        return 1 << self.value[2]
+
+    @classmethod
+    def to_mask(cls, access: dict[str, bool]) -> int:
+        """Неизвестные ключи отбрасываются"""
+        mask = 0
+        for x in cls:
+            if access.get(x.value[0]):
+                mask |= x.bit
+
+        return mask
+
+    @classmethod
+    def from_mask(cls, mask: int) -> dict[str, bool]:
+        return {x.value[0]: bool(mask & x.bit) for x in cls}
+
+    @classmethod
+    def get_base_mask(cls) -> int:
+        return cls.to_mask(cls.get_base_access())
@@ -0,0 +1,13 @@
+from .admis import AccessDB
+from .base_db import BaseDB, SQLTask, WriteQueueFull
+from .change_log import ChangeLog
+from .game import PlayerCharDB, PlayerCharType
+from .limit import (
+    EffectiveLimits,
+    PermaLimitDB,
+    TimedLimitDB,
+    TimedLimitExpiry,
+    TimedLimitStatus,
+    WeightBudget,
+)
+from .user_base import CredentialsDB, UserProfileDB, UserProvisioningDB
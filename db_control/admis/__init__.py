@@ -0,0 +1 @@
+from .access_db import AccessDB
@@ -1,15 +1,48 @@
 import json
+import logging
+import threading
+from collections.abc import Callable
 from queue import Queue
 from typing import Any
 
-from ..base_db import BaseDB, SQLTask
+from config import AccessKeys
+
+from ..base_db import BaseDB, SQLTask, WriteFuture
+
+_ALL_BIT = AccessKeys.ALL.bit
 
 
 class AccessDB(BaseDB):
+    """
+    Права хранятся битовой маской (см. AccessKeys.value[2]) в колонке mask.
+    Старые строки с JSON в access и mask = NULL переводятся на маску
+    при первом чтении.
+
+    После warm() все права держатся в памяти ({id: (version, mask)}),
+    чтения идут из неё, а записи обновляют её после коммита.
+    """
+
     _db_name = "access"
 
     _worker_started: bool = False
-    _queue = Queue()
+    _queue: Queue | None = None
+
+    _perms: dict[int, tuple[int, int]] | None = None
+    _perms_lock = threading.Lock()
+    _perms_epoch: int = 0
+    """Растёт на каждой записи, прошедшей через _on_commit, см. warm"""
+    _WARM_ATTEMPTS = 3
+
+    _migrations = [
+        [
+            SQLTask(
+                "CREATE INDEX IF NOT EXISTS idx_access_version ON access (version);"
+            ),
+        ],
+        [
+            SQLTask("ALTER TABLE access ADD COLUMN mask INTEGER;"),
+        ],
+    ]
 
     @classmethod
     def set_up(cls) -> None:
@@ -26,24 +59,50 @@ class AccessDB(BaseDB):
         ]
         super()._init_db(sql_t)
 
+    @classmethod
+    def _resolve_mask(cls, id: int, mask: int | None, raw_access: bytes) -> int:
+        if mask is not None:
+            return mask
+
+        try:
+            mask = AccessKeys.to_mask(json.loads(raw_access))
+
+        except Exception:
+            logging.exception(f"DB {cls._db_name} broken access json for {id}")
+            mask = 0
+
+        cls.submit_write(
+            SQLTask(
+                """
+                UPDATE access
+                SET mask = ?, access = x''
+                WHERE id = ? AND mask IS NULL
+                """,
+                (mask, id),
+                key=id,
+            )
+        )
+        return mask
+
     @classmethod
     def create(
         cls,
         id: int,
         version: int = 0,
         access: dict[str, bool] | None = None,
-    ) -> None:
-        payload = json.dumps(access or {}, ensure_ascii=False)
+    ) -> WriteFuture:
+        mask = AccessKeys.to_mask(access or {})
 
-        cls.submit_write(
+        future = cls.submit_write(
             SQLTask(
                 """
-                INSERT INTO access (id, version, access)
-                VALUES (?, ?, ?)
+                INSERT INTO access (id, version, mask, access)
+                VALUES (?, ?, ?, x'')
                 """,
-                (id, version, payload),
+                (id, version, mask),
             )
         )
+        return cls._on_commit(future, lambda perms: perms.update({id: (version, mask)}))
 
     @classmethod
     def update(
@@ -51,24 +110,27 @@ class AccessDB(BaseDB):
         id: int,
         version: int | None = None,
         access: dict[str, bool] | None = None,
-    ) -> None:
+    ) -> WriteFuture:
         fields = []
         params: list[Any] = []
+        mask = None
 
         if version is not None:
             fields.append("version = ?")
             params.append(version)
 
         if access is not None:
-            fields.append("access = ?")
-            params.append(json.dumps(access, ensure_ascii=False))
+            mask = AccessKeys.to_mask(access)
+            fields.append("mask = ?")
+            fields.append("access = x''")
+            params.append(mask)
 
         if not fields:
-            return
+            return WriteFuture.resolved()
 
         params.append(id)
 
-        cls.submit_write(
+        future = cls.submit_write(
             SQLTask(
                 f"""
                 UPDATE access
@@ -76,19 +138,161 @@ class AccessDB(BaseDB):
                 WHERE id = ?
                 """,
                 tuple(params),
+                key=id,
             )
         )
 
+        def apply(perms: dict[int, tuple[int, int]]) -> None:
+            old = perms.get(id)
+            if old is None:
+                return
+
+            perms[id] = (
+                old[0] if version is None else version,
+                old[1] if mask is None else mask,
+            )
+
+        return cls._on_commit(future, apply)
+
     @classmethod
-    def delete(cls, id: int) -> None:
-        cls.submit_write(SQLTask("DELETE FROM access WHERE id = ?", (id,)))
+    def delete(cls, id: int) -> WriteFuture:
+        future = cls.submit_write(
+            SQLTask("DELETE FROM access WHERE id = ?", (id,), key=id)
+        )
+        return cls._on_commit(future, lambda perms: perms.pop(id, None))
 
     @classmethod
-    def get(cls, id: int) -> dict[str, Any] | None:
-        with cls.read() as conn:
+    def reversion(
+        cls,
+        from_version: int,
+        to_version: int,
+        access: dict[str, bool] | None = None,
+        grant: dict[str, bool] | None = None,
+    ) -> WriteFuture:
+        """
+        Переводит всех пользователей с from_version на to_version одним UPDATE.
+        access - заменить права целиком, grant - добавить права к уже выданным,
+        например grant=AccessKeys.get_base_access() для новых прав по умолчанию.
+        """
+        if access is not None and grant is not None:
+            raise ValueError("access and grant are mutually exclusive")
+
+        # Маски в SQL недоступны для строк, ещё хранящих JSON
+        with cls.read("reversion") as conn:
+            cur = conn.execute(
+                """
+                SELECT id, access
+                FROM access
+                WHERE version = ? AND mask IS NULL
+                """,
+                (from_version,),
+            )
+            legacy = cur.fetchall()
+
+        for id_, raw_access in legacy:
+            cls._resolve_mask(id_, None, raw_access)
+
+        fields = ["version = ?"]
+        params: list[Any] = [to_version]
+        set_mask = None
+        grant_mask = 0
+
+        if access is not None:
+            set_mask = AccessKeys.to_mask(access)
+            fields.append("mask = ?")
+            params.append(set_mask)
+
+        if grant is not None:
+            grant_mask = AccessKeys.to_mask(grant)
+            fields.append("mask = mask | ?")
+            params.append(grant_mask)
+
+        params.append(from_version)
+
+        future = cls.submit_write(
+            SQLTask(
+                f"""
+                UPDATE access
+                SET {", ".join(fields)}
+                WHERE version = ?
+                """,
+                tuple(params),
+            )
+        )
+
+        def apply(perms: dict[int, tuple[int, int]]) -> None:
+            for id_, (ver, mask) in perms.items():
+                if ver != from_version:
+                    continue
+
+                if set_mask is not None:
+                    mask = set_mask
+
+                perms[id_] = (to_version, mask | grant_mask)
+
+        return cls._on_commit(future, apply)
+
+    @classmethod
+    def _on_commit(
+        cls,
+        future: WriteFuture,
+        apply: Callable[[dict[int, tuple[int, int]]], Any],
+    ) -> WriteFuture:
+        def hook(fut: WriteFuture) -> None:
+            if fut.cancelled() or fut.exception() is not None:
+                return
+
+            with cls._perms_lock:
+                cls._perms_epoch += 1
+                if cls._perms is not None:
+                    apply(cls._perms)
+
+        future.add_done_callback(hook)
+        return future
+
+    @classmethod
+    def _scan_perms(cls) -> dict[int, tuple[int, int]]:
+        with cls.read("warm") as conn:
+            cur = conn.execute("SELECT id, version, mask, access FROM access")
+            return {
+                id_: (ver, cls._resolve_mask(id_, mask, raw_access))
+                for id_, ver, mask, raw_access in cur
+            }
+
+    @classmethod
+    def warm(cls) -> int:
+        """
+        Загружает права всех пользователей в память одним проходом.
+        Если за время прохода сработал хук записи, проход повторяется:
+        хук обновил старую карту, а в снимке этой записи может не быть.
+        """
+        for _ in range(cls._WARM_ATTEMPTS):
+            epoch = cls._perms_epoch
+            perms = cls._scan_perms()
+
+            with cls._perms_lock:
+                if cls._perms_epoch == epoch:
+                    cls._perms = perms
+                    return len(perms)
+
+        # Записи не прекращаются: проход под локом, хуки дождутся новой карты.
+        # Повтор хука поверх снимка, уже содержащего его запись, ничего не меняет
+        with cls._perms_lock:
+            cls._perms = perms = cls._scan_perms()
+
+        return len(perms)
+
+    @classmethod
+    def get_mask(cls, id: int) -> int | None:
+        perms = cls._perms
+        if perms is not None:
+            entry = perms.get(id)
+            return None if entry is None else entry[1]
+
+        with cls.read("get_mask") as conn:
             cur = conn.execute(
                 """
-                SELECT id, version, access
+                SELECT mask, access
                 FROM access
                 WHERE id = ?
                 """,
@@ -99,16 +303,49 @@ class AccessDB(BaseDB):
         if row is None:
             return None
 
-        try:
-            access_data = json.loads(row[2])
+        return cls._resolve_mask(id, row[0], row[1])
 
-        except Exception:
-            access_data = {}
+    @classmethod
+    def has(cls, id: int, key: AccessKeys) -> bool:
+        """Проверка одного права с учётом AccessKeys.ALL"""
+        mask = cls.get_mask(id)
+        if mask is None:
+            return False
+
+        return bool(mask & (_ALL_BIT | key.bit))
+
+    @classmethod
+    def get(cls, id: int) -> dict[str, Any] | None:
+        perms = cls._perms
+        if perms is not None:
+            entry = perms.get(id)
+            if entry is None:
+                return None
+
+            return {
+                "id": id,
+                "version": entry[0],
+                "access": AccessKeys.from_mask(entry[1]),
+            }
+
+        with cls.read("get") as conn:
+            cur = conn.execute(
+                """
+                SELECT id, version, mask, access
+                FROM access
+                WHERE id = ?
+                """,
+                (id,),
+            )
+            row = cur.fetchone()
+
+        if row is None:
+            return None
 
         return {
             "id": row[0],
             "version": row[1],
-            "access": access_data,
+            "access": AccessKeys.from_mask(cls._resolve_mask(row[0], row[2], row[3])),
         }
 
     @classmethod
@@ -116,10 +353,10 @@ class AccessDB(BaseDB):
         cls,
         version: int = 0,
     ) -> list[dict[str, Any]]:
-        with cls.read() as conn:
+        with cls.read("get_by_version") as conn:
             cur = conn.execute(
                 """
-                SELECT id, version, access
+                SELECT id, version, mask, access
                 FROM access
                 WHERE version = ?
                 """,
@@ -127,21 +364,25 @@ class AccessDB(BaseDB):
             )
             rows = cur.fetchall()
 
-        out: list[dict[str, Any]] = []
-
-        for id_, ver, raw_access in rows:
-            try:
-                access_data = json.loads(raw_access)
+        return [
+            {
+                "id": id_,
+                "version": ver,
+                "access": AccessKeys.from_mask(
+                    cls._resolve_mask(id_, mask, raw_access)
+                ),
+            }
+            for id_, ver, mask, raw_access in rows
+        ]
 
-            except Exception:
-                access_data = {}
+    @classmethod
+    async def aget(cls, id: int) -> dict[str, Any] | None:
+        return await cls.run_read(cls.get, id)
 
-            out.append(
-                {
-                    "id": id_,
-                    "version": ver,
-                    "access": access_data,
-                }
-            )
+    @classmethod
+    async def aget_by_version(cls, version: int = 0) -> list[dict[str, Any]]:
+        return await cls.run_read(cls.get_by_version, version)
 
-        return out
+    @classmethod
+    async def ahas(cls, id: int, key: AccessKeys) -> bool:
+        return await cls.run_read(cls.has, id, key)
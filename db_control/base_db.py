@@ -1,28 +1,231 @@
+import asyncio
+import json
 import logging
 import sqlite3
-from collections.abc import Sequence
+import time
+from collections.abc import AsyncIterator, Callable, Iterable, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
+from functools import partial
 from pathlib import Path
-from queue import Queue
-from threading import Thread
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from typing import Any, Literal
+
+from config import DB_JOURNAL
+from metrics import Counter, Histogram, register_collector
+
+from .change_log import ChangeLog, parse_write
+from .read_pool import ReadPool
 
 _DB_DIR = Path("data/dbs")
 
+_READ_SECONDS = Histogram(
+    "spf_db_read_seconds",
+    "Время внутри BaseDB.read() по БД и читающему методу",
+    ("db", "method"),
+)
+_WRITE_SECONDS = Histogram(
+    "spf_db_write_seconds",
+    "Время транзакции записи: batch - пачка воркера, single - одна задача",
+    ("db", "mode"),
+)
+_BUSY_TOTAL = Counter(
+    "spf_db_busy_total",
+    "SQLITE_BUSY/SQLITE_LOCKED, оставшиеся после busy_timeout",
+    ("db", "path"),
+)
+
+
+def _count_busy(db: str, path: str, exc: BaseException) -> None:
+    code = getattr(exc, "sqlite_errorcode", 0) & 0xFF
+    if code in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED):
+        _BUSY_TOTAL.inc(db, path)
+
+
+_MARK_APPLIED = "UPDATE _journal_applied SET seq = ? WHERE id = 0;"
+
+OverflowPolicy = Literal["block", "reject", "spill"]
+
+
+class WriteQueueFull(Exception):
+    """Очередь записи переполнена, запись не принята"""
+
 
 @dataclass(frozen=True)
 class SQLTask:
     sql: str
     params: Sequence | None = None
+    key: Any = None
+    """
+    Первичный ключ (или список ключей) затронутых строк для ChangeLog.
+    Для INSERT без key берётся lastrowid, иначе изменение пишется на всю таблицу.
+    """
+
+
+@dataclass(frozen=True)
+class WriteResult:
+    lastrowid: int | None
+    rowcount: int
+
+
+class WriteFuture(Future):
+    """
+    Результат записи из очереди воркера.
+    Можно ждать синхронно через result() или через await в корутине.
+    """
+
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
+
+    @classmethod
+    def resolved(cls, result: WriteResult | None = None) -> "WriteFuture":
+        fut = cls()
+        fut.set_result(result or WriteResult(lastrowid=None, rowcount=0))
+        return fut
+
+
+@dataclass(frozen=True)
+class _PendingWrite:
+    task: SQLTask | None
+    """None - барьер, резолвится после коммита всего, что стояло перед ним"""
+    future: WriteFuture
+    enqueued: float = field(default_factory=time.monotonic)
+    jseq: int | None = None
+    """Номер в журнале записи, если он включён"""
+
+
+def _dump_task(task: SQLTask) -> tuple[str, str, str]:
+    return task.sql, json.dumps(list(task.params or ())), json.dumps(task.key)
+
+
+def _load_task(sql: str, params: str, key: str | None) -> SQLTask:
+    return SQLTask(sql, json.loads(params), None if key is None else json.loads(key))
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+
+    except RuntimeError:
+        return False
+
+    return True
+
+
+def _resolve(
+    future: WriteFuture,
+    result: WriteResult | None = None,
+    exc: BaseException | None = None,
+) -> None:
+    # Ожидающий мог отменить future, запись при этом всё равно выполнена
+    if future.done():
+        return
+
+    if exc is not None:
+        future.set_exception(exc)
+
+    else:
+        future.set_result(result)
+
+
+@dataclass
+class WriteStats:
+    tasks: int = 0
+    failed: int = 0
+    batches: int = 0
+    batch_fallbacks: int = 0
+    max_batch: int = 0
+    commit_seconds: float = 0.0
+    last_commit_seconds: float = 0.0
+    max_commit_seconds: float = 0.0
+    rejected: int = 0
+    spilled: int = 0
+    waited: int = 0
+    """Записей, ждавших места в очереди в потоке _handoff, а не у вызвавшего"""
+    retried: int = 0
+    """Повторов пачки, упавшей целиком, см. _retry_delay"""
 
 
 class BaseDB:
     _db_name: str = ""
 
+    _migrations: list[list[SQLTask]] = []
+    """
+    Миграции схемы по порядку, применяются поверх set_up.
+    Версия БД (PRAGMA user_version) - число применённых миграций,
+    поэтому существующие элементы списка менять нельзя, только дописывать новые.
+    """
+
+    _batch_size: int = 512
+    """Максимум задач в одной транзакции воркера"""
+    _batch_budget: float = 0.05
+    """Сколько секунд воркер может набирать пачку из очереди"""
+
+    _queue_maxsize: int = 10_000
+    """Предел очереди записи, после него срабатывает _overflow"""
+    _overflow: OverflowPolicy = "block"
+    """
+    block - ждать места до _block_timeout, затем WriteQueueFull,
+    из event loop ожидание идёт в отдельном потоке (см. _submit);
+    reject - сразу WriteQueueFull;
+    spill - дописывать задачи в файл {db}.spill.db, воркер дочитает их по порядку.
+    В файл попадает только хвост сверх очереди: задачи, уже стоящие в памяти,
+    при падении процесса теряются, если не включён _journal.
+    """
+    _block_timeout: float = 5.0
+    _retry_delay: float = 1.0
+    """
+    Пауза перед повтором пачки из журнала или файла переполнения,
+    если она упала не на отдельной задаче (сбой ROLLBACK, ошибка диска)
+    """
+
+    _journal: bool = DB_JOURNAL
+    """
+    Каждая принятая запись сначала дописывается в {db}.journal.db.
+    Номер последней применённой записи хранится в самой БД (_journal_applied)
+    и обновляется в той же транзакции, поэтому при старте доигрываются
+    ровно непримененные записи.
+    """
+
+    _read_workers: int = 8
+    """Размер общего пула потоков для async-чтений"""
+
+    _registry: list[type["BaseDB"]] = []
+    _read_executor: ThreadPoolExecutor | None = None
+    _read_pool: ReadPool | None = None
+    _write_stats: WriteStats
+    _inflight_since: float | None = None
+
+    _spill_conn: sqlite3.Connection | None = None
+    _spill_pending: int = 0
+    _spill_futures: dict[int, WriteFuture]
+    _spill_lock: Lock
+
+    _handoff_executor: ThreadPoolExecutor | None = None
+    _handoff_pending: int = 0
+    _handoff_lock: Lock
+
+    _journal_conn: sqlite3.Connection | None = None
+    _journal_seq: int = 0
+    _journal_lock: Lock
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._read_pool = None
+        cls._write_stats = WriteStats()
+        cls._spill_futures = {}
+        cls._spill_lock = Lock()
+        cls._journal_lock = Lock()
+        cls._handoff_executor = None
+        cls._handoff_lock = Lock()
+        BaseDB._registry.append(cls)
+
     @classmethod
     def _get_queue(cls) -> Queue:
         if cls._queue is None:
-            cls._queue = Queue()
+            cls._queue = Queue(maxsize=cls._queue_maxsize)
 
         return cls._queue
 
@@ -44,19 +247,399 @@ class BaseDB:
         return conn
 
     @classmethod
-    def _execute_write(cls, task: SQLTask):
-        conn = cls._connect()
+    def _execute_write(
+        cls,
+        conn: sqlite3.Connection,
+        task: SQLTask,
+        jseq: int | None = None,
+    ) -> WriteResult:
+        start = time.perf_counter()
         try:
             conn.execute("BEGIN;")
-            conn.execute(task.sql, task.params or ())
+            cur = conn.execute(task.sql, task.params or ())
+            if jseq is not None:
+                conn.execute(_MARK_APPLIED, (jseq,))
             conn.execute("COMMIT;")
+            return WriteResult(lastrowid=cur.lastrowid, rowcount=cur.rowcount)
 
-        except Exception:
-            conn.execute("ROLLBACK;")
+        except Exception as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+            _count_busy(cls._db_name, "write", exc)
             raise
 
         finally:
-            conn.close()
+            _WRITE_SECONDS.observe(time.perf_counter() - start, cls._db_name, "single")
+
+    @classmethod
+    def _execute_batch(cls, conn: sqlite3.Connection, batch: list[_PendingWrite]):
+        stats = cls._write_stats
+        start = time.perf_counter()
+        results: list[WriteResult | None] = []
+        committed = False
+
+        try:
+            conn.execute("BEGIN;")
+            for item in batch:
+                if item.task is None:
+                    results.append(None)
+                    continue
+
+                cur = conn.execute(item.task.sql, item.task.params or ())
+                results.append(WriteResult(cur.lastrowid, cur.rowcount))
+
+            jseq = max((i.jseq for i in batch if i.jseq is not None), default=None)
+            if jseq is not None:
+                conn.execute(_MARK_APPLIED, (jseq,))
+            conn.execute("COMMIT;")
+            committed = True
+
+        except Exception as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+            _count_busy(cls._db_name, "write", exc)
+
+        if committed:
+            cls._log_changes(zip(batch, results))
+            for item, result in zip(batch, results):
+                _resolve(item.future, result)
+
+        else:
+            # Одна битая задача не должна ронять всю пачку
+            stats.batch_fallbacks += 1
+            for item in batch:
+                if item.task is None:
+                    _resolve(item.future)
+                    continue
+
+                try:
+                    result = cls._execute_write(conn, item.task, item.jseq)
+                    cls._log_changes([(item, result)])
+                    _resolve(item.future, result)
+
+                except Exception as exc:
+                    stats.failed += 1
+                    logging.exception(f"DB {cls._db_name} write failed: {item.task}")
+                    _resolve(item.future, exc=exc)
+
+        stats.tasks += sum(1 for item in batch if item.task is not None)
+        stats.batches += 1
+        stats.max_batch = max(stats.max_batch, len(batch))
+        elapsed = time.perf_counter() - start
+        stats.commit_seconds += elapsed
+        stats.last_commit_seconds = elapsed
+        stats.max_commit_seconds = max(stats.max_commit_seconds, elapsed)
+        _WRITE_SECONDS.observe(elapsed, cls._db_name, "batch")
+
+    @classmethod
+    def _log_changes(
+        cls,
+        done: Iterable[tuple[_PendingWrite, WriteResult | None]],
+    ) -> None:
+        entries: list[tuple[str, Any, str]] = []
+
+        for item, result in done:
+            if item.task is None or result is None:
+                continue
+
+            parsed = parse_write(item.task.sql)
+            if parsed is None:
+                continue
+
+            op, table = parsed
+            key = item.task.key
+            if key is None and op == "insert":
+                key = result.lastrowid
+
+            if isinstance(key, (list, tuple)):
+                entries.extend((table, k, op) for k in key)
+
+            else:
+                entries.append((table, key, op))
+
+        try:
+            ChangeLog.append(cls._db_name, entries)
+
+        except Exception:
+            logging.exception(f"DB {cls._db_name} change log append failed")
+
+    @classmethod
+    def _drain(cls, queue: Queue) -> list[_PendingWrite]:
+        batch = [queue.get()]
+        deadline = time.monotonic() + cls._batch_budget
+
+        while len(batch) < cls._batch_size and time.monotonic() < deadline:
+            try:
+                batch.append(queue.get_nowait())
+
+            except Empty:
+                break
+
+        return batch
+
+    @classmethod
+    def _open_spill(cls) -> sqlite3.Connection:
+        if cls._spill_conn is None:
+            conn = sqlite3.connect(
+                _DB_DIR / f"{cls._db_name}.spill.db",
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spill (
+                    seq INTEGER PRIMARY KEY,
+                    sql TEXT,
+                    params TEXT,
+                    key TEXT,
+                    jseq INTEGER,
+                    enqueued REAL NOT NULL
+                );
+                """
+            )
+            cur = conn.execute("SELECT COUNT(*) FROM spill")
+            cls._spill_pending = cur.fetchone()[0]
+            cls._spill_conn = conn
+
+        return cls._spill_conn
+
+    @classmethod
+    def _spill(cls, item: _PendingWrite) -> None:
+        """Вызывается под _spill_lock"""
+        dumped = (None, None, None) if item.task is None else _dump_task(item.task)
+        cur = cls._open_spill().execute(
+            """
+            INSERT INTO spill (sql, params, key, jseq, enqueued)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (*dumped, item.jseq, time.time()),
+        )
+        cls._spill_futures[cur.lastrowid] = item.future
+        cls._spill_pending += 1
+        cls._write_stats.spilled += 1
+
+        # Пока открывался файл, воркер мог выбрать очередь и уснуть на ней пустой
+        queue = cls._get_queue()
+        if cls._spill_pending == 1 and queue.empty():
+            queue.put_nowait(_PendingWrite(None, WriteFuture()))
+
+    @classmethod
+    def _unspill(cls) -> tuple[list[_PendingWrite], int]:
+        """Следующая пачка из файла переполнения и seq последней задачи в ней"""
+        with cls._spill_lock:
+            cur = cls._open_spill().execute(
+                """
+                SELECT seq, sql, params, key, jseq
+                FROM spill
+                ORDER BY seq
+                LIMIT ?
+                """,
+                (cls._batch_size,),
+            )
+            rows = cur.fetchall()
+            batch = [
+                _PendingWrite(
+                    None if sql is None else _load_task(sql, params, key),
+                    # Задачи, пережившие рестарт, никто не ждёт
+                    cls._spill_futures.pop(seq, None) or WriteFuture(),
+                    jseq=jseq,
+                )
+                for seq, sql, params, key, jseq in rows
+            ]
+
+        return batch, rows[-1][0] if rows else 0
+
+    @classmethod
+    def _ack_spill(cls, last_seq: int, count: int) -> None:
+        with cls._spill_lock:
+            cls._open_spill().execute("DELETE FROM spill WHERE seq <= ?", (last_seq,))
+            cls._spill_pending -= count
+
+    @classmethod
+    def _enqueue(cls, item: _PendingWrite, block: bool = True) -> bool:
+        """
+        False - задача не поставлена. При block её future уже завершён
+        WriteQueueFull, без block при полной очереди future не тронут.
+        """
+        queue = cls._get_queue()
+
+        if cls._overflow == "spill":
+            with cls._spill_lock:
+                # Пока файл не дочитан, новые задачи идут следом за ним,
+                # иначе они обгонят уже сброшенные на диск
+                if cls._spill_pending == 0:
+                    try:
+                        queue.put_nowait(item)
+                        return True
+
+                    except Full:
+                        pass
+
+                cls._spill(item)
+            return True
+
+        try:
+            if block and cls._overflow == "block":
+                queue.put(item, timeout=cls._block_timeout)
+
+            else:
+                queue.put_nowait(item)
+
+            return True
+
+        except Full:
+            if not block:
+                return False
+
+            cls._write_stats.rejected += 1
+            _resolve(
+                item.future,
+                exc=WriteQueueFull(f"DB {cls._db_name} write queue is full"),
+            )
+            return False
+
+    @classmethod
+    def _put(cls, item: _PendingWrite, block: bool = True) -> bool:
+        if item.task is not None and cls._journal_conn is not None:
+            return cls._submit_journaled(item, block)
+
+        return cls._enqueue(item, block)
+
+    @classmethod
+    def _submit(cls, item: _PendingWrite) -> None:
+        """
+        Ставит задачу в очередь, не блокируя event loop.
+        При полной очереди и _overflow = "block" ожидание места уходит
+        в поток _handoff. Пока в нём есть задачи, новые встают за ними,
+        чтобы не обогнать их в очереди и в журнале.
+        Вызов вне event loop, как и раньше, ждёт места сам.
+        """
+        if cls._overflow != "block":
+            cls._put(item)
+            return
+
+        with cls._handoff_lock:
+            if cls._handoff_pending == 0 and cls._put(item, block=False):
+                return
+
+            cls._handoff_pending += 1
+            cls._write_stats.waited += 1
+            if cls._handoff_executor is None:
+                cls._handoff_executor = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix=f"{cls._db_name}-handoff",
+                )
+            waited = cls._handoff_executor.submit(cls._handoff, item)
+
+        if not _on_event_loop():
+            waited.result()
+
+    @classmethod
+    def _handoff(cls, item: _PendingWrite) -> None:
+        try:
+            cls._put(item)
+
+        except Exception as exc:
+            _resolve(item.future, exc=exc)
+
+        finally:
+            with cls._handoff_lock:
+                cls._handoff_pending -= 1
+
+    @classmethod
+    def _open_journal(cls) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            _DB_DIR / f"{cls._db_name}.journal.db",
+            timeout=5.0,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA busy_timeout=5000;")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS journal (
+                seq INTEGER PRIMARY KEY,
+                sql TEXT NOT NULL,
+                params TEXT NOT NULL,
+                key TEXT
+            );
+            """
+        )
+        return conn
+
+    @classmethod
+    def _replay_journal(cls, conn: sqlite3.Connection) -> None:
+        """Доигрывает записи, принятые до рестарта, но не применённые к БД"""
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS _journal_applied (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                seq INTEGER NOT NULL
+            );
+            """
+        )
+        conn.execute("INSERT OR IGNORE INTO _journal_applied (id, seq) VALUES (0, 0);")
+        applied = conn.execute("SELECT seq FROM _journal_applied").fetchone()[0]
+
+        # Всё, что лежит в файле переполнения, есть и в журнале
+        if (_DB_DIR / f"{cls._db_name}.spill.db").exists():
+            with cls._spill_lock:
+                cls._open_spill().execute("DELETE FROM spill;")
+                cls._spill_pending = 0
+
+        jconn = cls._open_journal()
+        cur = jconn.execute(
+            """
+            SELECT seq, sql, params, key
+            FROM journal
+            WHERE seq > ?
+            ORDER BY seq
+            """,
+            (applied,),
+        )
+        replayed = 0
+        while rows := cur.fetchmany(cls._batch_size):
+            batch = [
+                _PendingWrite(_load_task(sql, params, key), WriteFuture(), jseq=seq)
+                for seq, sql, params, key in rows
+            ]
+            cls._execute_batch(conn, batch)
+            replayed += len(batch)
+
+        if replayed:
+            logging.warning(f"DB {cls._db_name} replayed {replayed} journaled writes")
+
+        last = jconn.execute("SELECT MAX(seq) FROM journal").fetchone()[0] or 0
+        jconn.execute("DELETE FROM journal;")
+        cls._journal_seq = max(applied, last)
+        cls._journal_conn = jconn
+
+    @classmethod
+    def _submit_journaled(cls, item: _PendingWrite, block: bool = True) -> bool:
+        assert cls._journal_conn is not None and item.task is not None
+
+        # Номер, строка журнала и место в очереди выдаются под одним локом,
+        # чтобы порядок в журнале совпадал с порядком выполнения
+        with cls._journal_lock:
+            cls._journal_seq += 1
+            item = _PendingWrite(item.task, item.future, jseq=cls._journal_seq)
+            cls._journal_conn.execute(
+                "INSERT INTO journal (seq, sql, params, key) VALUES (?, ?, ?, ?)",
+                (item.jseq, *_dump_task(item.task)),
+            )
+
+            if cls._enqueue(item, block):
+                return True
+
+            cls._journal_conn.execute(
+                "DELETE FROM journal WHERE seq = ?",
+                (item.jseq,),
+            )
+            return False
 
     @classmethod
     def _start_worker(cls):
@@ -66,39 +649,348 @@ class BaseDB:
         cls._worker_started = True
         queue = cls._get_queue()
 
+        if (_DB_DIR / f"{cls._db_name}.spill.db").exists():
+            cls._open_spill()
+            if cls._spill_pending:
+                logging.warning(
+                    f"DB {cls._db_name} replaying {cls._spill_pending} spilled writes"
+                )
+
         def worker():
+            conn: sqlite3.Connection | None = cls._connect()
+            jconn = cls._open_journal() if cls._journal_conn is not None else None
             while True:
-                task = queue.get()
-                try:
-                    cls._execute_write(task)
+                spilled = cls._spill_pending > 0 and queue.empty()
+                if spilled:
+                    batch, last_seq = cls._unspill()
+
+                else:
+                    batch = cls._drain(queue)
+
+                durable = spilled or any(i.jseq is not None for i in batch)
+                cls._inflight_since = batch[0].enqueued
+                while True:
+                    try:
+                        if conn is None:
+                            conn = cls._connect()
+                        cls._execute_batch(conn, batch)
+                        break
+
+                    except Exception as exc:
+                        logging.exception(f"DB {cls._db_name} batch failed")
+                        # После неудачного ROLLBACK соединение может остаться
+                        # посреди транзакции, следующая попытка откроет новое
+                        cls._close_quietly(conn)
+                        conn = None
+                        if not durable:
+                            for item in batch:
+                                _resolve(item.future, exc=exc)
+                            break
+
+                        # Строки журнала и файла переполнения остаются на месте,
+                        # пачка повторяется, пока не будет применена
+                        cls._write_stats.retried += 1
+                        time.sleep(cls._retry_delay)
 
-                except Exception:
-                    logging.exception(f"DB {cls._db_name} write failed: {task}")
+                cls._inflight_since = None
+                if jconn is not None:
+                    cls._prune_journal(jconn, batch)
 
-                finally:
-                    queue.task_done()
+                if spilled:
+                    cls._ack_spill(last_seq, len(batch))
+
+                else:
+                    for _ in batch:
+                        queue.task_done()
 
         Thread(target=worker, daemon=True).start()
 
+    @classmethod
+    def _close_quietly(cls, conn: sqlite3.Connection | None) -> None:
+        if conn is None:
+            return
+
+        try:
+            conn.close()
+
+        except sqlite3.Error:
+            logging.exception(f"DB {cls._db_name} close failed")
+
+    @classmethod
+    def _prune_journal(
+        cls,
+        jconn: sqlite3.Connection,
+        batch: list[_PendingWrite],
+    ) -> None:
+        jseq = max((i.jseq for i in batch if i.jseq is not None), default=None)
+        if jseq is None:
+            return
+
+        try:
+            jconn.execute("DELETE FROM journal WHERE seq <= ?", (jseq,))
+
+        except sqlite3.Error:
+            # Не страшно: при старте такие строки отсекаются по _journal_applied
+            logging.exception(f"DB {cls._db_name} journal prune failed")
+
+    @classmethod
+    def _oldest_age(cls) -> float:
+        """Сколько секунд ждёт самая старая невыполненная задача"""
+        oldest = cls._inflight_since
+
+        if oldest is None and cls._queue is not None:
+            with cls._queue.mutex:
+                if cls._queue.queue:
+                    oldest = cls._queue.queue[0].enqueued
+
+        if oldest is None and cls._spill_pending:
+            with cls._spill_lock:
+                cur = cls._open_spill().execute("SELECT MIN(enqueued) FROM spill")
+                first = cur.fetchone()[0]
+            if first is not None:
+                return max(time.time() - first, 0.0)
+
+        return 0.0 if oldest is None else time.monotonic() - oldest
+
+    @classmethod
+    def write_stats(cls) -> dict[str, int | float]:
+        stats: dict[str, int | float] = asdict(cls._write_stats)
+        stats["queue_depth"] = 0 if cls._queue is None else cls._queue.qsize()
+        stats["spill_depth"] = cls._spill_pending
+        stats["oldest_age_seconds"] = cls._oldest_age()
+        return stats
+
+    @classmethod
+    def all_write_stats(cls) -> dict[str, dict[str, int | float]]:
+        """write_stats всех БД с запущенным воркером"""
+        return {
+            db._db_name: db.write_stats()
+            for db in BaseDB._registry
+            if getattr(db, "_worker_started", False)
+        }
+
+    @classmethod
+    def _migrate(cls, conn: sqlite3.Connection) -> None:
+        version = conn.execute("PRAGMA user_version;").fetchone()[0]
+
+        for number, tasks in enumerate(cls._migrations[version:], start=version + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE;")
+                for task in tasks:
+                    conn.execute(task.sql, task.params or ())
+                conn.execute(f"PRAGMA user_version = {number};")
+                conn.execute("COMMIT;")
+
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK;")
+                raise
+
+            logging.info(f"DB {cls._db_name} migrated to version {number}")
+
     @classmethod
     def _init_db(cls, sql_t: list[SQLTask]) -> None:
         _DB_DIR.mkdir(parents=True, exist_ok=True)
+        ChangeLog.open(_DB_DIR / "change_log.db")
+
+        # Схема применяется синхронно, чтобы чтения сразу после set_up
+        # и миграции видели созданные таблицы
+        conn = cls._connect()
+        try:
+            for task in sql_t:
+                conn.execute(task.sql, task.params or ())
+
+            cls._migrate(conn)
+            if cls._journal:
+                cls._replay_journal(conn)
+
+        finally:
+            conn.close()
+
         cls._start_worker()
 
-        queue = cls._get_queue()
-        for task in sql_t:
-            queue.put(task)
+    @classmethod
+    def submit_write(cls, sql_t: SQLTask) -> WriteFuture:
+        """
+        Ставит запись в очередь воркера.
+        Future резолвится WriteResult после коммита или ошибкой SQLite,
+        при переполнении очереди (см. _overflow) - ошибкой WriteQueueFull.
+        """
+        future = WriteFuture()
+        cls._submit(_PendingWrite(sql_t, future))
+        return future
+
+    @classmethod
+    async def flush(cls) -> None:
+        """Ждёт коммита всех записей, поставленных в очередь до вызова"""
+        future = WriteFuture()
+        cls._submit(_PendingWrite(None, future))
+        await future
+
+    @classmethod
+    async def drain_all(cls, timeout: float) -> bool:
+        """
+        Ждёт коммита всех очередей записи, но не дольше timeout секунд.
+        False - не успели или барьер не встал в полную очередь (WriteQueueFull),
+        оставшееся доиграется из журнала или файла переполнения.
+        """
+        dbs = [db for db in BaseDB._registry if getattr(db, "_worker_started", False)]
+
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*(db.flush() for db in dbs), return_exceptions=True),
+                timeout=timeout,
+            )
+            failed = {db: repr(res) for db, res in zip(dbs, results) if res is not None}
+
+        except asyncio.TimeoutError:
+            failed = {db: f"not drained in {timeout}s" for db in dbs}
+
+        for db, reason in failed.items():
+            stats = db.write_stats()
+            logging.warning(
+                f"DB {db._db_name} {reason}: "
+                f"queue {stats['queue_depth']}, spill {stats['spill_depth']}"
+            )
+
+        return not failed
 
     @classmethod
-    def submit_write(cls, sql_t: SQLTask):
-        cls._get_queue().put(sql_t)
+    def _get_read_pool(cls) -> ReadPool:
+        if cls._read_pool is None:
+            cls._read_pool = ReadPool(cls._connect)
+
+        return cls._read_pool
 
     @classmethod
     @contextmanager
-    def read(cls):
-        conn = cls._connect()
+    def read(cls, label: str = ""):
+        """label - метка method в spf_db_read_seconds, обычно имя читающего метода"""
+        pool = cls._get_read_pool()
+        conn = pool.acquire()
+        start = time.perf_counter()
         try:
             yield conn
 
+        except (sqlite3.ProgrammingError, sqlite3.InterfaceError):
+            pool.discard(conn)
+            raise
+
+        except sqlite3.OperationalError as exc:
+            _count_busy(cls._db_name, "read", exc)
+            raise
+
         finally:
-            conn.close()
+            _READ_SECONDS.observe(time.perf_counter() - start, cls._db_name, label)
+
+    @classmethod
+    def _get_read_executor(cls) -> ThreadPoolExecutor:
+        if BaseDB._read_executor is None:
+            BaseDB._read_executor = ThreadPoolExecutor(
+                max_workers=BaseDB._read_workers,
+                thread_name_prefix="db-read",
+            )
+
+        return BaseDB._read_executor
+
+    @classmethod
+    async def run_read(cls, func: Callable, *args, **kwargs):
+        """
+        Выполняет синхронное чтение в пуле потоков чтения, не блокируя event loop.
+        У каждого потока пула своё соединение из ReadPool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            cls._get_read_executor(),
+            partial(func, *args, **kwargs),
+        )
+
+    @classmethod
+    async def aiter_pages(
+        cls,
+        page: Callable[[int, int], list[dict[str, Any]]],
+        key: str,
+        after: int = 0,
+        batch: int = 1000,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """
+        Обходит всю таблицу страницами page(after, limit) по возрастанию key.
+        В памяти одновременно только одна страница, каждая читается в пуле чтения.
+        """
+        while True:
+            rows = await cls.run_read(page, after, batch)
+            if rows:
+                yield rows
+
+            if len(rows) < batch:
+                return
+
+            after = rows[-1][key]
+
+    @classmethod
+    def close_read_pool(cls) -> None:
+        if cls._read_pool is not None:
+            cls._read_pool.close()
+
+    @classmethod
+    def close_all(cls) -> None:
+        if BaseDB._read_executor is not None:
+            BaseDB._read_executor.shutdown(wait=True)
+            BaseDB._read_executor = None
+
+        for db in BaseDB._registry:
+            db.close_read_pool()
+            if db._handoff_executor is not None:
+                db._handoff_executor.shutdown(wait=True)
+                db._handoff_executor = None
+
+            if db._spill_conn is not None:
+                with db._spill_lock:
+                    db._spill_conn.close()
+                    db._spill_conn = None
+
+            if db._journal_conn is not None:
+                with db._journal_lock:
+                    db._journal_conn.close()
+                    db._journal_conn = None
+
+        ChangeLog.close()
+
+
+_WRITE_COLLECTED = (
+    ("queue_depth", "spf_db_write_queue_depth", "gauge", "Задач в очереди воркера"),
+    ("spill_depth", "spf_db_write_spill_depth", "gauge", "Задач в файле переполнения"),
+    (
+        "oldest_age_seconds",
+        "spf_db_write_oldest_age_seconds",
+        "gauge",
+        "Сколько ждёт самая старая невыполненная задача",
+    ),
+    ("tasks", "spf_db_write_tasks_total", "counter", "Выполненных задач записи"),
+    ("failed", "spf_db_write_failed_total", "counter", "Задач, упавших с ошибкой"),
+    ("rejected", "spf_db_write_rejected_total", "counter", "Отклонённых задач"),
+    ("spilled", "spf_db_write_spilled_total", "counter", "Задач, ушедших на диск"),
+    (
+        "waited",
+        "spf_db_write_waited_total",
+        "counter",
+        "Задач, ждавших места в очереди в отдельном потоке",
+    ),
+    ("batches", "spf_db_write_batches_total", "counter", "Транзакций воркера"),
+    (
+        "batch_fallbacks",
+        "spf_db_write_batch_fallbacks_total",
+        "counter",
+        "Пачек, переигранных по одной задаче",
+    ),
+)
+
+
+def _collect_write_stats():
+    stats = BaseDB.all_write_stats()
+    for field_name, name, kind, help in _WRITE_COLLECTED:
+        samples = [(name, {"db": db}, s[field_name]) for db, s in stats.items()]
+        yield name, help, kind, samples
+
+
+register_collector(_collect_write_stats)
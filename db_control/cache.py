@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    negative_hits: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU кэш с TTL.
+    Значение None кэшируется как отрицательный ответ со своим TTL.
+    Записи можно пометить тегом и сбросить все записи тега разом.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10_000,
+        ttl: float = 60.0,
+        negative_ttl: float = 5.0,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._data: OrderedDict[Hashable, tuple[float, Any, Hashable]] = OrderedDict()
+        self._tags: dict[Hashable, set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        self._epoch = 0
+
+    @property
+    def epoch(self) -> int:
+        """
+        Счётчик инвалидаций. Снимается до чтения из БД и передаётся в put,
+        чтобы не положить в кэш значение, устаревшее за время чтения.
+        """
+        return self._epoch
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return False, None
+
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                return False, None
+
+            self._data.move_to_end(key)
+            self._stats.hits += 1
+            if value is None:
+                self._stats.negative_hits += 1
+
+            return True, value
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        tag: Hashable = None,
+        epoch: int | None = None,
+    ) -> None:
+        ttl = self.negative_ttl if value is None else self.ttl
+
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return
+
+            if key in self._data:
+                self._drop(key)
+
+            self._data[key] = (time.monotonic() + ttl, value, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+                self._stats.evictions += 1
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                if key in self._data:
+                    self._drop(key)
+                    self._stats.invalidations += 1
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        with self._lock:
+            self._epoch += 1
+            for key in self._tags.pop(tag, ()):
+                if key in self._data:
+                    self._drop(key)
+                    self._stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**asdict(self._stats), "size": len(self._data)}
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, tag = self._data.pop(key)
+        if tag is None:
+            return
+
+        keys = self._tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
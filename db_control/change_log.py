@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+_WRITE_RE = re.compile(
+    r"^\s*(INSERT|UPDATE|DELETE)\s+(?:OR\s+\w+\s+)?(?:INTO\s+|FROM\s+)?(\w+)",
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=1024)
+def parse_write(sql: str) -> tuple[str, str] | None:
+    """(op, table) для INSERT/UPDATE/DELETE, None для прочих запросов"""
+    match = _WRITE_RE.match(sql)
+    if match is None:
+        return None
+
+    return match.group(1).lower(), match.group(2)
+
+
+@dataclass(frozen=True)
+class Change:
+    seq: int
+    db: str
+    table: str
+    key: Any
+    """Первичный ключ строки, None - изменение затронуло таблицу целиком"""
+    op: str
+    ts: int
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class ChangeLog:
+    """
+    Журнал изменений всех БД с общим монотонным seq.
+    Воркеры пишут в него после коммита своей пачки и до резолва futures,
+    поэтому дождавшийся записи клиент уже видит её в журнале.
+    Хранится в отдельном файле, последние записи держатся в памяти для
+    быстрого хвоста и long-poll.
+    """
+
+    _retention_seconds: int | None = 7 * 24 * 3600
+    """Сколько хранить записи, None - бессрочно"""
+    _compact_after_seconds: int | None = 3600
+    """Записи старше этого схлопываются до последней по (db, table, key)"""
+    _maintain_interval: float = 600.0
+    _memory_size: int = 10_000
+
+    _path: Path | None = None
+    _conn: sqlite3.Connection | None = None
+    _lock = threading.Lock()
+    _seq: int = 0
+    _recent: deque[Change] = deque(maxlen=_memory_size)
+    _waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+    _task: asyncio.Task | None = None
+
+    @classmethod
+    def open(cls, path: Path) -> None:
+        with cls._lock:
+            if cls._conn is not None:
+                return
+
+            conn = sqlite3.connect(
+                path,
+                timeout=5.0,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("PRAGMA busy_timeout=5000;")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS change_log (
+                    seq INTEGER PRIMARY KEY,
+                    db TEXT NOT NULL,
+                    tbl TEXT NOT NULL,
+                    key,
+                    op TEXT NOT NULL,
+                    ts INTEGER NOT NULL
+                );
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_change_log_row "
+                "ON change_log (db, tbl, key);"
+            )
+            # Последний выданный seq переживает ретеншн, очищающий change_log
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS change_log_meta (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                """
+            )
+
+            last = conn.execute(
+                """
+                SELECT MAX(
+                    COALESCE((SELECT MAX(seq) FROM change_log), 0),
+                    COALESCE(
+                        (SELECT value FROM change_log_meta WHERE name = 'last_seq'),
+                        0
+                    )
+                )
+                """
+            ).fetchone()[0]
+            cls._seq = max(cls._seq, last)
+            cls._path = path
+            cls._conn = conn
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._lock:
+            if cls._conn is not None:
+                cls._conn.close()
+                cls._conn = None
+
+    @classmethod
+    def append(cls, db: str, entries: Iterable[tuple[str, Any, str]]) -> None:
+        """entries - (table, key, op)"""
+        now = int(time.time())
+
+        with cls._lock:
+            changes = []
+            for table, key, op in entries:
+                cls._seq += 1
+                changes.append(Change(cls._seq, db, table, key, op, now))
+
+            if not changes:
+                return
+
+            cls._recent.extend(changes)
+
+            conn = cls._conn
+            if conn is not None:
+                try:
+                    conn.execute("BEGIN;")
+                    conn.executemany(
+                        """
+                        INSERT INTO change_log (seq, db, tbl, key, op, ts)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """,
+                        [(c.seq, c.db, c.table, c.key, c.op, c.ts) for c in changes],
+                    )
+                    conn.execute(
+                        """
+                        INSERT INTO change_log_meta (name, value)
+                        VALUES ('last_seq', ?)
+                        ON CONFLICT (name) DO UPDATE
+                        SET value = MAX(value, excluded.value)
+                        """,
+                        (cls._seq,),
+                    )
+                    conn.execute("COMMIT;")
+
+                except Exception:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK;")
+                    logging.exception(f"Change log persist failed for {db}")
+
+            waiters, cls._waiters = cls._waiters, set()
+
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, fut)
+
+            except RuntimeError:
+                # Цикл уже закрыт
+                pass
+
+    @classmethod
+    def last_seq(cls) -> int:
+        return cls._seq
+
+    @classmethod
+    def since(cls, seq: int, limit: int = 1000) -> list[Change]:
+        with cls._lock:
+            recent = cls._recent
+            in_memory = bool(recent) and seq + 1 >= recent[0].seq
+            if in_memory or cls._conn is None:
+                return [c for c in recent if c.seq > seq][:limit]
+
+            cur = cls._conn.execute(
+                """
+                SELECT seq, db, tbl, key, op, ts
+                FROM change_log
+                WHERE seq > ?
+                ORDER BY seq
+                LIMIT ?
+                """,
+                (seq, limit),
+            )
+            return [Change(*row) for row in cur]
+
+    @classmethod
+    def oldest_seq(cls) -> int:
+        """Минимальный seq в журнале, более ранние удалены ретеншном"""
+        with cls._lock:
+            if cls._conn is not None:
+                oldest = cls._conn.execute("SELECT MIN(seq) FROM change_log")
+                return oldest.fetchone()[0] or cls._seq + 1
+
+            return cls._recent[0].seq if cls._recent else cls._seq + 1
+
+    @classmethod
+    async def wait(cls, seq: int, timeout: float, limit: int = 1000) -> list[Change]:
+        """Long-poll: ждёт до timeout секунд, пока появятся записи новее seq"""
+        deadline = time.monotonic() + timeout
+
+        while True:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+
+            waiter = (loop, fut)
+
+            with cls._lock:
+                ready = cls._seq > seq
+                if not ready:
+                    cls._waiters.add(waiter)
+
+            if ready:
+                # since может читать с диска под _lock, который берут воркеры
+                return await asyncio.to_thread(cls.since, seq, limit)
+
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    return []
+
+                await asyncio.wait_for(fut, timeout=remaining)
+
+            except asyncio.TimeoutError:
+                return []
+
+            finally:
+                # Без append ожидание не разбудят, и запись осталась бы в наборе
+                with cls._lock:
+                    cls._waiters.discard(waiter)
+
+    @classmethod
+    def maintain(cls, now: int | None = None) -> None:
+        """Удаляет записи старше ретеншна и схлопывает старые изменения одной строки"""
+        now = now or int(time.time())
+
+        with cls._lock:
+            conn = cls._conn
+            if conn is None:
+                return
+
+            try:
+                conn.execute("BEGIN;")
+                if cls._retention_seconds is not None:
+                    conn.execute(
+                        "DELETE FROM change_log WHERE ts < ?",
+                        (now - cls._retention_seconds,),
+                    )
+
+                if cls._compact_after_seconds is not None:
+                    conn.execute(
+                        """
+                        DELETE FROM change_log
+                        WHERE ts < ?
+                          AND key IS NOT NULL
+                          AND seq NOT IN (
+                              SELECT MAX(seq)
+                              FROM change_log
+                              WHERE key IS NOT NULL
+                              GROUP BY db, tbl, key
+                          )
+                        """,
+                        (now - cls._compact_after_seconds,),
+                    )
+                conn.execute("COMMIT;")
+
+            except Exception:
+                # Иначе соединение останется в транзакции и append не сможет BEGIN
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK;")
+                raise
+
+    @classmethod
+    async def _loop(cls) -> None:
+        while True:
+            await asyncio.sleep(cls._maintain_interval)
+            try:
+                await asyncio.to_thread(cls.maintain)
+
+            except Exception:
+                logging.exception("Change log maintenance failed")
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.create_task(cls._loop())
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._task is None:
+            return
+
+        cls._task.cancel()
+        try:
+            await cls._task
+
+        except asyncio.CancelledError:
+            pass
+
+        cls._task = None
+
+
+def _wake(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
@@ -2,16 +2,202 @@ import json
 from queue import Queue
 from typing import Any, Literal
 
-from ..base_db import BaseDB, SQLTask
+from ..base_db import BaseDB, SQLTask, WriteFuture
+from ..row_mapper import RowMapper, json_list_col
 
 PlayerCharType = Literal["lore", "norm"]
 
+# Раскладка content_ids одного персонажа в player_char_content,
+# {row} - NEW внутри триггера или сама таблица при заполнении.
+# Битый JSON и не-массивы дают пустой список, а не ошибку записи
+_CONTENT_FILL = """
+    INSERT OR IGNORE INTO player_char_content (uid, content_id, id)
+    SELECT {row}.uid, je.value, {row}.id
+    FROM {source}json_each(
+        CASE
+            WHEN json_valid({row}.content_ids)
+             AND json_type({row}.content_ids) = 'array'
+            THEN {row}.content_ids
+            ELSE '[]'
+        END
+    ) AS je
+    WHERE je.type = 'text';
+"""
+
+# Сдвиг веса пользователя в player_char_weight на вес одного content_id
+_WEIGHT_SHIFT = """
+    INSERT INTO player_char_weight (id, weight_bytes)
+    SELECT {owner}, {sign}weight_bytes
+    FROM content_weight
+    WHERE content_id = {content}
+    ON CONFLICT (id) DO UPDATE SET
+        weight_bytes = weight_bytes + excluded.weight_bytes;
+"""
+
+# Сдвиг веса всех владельцев content_id при изменении его веса в content_weight
+_WEIGHT_RESCALE = """
+    INSERT INTO player_char_weight (id, weight_bytes)
+    SELECT id, {sign}COUNT(*) * {row}.weight_bytes
+    FROM player_char_content
+    WHERE content_id = {row}.content_id
+    GROUP BY id
+    ON CONFLICT (id) DO UPDATE SET
+        weight_bytes = weight_bytes + excluded.weight_bytes;
+"""
+
+# Вес пользователей, пересчитанный с нуля, {ids} - подзапрос со списком id
+_WEIGHT_ACTUAL = """
+    SELECT
+        u.id AS id,
+        COALESCE((
+            SELECT SUM(cw.weight_bytes)
+            FROM player_char_content AS pc
+            JOIN content_weight AS cw ON cw.content_id = pc.content_id
+            WHERE pc.id = u.id
+        ), 0) AS actual
+    FROM ({ids}) AS u
+"""
+
+_ALL_WEIGHT_IDS = """
+    SELECT id FROM player_char_weight
+    UNION
+    SELECT id FROM player_char_content
+"""
+
 
 class PlayerCharDB(BaseDB):
     _db_name = "player_char_db"
 
     _worker_started: bool = False
-    _queue = Queue()
+    _queue: Queue | None = None
+
+    _migrations = [
+        [
+            SQLTask(
+                """
+                CREATE TABLE IF NOT EXISTS player_char_content (
+                    uid INTEGER NOT NULL,
+                    content_id TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    PRIMARY KEY (uid, content_id)
+                ) WITHOUT ROWID;
+                """
+            ),
+            SQLTask(
+                "CREATE INDEX IF NOT EXISTS idx_player_char_content_content "
+                "ON player_char_content (content_id, id);"
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_player_char_content_insert
+                AFTER INSERT ON player_char_db
+                BEGIN
+                    {_CONTENT_FILL.format(row="NEW", source="")}
+                END;
+                """
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_player_char_content_update
+                AFTER UPDATE OF uid, id, content_ids ON player_char_db
+                BEGIN
+                    DELETE FROM player_char_content WHERE uid = OLD.uid;
+                    {_CONTENT_FILL.format(row="NEW", source="")}
+                END;
+                """
+            ),
+            SQLTask(
+                """
+                CREATE TRIGGER IF NOT EXISTS trg_player_char_content_delete
+                AFTER DELETE ON player_char_db
+                BEGIN
+                    DELETE FROM player_char_content WHERE uid = OLD.uid;
+                END;
+                """
+            ),
+            SQLTask(
+                _CONTENT_FILL.format(row="player_char_db", source="player_char_db, ")
+            ),
+        ],
+        [
+            SQLTask(
+                """
+                CREATE TABLE IF NOT EXISTS content_weight (
+                    content_id TEXT PRIMARY KEY,
+                    weight_bytes INTEGER NOT NULL DEFAULT 0
+                ) WITHOUT ROWID;
+                """
+            ),
+            SQLTask(
+                """
+                CREATE TABLE IF NOT EXISTS player_char_weight (
+                    id INTEGER PRIMARY KEY,
+                    weight_bytes INTEGER NOT NULL DEFAULT 0
+                );
+                """
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_player_char_weight_content_insert
+                AFTER INSERT ON player_char_content
+                BEGIN
+                    {_WEIGHT_SHIFT.format(
+                        owner="NEW.id", content="NEW.content_id", sign=""
+                    )}
+                END;
+                """
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_player_char_weight_content_delete
+                AFTER DELETE ON player_char_content
+                BEGIN
+                    {_WEIGHT_SHIFT.format(
+                        owner="OLD.id", content="OLD.content_id", sign="-"
+                    )}
+                END;
+                """
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_player_char_weight_insert
+                AFTER INSERT ON content_weight
+                BEGIN
+                    {_WEIGHT_RESCALE.format(row="NEW", sign="")}
+                END;
+                """
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_player_char_weight_update
+                AFTER UPDATE OF content_id, weight_bytes ON content_weight
+                BEGIN
+                    {_WEIGHT_RESCALE.format(row="OLD", sign="-")}
+                    {_WEIGHT_RESCALE.format(row="NEW", sign="")}
+                END;
+                """
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_player_char_weight_delete
+                AFTER DELETE ON content_weight
+                BEGIN
+                    {_WEIGHT_RESCALE.format(row="OLD", sign="-")}
+                END;
+                """
+            ),
+        ],
+    ]
+
+    _rows = RowMapper(
+        "uid",
+        "id",
+        "name",
+        "discord_url",
+        "char_type",
+        json_list_col("content_ids"),
+        "game_db_id",
+    )
 
     @classmethod
     def set_up(cls) -> None:
@@ -44,10 +230,10 @@ class PlayerCharDB(BaseDB):
         content_ids: list[str],
         discord_url: str | None = None,
         game_db_id: int | None = None,
-    ) -> None:
+    ) -> WriteFuture:
         payload = json.dumps(content_ids, ensure_ascii=False)
 
-        cls.submit_write(
+        return cls.submit_write(
             SQLTask(
                 """
                 INSERT INTO player_char_db
@@ -67,7 +253,7 @@ class PlayerCharDB(BaseDB):
         char_type: PlayerCharType | None = None,
         content_ids: list[str] | None = None,
         game_db_id: int | None = None,
-    ) -> None:
+    ) -> WriteFuture:
         fields = []
         params: list[Any] = []
 
@@ -92,11 +278,11 @@ class PlayerCharDB(BaseDB):
             params.append(game_db_id)
 
         if not fields:
-            return
+            return WriteFuture.resolved()
 
         params.append(uid)
 
-        cls.submit_write(
+        return cls.submit_write(
             SQLTask(
                 f"""
                 UPDATE player_char_db
@@ -104,19 +290,22 @@ class PlayerCharDB(BaseDB):
                 WHERE uid = ?
                 """,
                 tuple(params),
+                key=uid,
             )
         )
 
     @classmethod
-    def delete(cls, uid: int) -> None:
-        cls.submit_write(SQLTask("DELETE FROM player_char_db WHERE uid = ?", (uid,)))
+    def delete(cls, uid: int) -> WriteFuture:
+        return cls.submit_write(
+            SQLTask("DELETE FROM player_char_db WHERE uid = ?", (uid,), key=uid)
+        )
 
     @classmethod
     def get(cls, uid: int) -> dict[str, Any] | None:
-        with cls.read() as conn:
+        with cls.read("get") as conn:
             cur = conn.execute(
-                """
-                SELECT uid, id, name, discord_url, char_type, content_ids, game_db_id
+                f"""
+                SELECT {cls._rows.select}
                 FROM player_char_db
                 WHERE uid = ?
                 """,
@@ -124,31 +313,14 @@ class PlayerCharDB(BaseDB):
             )
             row = cur.fetchone()
 
-        if row is None:
-            return None
-
-        try:
-            content_ids = json.loads(row[5])
-
-        except Exception:
-            content_ids = []
-
-        return {
-            "uid": row[0],
-            "id": row[1],
-            "name": row[2],
-            "discord_url": row[3],
-            "char_type": row[4],
-            "content_ids": content_ids,
-            "game_db_id": row[6],
-        }
+        return cls._rows.one(row)
 
     @classmethod
     def list_by_owner(cls, id: int) -> list[dict[str, Any]]:
-        with cls.read() as conn:
+        with cls.read("list_by_owner") as conn:
             cur = conn.execute(
-                """
-                SELECT uid, id, name, discord_url, char_type, content_ids, game_db_id
+                f"""
+                SELECT {cls._rows.select}
                 FROM player_char_db
                 WHERE id = ?
                 ORDER BY uid
@@ -157,25 +329,247 @@ class PlayerCharDB(BaseDB):
             )
             rows = cur.fetchall()
 
-        out: list[dict[str, Any]] = []
-
-        for row in rows:
-            try:
-                content_ids = json.loads(row[5])
-
-            except Exception:
-                content_ids = []
-
-            out.append(
-                {
-                    "uid": row[0],
-                    "id": row[1],
-                    "name": row[2],
-                    "discord_url": row[3],
-                    "char_type": row[4],
-                    "content_ids": content_ids,
-                    "game_db_id": row[6],
-                }
+        return cls._rows.many(rows)
+
+    @classmethod
+    def list_page(cls, after: int = 0, limit: int = 100) -> list[dict[str, Any]]:
+        """Страница по возрастанию uid, следующая начинается после последнего uid"""
+        with cls.read("list_page") as conn:
+            cur = conn.execute(
+                f"""
+                SELECT {cls._rows.select}
+                FROM player_char_db
+                WHERE uid > ?
+                ORDER BY uid
+                LIMIT ?
+                """,
+                (after, limit),
+            )
+            rows = cur.fetchall()
+
+        return cls._rows.many(rows)
+
+    @classmethod
+    def list_page_json(
+        cls,
+        after: int = 0,
+        limit: int = 100,
+    ) -> tuple[bytes, int | None]:
+        """list_page, собранный в JSON самим SQLite, и after следующей страницы"""
+        with cls.read("list_page_json") as conn:
+            cur = conn.execute(
+                cls._rows.json_array_sql(
+                    """
+                    SELECT *
+                    FROM player_char_db
+                    WHERE uid > ?
+                    ORDER BY uid
+                    LIMIT ?
+                    """,
+                    "uid",
+                ),
+                (after, limit),
             )
+            body, count, last = cur.fetchone()
+
+        return body.encode("utf-8"), last if count == limit else None
 
-        return out
+    @classmethod
+    def list_by_content(cls, content_id: str) -> list[dict[str, Any]]:
+        """Персонажи, у которых в content_ids есть content_id"""
+        with cls.read("list_by_content") as conn:
+            cur = conn.execute(
+                f"""
+                SELECT {", ".join(f"p.{c}" for c in cls._rows.columns)}
+                FROM player_char_content AS pc
+                JOIN player_char_db AS p ON p.uid = pc.uid
+                WHERE pc.content_id = ?
+                ORDER BY p.uid
+                """,
+                (content_id,),
+            )
+            rows = cur.fetchall()
+
+        return cls._rows.many(rows)
+
+    @classmethod
+    def owners_of_content(cls, content_id: str) -> list[int]:
+        """id пользователей, у чьих персонажей есть content_id"""
+        with cls.read("owners_of_content") as conn:
+            cur = conn.execute(
+                """
+                SELECT DISTINCT id
+                FROM player_char_content
+                WHERE content_id = ?
+                ORDER BY id
+                """,
+                (content_id,),
+            )
+            return [row[0] for row in cur]
+
+    @classmethod
+    def owns_content(cls, id: int, content_id: str) -> bool:
+        """Есть ли content_id хотя бы у одного персонажа пользователя"""
+        with cls.read("owns_content") as conn:
+            cur = conn.execute(
+                """
+                SELECT 1
+                FROM player_char_content
+                WHERE content_id = ? AND id = ?
+                LIMIT 1
+                """,
+                (content_id, id),
+            )
+            return cur.fetchone() is not None
+
+    @classmethod
+    async def aget(cls, uid: int) -> dict[str, Any] | None:
+        return await cls.run_read(cls.get, uid)
+
+    @classmethod
+    async def alist_by_owner(cls, id: int) -> list[dict[str, Any]]:
+        return await cls.run_read(cls.list_by_owner, id)
+
+    @classmethod
+    async def alist_page(cls, after: int = 0, limit: int = 100) -> list[dict[str, Any]]:
+        return await cls.run_read(cls.list_page, after, limit)
+
+    @classmethod
+    async def alist_by_content(cls, content_id: str) -> list[dict[str, Any]]:
+        return await cls.run_read(cls.list_by_content, content_id)
+
+    @classmethod
+    async def aowners_of_content(cls, content_id: str) -> list[int]:
+        return await cls.run_read(cls.owners_of_content, content_id)
+
+    @classmethod
+    async def aowns_content(cls, id: int, content_id: str) -> bool:
+        return await cls.run_read(cls.owns_content, id, content_id)
+
+    @classmethod
+    def set_content_weight(cls, content_id: str, weight_bytes: int) -> WriteFuture:
+        """Вес content_id, триггеры сразу сдвигают вес всех его владельцев"""
+        return cls.set_content_weights({content_id: weight_bytes})
+
+    @classmethod
+    def set_content_weights(cls, weights: dict[str, int]) -> WriteFuture:
+        if not weights:
+            return WriteFuture.resolved()
+
+        return cls.submit_write(
+            SQLTask(
+                """
+                INSERT INTO content_weight (content_id, weight_bytes)
+                SELECT key, value
+                FROM json_each(?)
+                WHERE true
+                ON CONFLICT (content_id) DO UPDATE SET
+                    weight_bytes = excluded.weight_bytes
+                """,
+                (json.dumps(weights, ensure_ascii=False),),
+                key=list(weights),
+            )
+        )
+
+    @classmethod
+    def delete_content_weight(cls, content_id: str) -> WriteFuture:
+        return cls.submit_write(
+            SQLTask(
+                "DELETE FROM content_weight WHERE content_id = ?",
+                (content_id,),
+                key=content_id,
+            )
+        )
+
+    @classmethod
+    def recompute_weights(cls, ids: list[int] | None = None) -> WriteFuture:
+        """
+        Пересчитывает player_char_weight с нуля одним запросом
+        для ids или для всех пользователей, если ids не задан.
+        """
+        if ids is None:
+            source, params = _ALL_WEIGHT_IDS, ()
+
+        elif not ids:
+            return WriteFuture.resolved()
+
+        else:
+            source = "SELECT value AS id FROM json_each(?)"
+            params = (json.dumps(ids),)
+
+        return cls.submit_write(
+            SQLTask(
+                "INSERT OR REPLACE INTO player_char_weight (id, weight_bytes)"
+                + _WEIGHT_ACTUAL.format(ids=source),
+                params,
+                key=ids,
+            )
+        )
+
+    @classmethod
+    def used_weight(cls, id: int) -> int:
+        """Вес контента всех персонажей пользователя, одно чтение по ключу"""
+        return cls.used_weight_many([id])[id]
+
+    @classmethod
+    def used_weight_many(cls, ids: list[int]) -> dict[int, int]:
+        with cls.read("used_weight_many") as conn:
+            cur = conn.execute(
+                """
+                SELECT id, weight_bytes
+                FROM player_char_weight
+                WHERE id IN (SELECT value FROM json_each(?))
+                """,
+                (json.dumps(ids),),
+            )
+            used = dict(cur.fetchall())
+
+        return {id: used.get(id, 0) for id in ids}
+
+    @classmethod
+    def weight_of_content(cls, content_ids: list[str]) -> int:
+        """Вес набора content_ids, например перед созданием персонажа"""
+        with cls.read("weight_of_content") as conn:
+            cur = conn.execute(
+                """
+                SELECT COALESCE(SUM(weight_bytes), 0)
+                FROM content_weight
+                WHERE content_id IN (SELECT DISTINCT value FROM json_each(?))
+                """,
+                (json.dumps(content_ids, ensure_ascii=False),),
+            )
+            return cur.fetchone()[0]
+
+    @classmethod
+    def find_weight_drift(cls, limit: int = 100) -> list[dict[str, int]]:
+        """
+        Пользователи, у которых player_char_weight расходится с весом,
+        посчитанным заново по player_char_content и content_weight.
+        """
+        with cls.read("find_weight_drift") as conn:
+            cur = conn.execute(
+                f"""
+                SELECT a.id, COALESCE(w.weight_bytes, 0), a.actual
+                FROM ({_WEIGHT_ACTUAL.format(ids=_ALL_WEIGHT_IDS)}) AS a
+                LEFT JOIN player_char_weight AS w ON w.id = a.id
+                WHERE COALESCE(w.weight_bytes, 0) != a.actual
+                ORDER BY a.id
+                LIMIT ?
+                """,
+                (limit,),
+            )
+            rows = cur.fetchall()
+
+        return [{"id": row[0], "ledger": row[1], "actual": row[2]} for row in rows]
+
+    @classmethod
+    async def aused_weight(cls, id: int) -> int:
+        return await cls.run_read(cls.used_weight, id)
+
+    @classmethod
+    async def aweight_of_content(cls, content_ids: list[str]) -> int:
+        return await cls.run_read(cls.weight_of_content, content_ids)
+
+    @classmethod
+    async def afind_weight_drift(cls, limit: int = 100) -> list[dict[str, int]]:
+        return await cls.run_read(cls.find_weight_drift, limit)
@@ -1,2 +1,5 @@
+from .effective_limits import EffectiveLimits
 from .perma_limit_db import PermaLimitDB
 from .timed_limit_db import TimedLimitDB, TimedLimitStatus
+from .timed_limit_expiry import TimedLimitExpiry
+from .weight_budget import WeightBudget
@@ -0,0 +1,123 @@
+import time
+from collections.abc import Iterable
+from typing import Any
+
+from .perma_limit_db import PermaLimitDB
+from .timed_limit_db import TimedLimitDB
+
+
+class EffectiveLimits:
+    """
+    Итоговые лимиты пользователя: перманентный лимит плюс сумма активных временных.
+    Временная часть берётся из агрегата timed_limit_total, который триггеры
+    обновляют на каждой записи в timed_limit. Если у пользователя наступил
+    next_expired, агрегат ещё содержит истёкшие строки, и для него сумма
+    считается напрямую по timed_limit до следующего обновления агрегата.
+    """
+
+    _IN_CHUNK = 500
+
+    @staticmethod
+    def _chunks(ids: list[int], size: int) -> Iterable[list[int]]:
+        for start in range(0, len(ids), size):
+            yield ids[start : start + size]
+
+    @classmethod
+    def _perma(cls, ids: list[int]) -> dict[int, tuple[int, int, int]]:
+        out: dict[int, tuple[int, int, int]] = {}
+
+        with PermaLimitDB.read("_perma") as conn:
+            for chunk in cls._chunks(ids, cls._IN_CHUNK):
+                cur = conn.execute(
+                    f"""
+                    SELECT id, char_slot, lore_char_slot, weight_bytes
+                    FROM perma_limit
+                    WHERE id IN ({", ".join("?" * len(chunk))})
+                    """,
+                    chunk,
+                )
+                for id_, char_slot, lore_char_slot, weight_bytes in cur:
+                    out[id_] = (char_slot, lore_char_slot, weight_bytes)
+
+        return out
+
+    @classmethod
+    def _timed(cls, ids: list[int], now: int) -> dict[int, tuple[int, int]]:
+        out: dict[int, tuple[int, int]] = {}
+        stale: list[int] = []
+
+        with TimedLimitDB.read("_timed") as conn:
+            for chunk in cls._chunks(ids, cls._IN_CHUNK):
+                cur = conn.execute(
+                    f"""
+                    SELECT id, char_slot, weight_bytes, next_expired
+                    FROM timed_limit_total
+                    WHERE id IN ({", ".join("?" * len(chunk))})
+                    """,
+                    chunk,
+                )
+                for id_, char_slot, weight_bytes, next_expired in cur:
+                    if next_expired is not None and next_expired <= now:
+                        stale.append(id_)
+
+                    else:
+                        out[id_] = (char_slot, weight_bytes)
+
+            for chunk in cls._chunks(stale, cls._IN_CHUNK):
+                cur = conn.execute(
+                    f"""
+                    SELECT id, SUM(char_slot), SUM(weight_bytes)
+                    FROM timed_limit
+                    WHERE id IN ({", ".join("?" * len(chunk))})
+                      AND status = 'active'
+                      AND expired > ?
+                    GROUP BY id
+                    """,
+                    (*chunk, now),
+                )
+                for id_, char_slot, weight_bytes in cur:
+                    out[id_] = (char_slot, weight_bytes)
+
+        return out
+
+    @classmethod
+    def get_many(
+        cls,
+        ids: Iterable[int],
+        now: int | None = None,
+    ) -> dict[int, dict[str, Any]]:
+        now = now or int(time.time())
+        ids = list(dict.fromkeys(ids))
+
+        perma = cls._perma(ids)
+        timed = cls._timed(ids, now)
+
+        out: dict[int, dict[str, Any]] = {}
+        for id_ in ids:
+            char_slot, lore_char_slot, weight_bytes = perma.get(id_, (0, 0, 0))
+            timed_char_slot, timed_weight_bytes = timed.get(id_, (0, 0))
+
+            out[id_] = {
+                "id": id_,
+                "char_slot": char_slot + timed_char_slot,
+                "lore_char_slot": lore_char_slot,
+                "weight_bytes": weight_bytes + timed_weight_bytes,
+            }
+
+        return out
+
+    @classmethod
+    def get(cls, id: int, now: int | None = None) -> dict[str, Any]:
+        return cls.get_many([id], now)[id]
+
+    @classmethod
+    async def aget(cls, id: int, now: int | None = None) -> dict[str, Any]:
+        return await TimedLimitDB.run_read(cls.get, id, now)
+
+    @classmethod
+    async def aget_many(
+        cls,
+        ids: Iterable[int],
+        now: int | None = None,
+    ) -> dict[int, dict[str, Any]]:
+        return await TimedLimitDB.run_read(cls.get_many, ids, now)
@@ -1,14 +1,14 @@
 from queue import Queue
 from typing import Any
 
-from ..base_db import BaseDB, SQLTask
+from ..base_db import BaseDB, SQLTask, WriteFuture
 
 
 class PermaLimitDB(BaseDB):
     _db_name = "perma_limit"
 
     _worker_started: bool = False
-    _queue = Queue()
+    _queue: Queue | None = None
 
     @classmethod
     def set_up(cls) -> None:
@@ -33,8 +33,8 @@ class PermaLimitDB(BaseDB):
         char_slot: int = 0,
         lore_char_slot: int = 0,
         weight_bytes: int = 0,
-    ) -> None:
-        cls.submit_write(
+    ) -> WriteFuture:
+        return cls.submit_write(
             SQLTask(
                 """
                 INSERT INTO perma_limit (id, char_slot, lore_char_slot, weight_bytes)
@@ -51,7 +51,7 @@ class PermaLimitDB(BaseDB):
         char_slot: int | None = None,
         lore_char_slot: int | None = None,
         weight_bytes: int | None = None,
-    ) -> None:
+    ) -> WriteFuture:
         fields = []
         params: list[Any] = []
 
@@ -68,11 +68,11 @@ class PermaLimitDB(BaseDB):
             params.append(weight_bytes)
 
         if not fields:
-            return
+            return WriteFuture.resolved()
 
         params.append(id)
 
-        cls.submit_write(
+        return cls.submit_write(
             SQLTask(
                 f"""
                 UPDATE perma_limit
@@ -80,16 +80,19 @@ class PermaLimitDB(BaseDB):
                 WHERE id = ?
                 """,
                 tuple(params),
+                key=id,
             )
         )
 
     @classmethod
-    def delete(cls, id: int) -> None:
-        cls.submit_write(SQLTask("DELETE FROM perma_limit WHERE id = ?", (id,)))
+    def delete(cls, id: int) -> WriteFuture:
+        return cls.submit_write(
+            SQLTask("DELETE FROM perma_limit WHERE id = ?", (id,), key=id)
+        )
 
     @classmethod
     def get(cls, id: int) -> dict[str, Any] | None:
-        with cls.read() as conn:
+        with cls.read("get") as conn:
             cur = conn.execute(
                 """
                 SELECT id, char_slot, lore_char_slot, weight_bytes
@@ -109,3 +112,7 @@ class PermaLimitDB(BaseDB):
             "lore_char_slot": row[2],
             "weight_bytes": row[3],
         }
+
+    @classmethod
+    async def aget(cls, id: int) -> dict[str, Any] | None:
+        return await cls.run_read(cls.get, id)
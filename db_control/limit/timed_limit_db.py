@@ -1,8 +1,11 @@
+import logging
 import time
+from collections.abc import Callable
 from queue import Queue
 from typing import Any, Literal
 
-from ..base_db import BaseDB, SQLTask
+from ..base_db import BaseDB, SQLTask, WriteFuture
+from ..row_mapper import RowMapper
 
 TimedLimitStatus = Literal[
     "active",
@@ -10,12 +13,98 @@ TimedLimitStatus = Literal[
     "disabled",
 ]
 
+CommitListener = Callable[[int | None], Any]
+
+# Пересчёт агрегата активных лимитов одного пользователя,
+# {owner} - NEW.id или OLD.id внутри триггера
+_TOTAL_REFRESH = """
+    INSERT INTO timed_limit_total (id, char_slot, weight_bytes, next_expired)
+    SELECT {owner}, COALESCE(SUM(char_slot), 0), COALESCE(SUM(weight_bytes), 0),
+           MIN(expired)
+    FROM timed_limit
+    WHERE id = {owner} AND status = 'active'
+    ON CONFLICT (id) DO UPDATE SET
+        char_slot = excluded.char_slot,
+        weight_bytes = excluded.weight_bytes,
+        next_expired = excluded.next_expired;
+"""
+
 
 class TimedLimitDB(BaseDB):
     _db_name = "timed_limit"
 
     _worker_started: bool = False
-    _queue = Queue()
+    _queue: Queue | None = None
+
+    _rows = RowMapper("uid", "id", "char_slot", "weight_bytes", "expired", "status")
+
+    _commit_listeners: list[CommitListener] = []
+
+    _migrations = [
+        [
+            SQLTask(
+                "CREATE INDEX IF NOT EXISTS idx_timed_limit_active "
+                "ON timed_limit (id, status, expired);"
+            ),
+        ],
+        [
+            SQLTask(
+                """
+                CREATE TABLE IF NOT EXISTS timed_limit_total (
+                    id INTEGER PRIMARY KEY,
+                    char_slot INTEGER NOT NULL DEFAULT 0,
+                    weight_bytes INTEGER NOT NULL DEFAULT 0,
+                    next_expired INTEGER
+                );
+                """
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_timed_limit_total_insert
+                AFTER INSERT ON timed_limit
+                BEGIN
+                    {_TOTAL_REFRESH.format(owner="NEW.id")}
+                END;
+                """
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_timed_limit_total_delete
+                AFTER DELETE ON timed_limit
+                BEGIN
+                    {_TOTAL_REFRESH.format(owner="OLD.id")}
+                END;
+                """
+            ),
+            SQLTask(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_timed_limit_total_update
+                AFTER UPDATE OF id, char_slot, weight_bytes, expired, status
+                ON timed_limit
+                BEGIN
+                    {_TOTAL_REFRESH.format(owner="OLD.id")}
+                    {_TOTAL_REFRESH.format(owner="NEW.id")}
+                END;
+                """
+            ),
+            SQLTask(
+                """
+                INSERT OR REPLACE INTO timed_limit_total
+                (id, char_slot, weight_bytes, next_expired)
+                SELECT id, SUM(char_slot), SUM(weight_bytes), MIN(expired)
+                FROM timed_limit
+                WHERE status = 'active'
+                GROUP BY id
+                """
+            ),
+        ],
+        [
+            SQLTask(
+                "CREATE INDEX IF NOT EXISTS idx_timed_limit_status_expired "
+                "ON timed_limit (status, expired);"
+            ),
+        ],
+    ]
 
     @classmethod
     def set_up(cls) -> None:
@@ -41,6 +130,40 @@ class TimedLimitDB(BaseDB):
         ]
         super()._init_db(sql_t)
 
+    @classmethod
+    def subscribe_commits(cls, listener: CommitListener) -> None:
+        """
+        listener вызывается в потоке воркера после коммита create и update,
+        меняющего expired или status. Получает новый expired,
+        None - если он не менялся (например, лимит снова включили).
+        """
+        cls._commit_listeners.append(listener)
+
+    @classmethod
+    def unsubscribe_commits(cls, listener: CommitListener) -> None:
+        if listener in cls._commit_listeners:
+            cls._commit_listeners.remove(listener)
+
+    @classmethod
+    def _notify_on_commit(
+        cls,
+        future: WriteFuture,
+        expired: int | None,
+    ) -> WriteFuture:
+        def notify(fut: WriteFuture) -> None:
+            if fut.cancelled() or fut.exception() is not None:
+                return
+
+            for listener in list(cls._commit_listeners):
+                try:
+                    listener(expired)
+
+                except Exception:
+                    logging.exception(f"DB {cls._db_name} commit listener failed")
+
+        future.add_done_callback(notify)
+        return future
+
     @classmethod
     def create(
         cls,
@@ -49,8 +172,8 @@ class TimedLimitDB(BaseDB):
         weight_bytes: int,
         expired: int,
         status: TimedLimitStatus = "active",
-    ) -> None:
-        cls.submit_write(
+    ) -> WriteFuture:
+        future = cls.submit_write(
             SQLTask(
                 """
                 INSERT INTO timed_limit
@@ -60,6 +183,7 @@ class TimedLimitDB(BaseDB):
                 (id, char_slot, weight_bytes, expired, status),
             )
         )
+        return cls._notify_on_commit(future, expired)
 
     @classmethod
     def update(
@@ -69,7 +193,7 @@ class TimedLimitDB(BaseDB):
         weight_bytes: int | None = None,
         expired: int | None = None,
         status: TimedLimitStatus | None = None,
-    ) -> None:
+    ) -> WriteFuture:
         fields = []
         params: list[Any] = []
 
@@ -90,11 +214,11 @@ class TimedLimitDB(BaseDB):
             params.append(status)
 
         if not fields:
-            return
+            return WriteFuture.resolved()
 
         params.append(uid)
 
-        cls.submit_write(
+        future = cls.submit_write(
             SQLTask(
                 f"""
                 UPDATE timed_limit
@@ -102,19 +226,26 @@ class TimedLimitDB(BaseDB):
                 WHERE uid = ?
                 """,
                 tuple(params),
+                key=uid,
             )
         )
+        if expired is None and status is None:
+            return future
+
+        return cls._notify_on_commit(future, expired)
 
     @classmethod
-    def delete(cls, uid: int) -> None:
-        cls.submit_write(SQLTask("DELETE FROM timed_limit WHERE uid = ?", (uid,)))
+    def delete(cls, uid: int) -> WriteFuture:
+        return cls.submit_write(
+            SQLTask("DELETE FROM timed_limit WHERE uid = ?", (uid,), key=uid)
+        )
 
     @classmethod
     def get(cls, uid: int) -> dict[str, Any] | None:
-        with cls.read() as conn:
+        with cls.read("get") as conn:
             cur = conn.execute(
-                """
-                SELECT uid, id, char_slot, weight_bytes, expired, status
+                f"""
+                SELECT {cls._rows.select}
                 FROM timed_limit
                 WHERE uid = ?
                 """,
@@ -122,24 +253,14 @@ class TimedLimitDB(BaseDB):
             )
             row = cur.fetchone()
 
-        if row is None:
-            return None
-
-        return {
-            "uid": row[0],
-            "id": row[1],
-            "char_slot": row[2],
-            "weight_bytes": row[3],
-            "expired": row[4],
-            "status": row[5],
-        }
+        return cls._rows.one(row)
 
     @classmethod
     def list_by_owner(cls, id: int) -> list[dict[str, Any]]:
-        with cls.read() as conn:
+        with cls.read("list_by_owner") as conn:
             cur = conn.execute(
-                """
-                SELECT uid, id, char_slot, weight_bytes, expired, status
+                f"""
+                SELECT {cls._rows.select}
                 FROM timed_limit
                 WHERE id = ?
                 ORDER BY expired
@@ -148,17 +269,7 @@ class TimedLimitDB(BaseDB):
             )
             rows = cur.fetchall()
 
-        return [
-            {
-                "uid": row[0],
-                "id": row[1],
-                "char_slot": row[2],
-                "weight_bytes": row[3],
-                "expired": row[4],
-                "status": row[5],
-            }
-            for row in rows
-        ]
+        return cls._rows.many(rows)
 
     @classmethod
     def list_active(
@@ -168,10 +279,10 @@ class TimedLimitDB(BaseDB):
     ) -> list[dict[str, Any]]:
         now = now or int(time.time())
 
-        with cls.read() as conn:
+        with cls.read("list_active") as conn:
             cur = conn.execute(
-                """
-                SELECT uid, id, char_slot, weight_bytes, expired, status
+                f"""
+                SELECT {cls._rows.select}
                 FROM timed_limit
                 WHERE id = ?
                   AND status = 'active'
@@ -182,14 +293,67 @@ class TimedLimitDB(BaseDB):
             )
             rows = cur.fetchall()
 
-        return [
-            {
-                "uid": row[0],
-                "id": row[1],
-                "char_slot": row[2],
-                "weight_bytes": row[3],
-                "expired": row[4],
-                "status": row[5],
-            }
-            for row in rows
-        ]
+        return cls._rows.many(rows)
+
+    @classmethod
+    def list_page(cls, after: int = 0, limit: int = 100) -> list[dict[str, Any]]:
+        """Страница по возрастанию uid, следующая начинается после последнего uid"""
+        with cls.read("list_page") as conn:
+            cur = conn.execute(
+                f"""
+                SELECT {cls._rows.select}
+                FROM timed_limit
+                WHERE uid > ?
+                ORDER BY uid
+                LIMIT ?
+                """,
+                (after, limit),
+            )
+            rows = cur.fetchall()
+
+        return cls._rows.many(rows)
+
+    @classmethod
+    def list_page_json(
+        cls,
+        after: int = 0,
+        limit: int = 100,
+    ) -> tuple[bytes, int | None]:
+        """list_page, собранный в JSON самим SQLite, и after следующей страницы"""
+        with cls.read("list_page_json") as conn:
+            cur = conn.execute(
+                cls._rows.json_array_sql(
+                    """
+                    SELECT *
+                    FROM timed_limit
+                    WHERE uid > ?
+                    ORDER BY uid
+                    LIMIT ?
+                    """,
+                    "uid",
+                ),
+                (after, limit),
+            )
+            body, count, last = cur.fetchone()
+
+        return body.encode("utf-8"), last if count == limit else None
+
+    @classmethod
+    async def aget(cls, uid: int) -> dict[str, Any] | None:
+        return await cls.run_read(cls.get, uid)
+
+    @classmethod
+    async def alist_by_owner(cls, id: int) -> list[dict[str, Any]]:
+        return await cls.run_read(cls.list_by_owner, id)
+
+    @classmethod
+    async def alist_active(
+        cls,
+        id: int,
+        now: int | None = None,
+    ) -> list[dict[str, Any]]:
+        return await cls.run_read(cls.list_active, id, now)
+
+    @classmethod
+    async def alist_page(cls, after: int = 0, limit: int = 100) -> list[dict[str, Any]]:
+        return await cls.run_read(cls.list_page, after, limit)
@@ -0,0 +1,210 @@
+import asyncio
+import inspect
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+from ..base_db import SQLTask
+from .timed_limit_db import TimedLimitDB
+
+log = logging.getLogger(__name__)
+
+ExpiryListener = Callable[[list[dict[str, Any]]], Any]
+
+
+class TimedLimitExpiry:
+    """
+    Фоновый планировщик истечения временных лимитов.
+    Спит до ближайшего expired среди активных строк (но не дольше _max_sleep),
+    переводит наступившие строки в статус expired пачками и сообщает подписчикам,
+    какие лимиты истекли.
+    """
+
+    _max_sleep: float = 60.0
+    """Потолок сна, чтобы подхватывать лимиты, созданные после засыпания"""
+    _batch_size: int = 500
+    _prune_after: int | None = None
+    """Через сколько секунд после истечения удалять expired строки, None - не удалять"""
+
+    _listeners: list[ExpiryListener] = []
+    _task: asyncio.Task | None = None
+    _wakeup: asyncio.Event | None = None
+    _event_loop: asyncio.AbstractEventLoop | None = None
+    _deadline: float | None = None
+    """time.time(), когда _loop проснётся сам, None - идёт проход"""
+
+    @classmethod
+    def subscribe(cls, listener: ExpiryListener) -> None:
+        """
+        listener получает список {"uid", "id", "expired"} истёкших строк.
+        Может быть обычной функцией или корутиной.
+        """
+        cls._listeners.append(listener)
+
+    @classmethod
+    def unsubscribe(cls, listener: ExpiryListener) -> None:
+        if listener in cls._listeners:
+            cls._listeners.remove(listener)
+
+    @classmethod
+    def _next_expired(cls) -> int | None:
+        with TimedLimitDB.read("_next_expired") as conn:
+            cur = conn.execute(
+                """
+                SELECT MIN(expired)
+                FROM timed_limit
+                WHERE status = 'active'
+                """
+            )
+            return cur.fetchone()[0]
+
+    @classmethod
+    def _due(cls, now: int) -> list[dict[str, Any]]:
+        with TimedLimitDB.read("_due") as conn:
+            cur = conn.execute(
+                """
+                SELECT uid, id, expired
+                FROM timed_limit
+                WHERE status = 'active'
+                  AND expired <= ?
+                ORDER BY expired
+                LIMIT ?
+                """,
+                (now, cls._batch_size),
+            )
+            rows = cur.fetchall()
+
+        return [{"uid": row[0], "id": row[1], "expired": row[2]} for row in rows]
+
+    @classmethod
+    async def _emit(cls, rows: list[dict[str, Any]]) -> None:
+        for listener in list(cls._listeners):
+            try:
+                result = listener(rows)
+                if inspect.isawaitable(result):
+                    await result
+
+            except Exception:
+                log.exception("Timed limit expiry listener failed: %s", listener)
+
+    @classmethod
+    async def run_once(cls, now: int | None = None) -> int:
+        """Переводит все наступившие лимиты в expired, возвращает их число"""
+        now = now or int(time.time())
+        total = 0
+
+        while True:
+            rows = await TimedLimitDB.run_read(cls._due, now)
+            if not rows:
+                break
+
+            uids = [row["uid"] for row in rows]
+            await TimedLimitDB.submit_write(
+                SQLTask(
+                    f"""
+                    UPDATE timed_limit
+                    SET status = 'expired'
+                    WHERE status = 'active'
+                      AND uid IN ({", ".join("?" * len(uids))})
+                    """,
+                    tuple(uids),
+                    key=uids,
+                )
+            )
+
+            total += len(rows)
+            await cls._emit(rows)
+
+            if len(rows) < cls._batch_size:
+                break
+
+        if cls._prune_after is not None:
+            await TimedLimitDB.submit_write(
+                SQLTask(
+                    """
+                    DELETE FROM timed_limit
+                    WHERE status = 'expired'
+                      AND expired <= ?
+                    """,
+                    (now - cls._prune_after,),
+                )
+            )
+
+        return total
+
+    @classmethod
+    async def _loop(cls) -> None:
+        assert cls._wakeup is not None
+
+        while True:
+            # Сброс до прохода: wake() во время прохода запустит следующий
+            cls._wakeup.clear()
+            cls._deadline = None
+            try:
+                await cls.run_once()
+                next_expired = await TimedLimitDB.run_read(cls._next_expired)
+
+            except Exception:
+                log.exception("Timed limit expiry pass failed")
+                next_expired = None
+
+            delay = cls._max_sleep
+            if next_expired is not None:
+                delay = min(max(next_expired - time.time(), 0.0), cls._max_sleep)
+
+            cls._deadline = time.time() + delay
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=delay)
+
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    def wake(cls, expired: int | None = None) -> None:
+        """
+        Будит планировщик, если expired наступает раньше, чем он проснётся сам,
+        None - будит всегда. Безопасно звать из любого потока, TimedLimitDB
+        зовёт его после коммита create и update.
+        """
+        loop, wakeup, deadline = cls._event_loop, cls._wakeup, cls._deadline
+        if loop is None or wakeup is None:
+            return
+
+        if expired is not None and deadline is not None and expired >= deadline:
+            return
+
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+
+        except RuntimeError:
+            # Event loop уже закрыт
+            pass
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._task is not None and not cls._task.done():
+            return
+
+        cls._event_loop = asyncio.get_running_loop()
+        cls._wakeup = asyncio.Event()
+        cls._task = asyncio.create_task(cls._loop())
+        TimedLimitDB.subscribe_commits(cls.wake)
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._task is None:
+            return
+
+        TimedLimitDB.unsubscribe_commits(cls.wake)
+        cls._task.cancel()
+        try:
+            await cls._task
+
+        except asyncio.CancelledError:
+            pass
+
+        cls._task = None
+        cls._wakeup = None
+        cls._event_loop = None
+        cls._deadline = None
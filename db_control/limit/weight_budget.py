@@ -0,0 +1,91 @@
+import time
+from collections.abc import Iterable
+from typing import Any
+
+from ..game import PlayerCharDB
+from .effective_limits import EffectiveLimits
+from .timed_limit_db import TimedLimitDB
+
+
+class WeightBudget:
+    """
+    Бюджет веса пользователя: weight_bytes из EffectiveLimits против
+    веса контента его персонажей. Занятый вес берётся из player_char_weight,
+    который триггеры PlayerCharDB держат в актуальном состоянии,
+    поэтому остаток - пара чтений по ключу без обхода персонажей.
+    """
+
+    @classmethod
+    def get_many(
+        cls,
+        ids: Iterable[int],
+        now: int | None = None,
+    ) -> dict[int, dict[str, Any]]:
+        now = now or int(time.time())
+        ids = list(dict.fromkeys(ids))
+
+        limits = EffectiveLimits.get_many(ids, now)
+        used = PlayerCharDB.used_weight_many(ids)
+
+        return {
+            id_: {
+                "id": id_,
+                "weight_bytes": limits[id_]["weight_bytes"],
+                "used_bytes": used[id_],
+                "remaining_bytes": limits[id_]["weight_bytes"] - used[id_],
+            }
+            for id_ in ids
+        }
+
+    @classmethod
+    def get(cls, id: int, now: int | None = None) -> dict[str, Any]:
+        return cls.get_many([id], now)[id]
+
+    @classmethod
+    def remaining(cls, id: int, now: int | None = None) -> int:
+        return cls.get(id, now)["remaining_bytes"]
+
+    @classmethod
+    def can_fit(
+        cls,
+        id: int,
+        content_ids: list[str],
+        replace_uid: int | None = None,
+        now: int | None = None,
+    ) -> bool:
+        """
+        Поместится ли персонаж с content_ids в бюджет пользователя.
+        replace_uid - персонаж, который при этом заменяется, его вес освобождается.
+        """
+        extra = PlayerCharDB.weight_of_content(content_ids)
+
+        if replace_uid is not None:
+            char = PlayerCharDB.get(replace_uid)
+            if char is not None and char["id"] == id:
+                extra -= PlayerCharDB.weight_of_content(char["content_ids"])
+
+        return extra <= cls.remaining(id, now)
+
+    @classmethod
+    async def aget(cls, id: int, now: int | None = None) -> dict[str, Any]:
+        return await TimedLimitDB.run_read(cls.get, id, now)
+
+    @classmethod
+    async def aget_many(
+        cls,
+        ids: Iterable[int],
+        now: int | None = None,
+    ) -> dict[int, dict[str, Any]]:
+        return await TimedLimitDB.run_read(cls.get_many, ids, now)
+
+    @classmethod
+    async def acan_fit(
+        cls,
+        id: int,
+        content_ids: list[str],
+        replace_uid: int | None = None,
+        now: int | None = None,
+    ) -> bool:
+        return await TimedLimitDB.run_read(
+            cls.can_fit, id, content_ids, replace_uid, now
+        )
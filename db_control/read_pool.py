@@ -0,0 +1,95 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+
+log = logging.getLogger(__name__)
+
+
+class ReadPool:
+    """
+    Пул соединений на чтение: одно соединение на поток.
+    PRAGMA применяются один раз при открытии, простаивающие соединения
+    проверяются перед повторным использованием.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        health_interval: float = 30.0,
+    ) -> None:
+        self._connect = connect
+        self._health_interval = health_interval
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: set[sqlite3.Connection] = set()
+        self._generation = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        local = self._local
+        conn: sqlite3.Connection | None = getattr(local, "conn", None)
+
+        if conn is not None and local.generation != self._generation:
+            conn = None
+
+        if conn is not None:
+            now = time.monotonic()
+            if now - local.last_used > self._health_interval:
+                if not self._is_healthy(conn):
+                    self.discard(conn)
+                    conn = None
+
+            if conn is not None:
+                local.last_used = now
+                return conn
+
+        conn = self._connect()
+
+        with self._lock:
+            self._conns.add(conn)
+            local.generation = self._generation
+
+        local.conn = conn
+        local.last_used = time.monotonic()
+        return conn
+
+    def discard(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._conns.discard(conn)
+
+        if getattr(self._local, "conn", None) is conn:
+            self._local.conn = None
+
+        try:
+            conn.close()
+
+        except sqlite3.Error:
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            conns = list(self._conns)
+            self._conns.clear()
+            self._generation += 1
+
+        for conn in conns:
+            try:
+                conn.close()
+
+            except sqlite3.Error:
+                log.exception("Failed to close read connection")
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._conns)
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+
+        except sqlite3.Error:
+            return False
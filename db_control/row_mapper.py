@@ -0,0 +1,91 @@
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+import json_codec
+
+
+@dataclass(frozen=True)
+class Col:
+    name: str
+    convert: Callable[[Any], Any] | None = None
+    """Преобразование значения из SQLite в Python"""
+    json_sql: str | None = None
+    """Выражение для json_object, если колонку нельзя отдать как есть"""
+
+
+def _json_list(raw: Any) -> list:
+    try:
+        value = json_codec.loads(raw)
+
+    except Exception:
+        return []
+
+    return value if isinstance(value, list) else []
+
+
+def bool_col(name: str) -> Col:
+    return Col(name, bool, f"json(CASE WHEN {name} THEN 'true' ELSE 'false' END)")
+
+
+def json_list_col(name: str) -> Col:
+    """JSON-массив в TEXT/BLOB, битое значение читается как []"""
+    return Col(
+        name,
+        _json_list,
+        f"CASE WHEN json_valid({name}) AND json_type({name}) = 'array' "
+        f"THEN json({name}) ELSE json('[]') END",
+    )
+
+
+class RowMapper:
+    """
+    Общий список колонок выборки и превращение строк SQLite в dict.
+    Если ни у одной колонки нет convert, строка собирается через dict(zip(...)),
+    иначе преобразования применяются только к нужным позициям.
+    json_array_sql строит тот же ответ сразу в SQLite, минуя dict и json.dumps.
+    """
+
+    def __init__(self, *columns: str | Col) -> None:
+        self.cols = tuple(c if isinstance(c, Col) else Col(c) for c in columns)
+        self.columns = tuple(c.name for c in self.cols)
+        self.select = ", ".join(self.columns)
+
+        self._converters = tuple(
+            (c.name, c.convert) for c in self.cols if c.convert is not None
+        )
+
+    def _row(self, row: tuple) -> dict[str, Any]:
+        out = dict(zip(self.columns, row))
+        for name, convert in self._converters:
+            out[name] = convert(out[name])
+
+        return out
+
+    def one(self, row: tuple | None) -> dict[str, Any] | None:
+        if row is None:
+            return None
+
+        return self._row(row)
+
+    def many(self, rows: Iterable[tuple]) -> list[dict[str, Any]]:
+        if not self._converters:
+            columns = self.columns
+            return [dict(zip(columns, row)) for row in rows]
+
+        return [self._row(row) for row in rows]
+
+    def json_object(self) -> str:
+        """SQL json_object(...) с теми же ключами, что и у many"""
+        parts = [f"'{c.name}', {c.json_sql or c.name}" for c in self.cols]
+        return f"json_object({', '.join(parts)})"
+
+    def json_array_sql(self, source: str, key: str) -> str:
+        """
+        Запрос, возвращающий (JSON-массив строк, их число, последний key)
+        для source - подзапроса с WHERE/ORDER BY/LIMIT.
+        """
+        return f"""
+            SELECT json_group_array({self.json_object()}), COUNT(*), MAX({key})
+            FROM ({source})
+        """
@@ -0,0 +1,3 @@
+from .credentials_db import CredentialsDB
+from .profile_db import UserProfileDB
+from .provisioning_db import UserProvisioningDB
@@ -1,16 +1,49 @@
+import json
+from collections.abc import Iterable
 from queue import Queue
 from typing import Any
 
-from db_control.base_db import SQLTask
-
-from ..base_db import BaseDB
+from ..base_db import BaseDB, SQLTask, WriteFuture
+from ..cache import TTLCache
+from ..row_mapper import RowMapper, bool_col
 
 
 class CredentialsDB(BaseDB):
     _db_name = "credentials"
 
     _worker_started: bool = False
-    _queue = Queue()
+    _queue: Queue | None = None
+
+    _migrations = [
+        [
+            SQLTask(
+                "CREATE INDEX IF NOT EXISTS idx_credentials_steam64_id "
+                "ON credentials (steam64_id);"
+            ),
+        ],
+        [
+            SQLTask(
+                "CREATE INDEX IF NOT EXISTS idx_credentials_dirty "
+                "ON credentials (id) WHERE dirty = 1;"
+            ),
+        ],
+        [
+            SQLTask(
+                "ALTER TABLE credentials "
+                "ADD COLUMN dirty_seq INTEGER NOT NULL DEFAULT 0;"
+            ),
+        ],
+    ]
+
+    _rows = RowMapper("id", "discord_id", "steam64_id", bool_col("dirty"))
+    _dirty_rows = RowMapper(*_rows.cols, "dirty_seq")
+    """Строки ленты dirty: dirty_seq растёт на каждом set_dirty"""
+
+    _IN_CHUNK = 500
+    """Сколько параметров в одном IN (...) при пакетном поиске"""
+
+    _cache = TTLCache(maxsize=100_000, ttl=300.0, negative_ttl=10.0)
+    """Ключи ("id" | "discord_id" | "steam64_id", значение), тег - id пользователя"""
 
     @classmethod
     def set_up(cls) -> None:
@@ -29,17 +62,64 @@ class CredentialsDB(BaseDB):
         super()._init_db(sql_t)
 
     @classmethod
-    def create(cls, discord_id: str, steam64_id: str | None) -> None:
-        cls.submit_write(
+    def _invalidate(
+        cls,
+        id: int | None = None,
+        discord_id: str | None = None,
+        steam64_id: str | None = None,
+    ) -> None:
+        keys: list[tuple[str, Any]] = []
+
+        if id is not None:
+            keys.append(("id", id))
+            cls._cache.invalidate_tag(id)
+
+        if discord_id is not None:
+            keys.append(("discord_id", discord_id))
+
+        if steam64_id is not None:
+            keys.append(("steam64_id", steam64_id))
+
+        cls._cache.invalidate(*keys)
+
+    @classmethod
+    def _invalidate_on_commit(
+        cls,
+        future: WriteFuture,
+        id: int | None = None,
+        discord_id: str | None = None,
+        steam64_id: str | None = None,
+    ) -> WriteFuture:
+        def invalidate(fut: WriteFuture) -> None:
+            user_id = id
+            if user_id is None and not fut.cancelled() and fut.exception() is None:
+                user_id = fut.result().lastrowid
+
+            cls._invalidate(user_id, discord_id, steam64_id)
+
+        future.add_done_callback(invalidate)
+        return future
+
+    @classmethod
+    def create(cls, discord_id: str, steam64_id: str | None) -> WriteFuture:
+        future = cls.submit_write(
             SQLTask(
                 "INSERT INTO credentials (discord_id, steam64_id) VALUES (?, ?)",
                 (discord_id, steam64_id),
             )
         )
+        return cls._invalidate_on_commit(
+            future,
+            discord_id=discord_id,
+            steam64_id=steam64_id,
+        )
 
     @classmethod
-    def delete(cls, id: int) -> None:
-        cls.submit_write(SQLTask("DELETE FROM credentials WHERE id = ?", (id,)))
+    def delete(cls, id: int) -> WriteFuture:
+        future = cls.submit_write(
+            SQLTask("DELETE FROM credentials WHERE id = ?", (id,), key=id)
+        )
+        return cls._invalidate_on_commit(future, id=id)
 
     @classmethod
     def update(
@@ -47,7 +127,7 @@ class CredentialsDB(BaseDB):
         id: int,
         discord_id: str | None,
         steam64_id: str | None,
-    ) -> None:
+    ) -> WriteFuture:
         fields = []
         params: list[Any] = []
 
@@ -60,16 +140,23 @@ class CredentialsDB(BaseDB):
             params.append(steam64_id)
 
         if not fields:
-            return
+            return WriteFuture.resolved()
 
         params.append(id)
 
-        cls.submit_write(
+        future = cls.submit_write(
             SQLTask(
                 f"UPDATE credentials SET {', '.join(fields)} WHERE id = ?",
                 tuple(params),
+                key=id,
             )
         )
+        return cls._invalidate_on_commit(
+            future,
+            id=id,
+            discord_id=discord_id,
+            steam64_id=steam64_id,
+        )
 
     @classmethod
     def _get_by(
@@ -91,10 +178,15 @@ class CredentialsDB(BaseDB):
 
         field, value = active[0]
 
-        with cls.read() as conn:
+        hit, cached = cls._cache.get((field, value))
+        if hit:
+            return None if cached is None else dict(cached)
+
+        epoch = cls._cache.epoch
+        with cls.read(f"get_by_{field}") as conn:
             cur = conn.execute(
                 f"""
-                SELECT id, discord_id, steam64_id, dirty
+                SELECT {cls._rows.select}
                 FROM credentials
                 WHERE {field} = ?
                 """,
@@ -103,15 +195,125 @@ class CredentialsDB(BaseDB):
             row = cur.fetchone()
 
         if row is None:
+            cls._cache.put((field, value), None, epoch=epoch)
             return None
 
-        return {
-            "id": row[0],
-            "discord_id": row[1],
-            "steam64_id": row[2],
-            "dirty": bool(row[3]),
+        out = cls._row_to_dict(row)
+        cls._remember(out, epoch)
+        return dict(out)
+
+    @classmethod
+    def _row_to_dict(cls, row: tuple) -> dict[str, Any]:
+        return cls._rows.one(row)
+
+    @classmethod
+    def _remember(cls, out: dict[str, Any], epoch: int) -> None:
+        # Кладём под все идентификаторы сразу, чтобы следующий поиск
+        # по любому из них попал в кэш
+        for key in ("id", "discord_id", "steam64_id"):
+            if out[key] is not None:
+                cls._cache.put((key, out[key]), out, tag=out["id"], epoch=epoch)
+
+    @classmethod
+    def get_many(
+        cls,
+        ids: Iterable[int] = (),
+        discord_ids: Iterable[str] = (),
+        steam64_ids: Iterable[str] = (),
+    ) -> dict[str, dict[Any, dict[str, Any] | None]]:
+        """
+        Резолвит пачку пользователей по смеси идентификаторов.
+        Всё, чего нет в кэше, добирается запросами IN (...) кусками
+        по _IN_CHUNK на одном соединении.
+        Возвращает {"id": {...}, "discord_id": {...}, "steam64_id": {...}},
+        ненайденные значения мапятся в None.
+        """
+        requested = {
+            "id": list(dict.fromkeys(ids)),
+            "discord_id": list(dict.fromkeys(discord_ids)),
+            "steam64_id": list(dict.fromkeys(steam64_ids)),
         }
 
+        result: dict[str, dict[Any, dict[str, Any] | None]] = {}
+        missing: dict[str, list[Any]] = {}
+
+        for field, values in requested.items():
+            found = result[field] = {}
+            for value in values:
+                hit, cached = cls._cache.get((field, value))
+                if hit:
+                    found[value] = None if cached is None else dict(cached)
+
+                else:
+                    missing.setdefault(field, []).append(value)
+
+        if not missing:
+            return result
+
+        epoch = cls._cache.epoch
+        with cls.read("get_many") as conn:
+            for field, values in missing.items():
+                for start in range(0, len(values), cls._IN_CHUNK):
+                    chunk = values[start : start + cls._IN_CHUNK]
+                    cur = conn.execute(
+                        f"""
+                        SELECT {cls._rows.select}
+                        FROM credentials
+                        WHERE {field} IN ({", ".join("?" * len(chunk))})
+                        ORDER BY id
+                        """,
+                        chunk,
+                    )
+
+                    for row in cur:
+                        out = cls._row_to_dict(row)
+                        if out[field] in result[field]:
+                            continue
+
+                        cls._remember(out, epoch)
+                        result[field][out[field]] = dict(out)
+
+                for value in values:
+                    if value not in result[field]:
+                        cls._cache.put((field, value), None, epoch=epoch)
+                        result[field][value] = None
+
+        return result
+
+    @classmethod
+    def get_many_by_id(cls, ids: Iterable[int]) -> dict[int, dict[str, Any] | None]:
+        return cls.get_many(ids=ids)["id"]
+
+    @classmethod
+    def get_many_by_discord(
+        cls,
+        discord_ids: Iterable[str],
+    ) -> dict[str, dict[str, Any] | None]:
+        return cls.get_many(discord_ids=discord_ids)["discord_id"]
+
+    @classmethod
+    def get_many_by_steam(
+        cls,
+        steam64_ids: Iterable[str],
+    ) -> dict[str, dict[str, Any] | None]:
+        return cls.get_many(steam64_ids=steam64_ids)["steam64_id"]
+
+    @classmethod
+    def list_page(cls, after: int = 0, limit: int = 100) -> list[dict[str, Any]]:
+        """Страница по возрастанию id, следующая начинается после последнего id"""
+        with cls.read("list_page") as conn:
+            cur = conn.execute(
+                f"""
+                SELECT {cls._rows.select}
+                FROM credentials
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (after, limit),
+            )
+            return cls._rows.many(cur)
+
     @classmethod
     def get_by_id(cls, id: int) -> dict[str, Any] | None:
         return cls._get_by(id=id, discord_id=None, steam64_id=None)
@@ -125,13 +327,142 @@ class CredentialsDB(BaseDB):
         return cls._get_by(id=None, discord_id=None, steam64_id=steam64_id)
 
     @classmethod
-    def set_dirty(cls, id: int) -> None:
-        cls.submit_write(
-            SQLTask("UPDATE credentials SET dirty = 1 WHERE id = ?", (id,))
+    def set_dirty(cls, id: int) -> WriteFuture:
+        future = cls.submit_write(
+            SQLTask(
+                """
+                UPDATE credentials
+                SET dirty = 1, dirty_seq = dirty_seq + 1
+                WHERE id = ?
+                """,
+                (id,),
+                key=id,
+            )
+        )
+        return cls._invalidate_on_commit(future, id=id)
+
+    @classmethod
+    def clear_dirty(cls, id: int) -> WriteFuture:
+        future = cls.submit_write(
+            SQLTask("UPDATE credentials SET dirty = 0 WHERE id = ?", (id,), key=id)
         )
+        return cls._invalidate_on_commit(future, id=id)
 
     @classmethod
-    def clear_dirty(cls, id: int) -> None:
-        cls.submit_write(
-            SQLTask("UPDATE credentials SET dirty = 0 WHERE id = ?", (id,))
+    def clear_dirty_many(cls, acks: Iterable[tuple[int, int]]) -> WriteFuture:
+        """
+        Снимает dirty с пачки пользователей одним UPDATE в одной транзакции.
+        acks - пары (id, dirty_seq) из list_dirty: строка, которую снова
+        пометили после чтения, не совпадёт по dirty_seq и останется dirty.
+        """
+        acks = dict(acks)
+        if not acks:
+            return WriteFuture.resolved()
+
+        ids = list(acks)
+        future = cls.submit_write(
+            SQLTask(
+                """
+                UPDATE credentials
+                SET dirty = 0
+                WHERE dirty = 1
+                  AND (id, dirty_seq) IN (
+                      SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+                      FROM json_each(?)
+                  )
+                """,
+                (json.dumps(list(acks.items())),),
+                key=ids,
+            )
         )
+
+        def invalidate(fut: WriteFuture) -> None:
+            for id in ids:
+                cls._cache.invalidate_tag(id)
+            cls._cache.invalidate(*(("id", id) for id in ids))
+
+        future.add_done_callback(invalidate)
+        return future
+
+    @classmethod
+    def list_dirty(cls, after: int = 0, limit: int = 100) -> list[dict[str, Any]]:
+        """
+        Лента изменённых пользователей по возрастанию id.
+        Идёт по частичному индексу idx_credentials_dirty, поэтому стоит
+        пропорционально числу dirty строк, а не всей таблице.
+        dirty_seq из строки передаётся обратно в clear_dirty_many.
+        """
+        with cls.read("list_dirty") as conn:
+            cur = conn.execute(
+                f"""
+                SELECT {cls._dirty_rows.select}
+                FROM credentials
+                WHERE dirty = 1 AND id > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (after, limit),
+            )
+            return cls._dirty_rows.many(cur)
+
+    @classmethod
+    def list_page_json(
+        cls,
+        after: int = 0,
+        limit: int = 100,
+    ) -> tuple[bytes, int | None]:
+        """list_page, собранный в JSON самим SQLite, и after следующей страницы"""
+        with cls.read("list_page_json") as conn:
+            cur = conn.execute(
+                cls._rows.json_array_sql(
+                    """
+                    SELECT *
+                    FROM credentials
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    "id",
+                ),
+                (after, limit),
+            )
+            body, count, last = cur.fetchone()
+
+        return body.encode("utf-8"), last if count == limit else None
+
+    @classmethod
+    async def alist_dirty(
+        cls,
+        after: int = 0,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        return await cls.run_read(cls.list_dirty, after, limit)
+
+    @classmethod
+    def cache_stats(cls) -> dict[str, int]:
+        return cls._cache.stats()
+
+    @classmethod
+    async def aget_by_id(cls, id: int) -> dict[str, Any] | None:
+        return await cls.run_read(cls.get_by_id, id)
+
+    @classmethod
+    async def aget_by_discord(cls, discord_id: str) -> dict[str, Any] | None:
+        return await cls.run_read(cls.get_by_discord, discord_id)
+
+    @classmethod
+    async def aget_by_steam(cls, steam64_id: str) -> dict[str, Any] | None:
+        return await cls.run_read(cls.get_by_steam, steam64_id)
+
+    @classmethod
+    async def aget_many(
+        cls,
+        ids: Iterable[int] = (),
+        discord_ids: Iterable[str] = (),
+        steam64_ids: Iterable[str] = (),
+    ) -> dict[str, dict[Any, dict[str, Any] | None]]:
+        return await cls.run_read(cls.get_many, ids, discord_ids, steam64_ids)
+
+    @classmethod
+    async def alist_page(cls, after: int = 0, limit: int = 100) -> list[dict[str, Any]]:
+        return await cls.run_read(cls.list_page, after, limit)
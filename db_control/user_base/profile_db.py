@@ -0,0 +1,147 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any
+
+from config import DB_ATTACH, AccessKeys
+
+from ..admis import AccessDB
+from ..base_db import BaseDB
+from ..game import PlayerCharDB
+from ..limit import PermaLimitDB, TimedLimitDB
+from .credentials_db import CredentialsDB
+
+
+class UserProfileDB(BaseDB):
+    """
+    Составные чтения по всем БД пользователя.
+    Соединения на чтение открываются на credentials с ATTACH остальных файлов
+    под именами их _db_name, поэтому профиль собирается одним JOIN запросом.
+    Своих таблиц и записей нет. При выключенном DB_ATTACH профиль собирается
+    отдельными чтениями из каждой БД.
+    """
+
+    _db_name = "user_profile"
+
+    _attached: tuple[type[BaseDB], ...] = (
+        AccessDB,
+        PermaLimitDB,
+        TimedLimitDB,
+        PlayerCharDB,
+    )
+
+    @classmethod
+    def _db_path(cls) -> Path:
+        """Файл общий с CredentialsDB, имя своё для метрик и реестра"""
+        return CredentialsDB._db_path()
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        conn = super()._connect()
+        for db in cls._attached:
+            conn.execute(f"ATTACH DATABASE ? AS {db._db_name};", (str(db._db_path()),))
+
+        return conn
+
+    @classmethod
+    def _get_profile_joined(cls, id: int, now: int) -> dict[str, Any] | None:
+        with cls.read("_get_profile_joined") as conn:
+            cur = conn.execute(
+                f"""
+                SELECT
+                    c.id, c.discord_id, c.steam64_id, c.dirty,
+                    a.id, a.version, a.mask, a.access,
+                    p.id, p.char_slot, p.lore_char_slot, p.weight_bytes,
+                    (
+                        SELECT json_group_array({TimedLimitDB._rows.json_object()})
+                        FROM (
+                            SELECT {TimedLimitDB._rows.select}
+                            FROM timed_limit.timed_limit
+                            WHERE id = c.id
+                              AND status = 'active'
+                              AND expired > ?
+                            ORDER BY expired
+                        )
+                    ),
+                    (
+                        SELECT json_group_array({PlayerCharDB._rows.json_object()})
+                        FROM (
+                            SELECT {PlayerCharDB._rows.select}
+                            FROM player_char_db.player_char_db
+                            WHERE id = c.id
+                            ORDER BY uid
+                        )
+                    )
+                FROM credentials AS c
+                LEFT JOIN access.access AS a ON a.id = c.id
+                LEFT JOIN perma_limit.perma_limit AS p ON p.id = c.id
+                WHERE c.id = ?
+                """,
+                (now, id),
+            )
+            row = cur.fetchone()
+
+        if row is None:
+            return None
+
+        access = None
+        if row[4] is not None:
+            mask = AccessDB._resolve_mask(row[4], row[6], row[7])
+            access = {
+                "id": row[4],
+                "version": row[5],
+                "access": AccessKeys.from_mask(mask),
+            }
+
+        perma_limit = None
+        if row[8] is not None:
+            perma_limit = {
+                "id": row[8],
+                "char_slot": row[9],
+                "lore_char_slot": row[10],
+                "weight_bytes": row[11],
+            }
+
+        return {
+            "credentials": CredentialsDB._row_to_dict(row[0:4]),
+            "access": access,
+            "perma_limit": perma_limit,
+            "timed_limit": json.loads(row[12]),
+            "player_char": json.loads(row[13]),
+        }
+
+    @classmethod
+    def _get_profile_split(cls, id: int, now: int) -> dict[str, Any] | None:
+        credentials = CredentialsDB.get_by_id(id)
+        if credentials is None:
+            return None
+
+        return {
+            "credentials": credentials,
+            "access": AccessDB.get(id),
+            "perma_limit": PermaLimitDB.get(id),
+            "timed_limit": TimedLimitDB.list_active(id, now),
+            "player_char": PlayerCharDB.list_by_owner(id),
+        }
+
+    @classmethod
+    def get_profile(cls, id: int, now: int | None = None) -> dict[str, Any] | None:
+        """
+        Полный профиль: credentials, access, perma_limit,
+        активные timed_limit и персонажи игрока.
+        """
+        now = now or int(time.time())
+
+        if DB_ATTACH:
+            return cls._get_profile_joined(id, now)
+
+        return cls._get_profile_split(id, now)
+
+    @classmethod
+    async def aget_profile(
+        cls,
+        id: int,
+        now: int | None = None,
+    ) -> dict[str, Any] | None:
+        return await cls.run_read(cls.get_profile, id, now)
@@ -0,0 +1,271 @@
+import json
+import logging
+import sqlite3
+from collections.abc import Iterable
+from queue import Queue
+
+from config import AccessKeys
+
+from ..admis import AccessDB
+from ..base_db import (
+    BaseDB,
+    SQLTask,
+    WriteFuture,
+    WriteResult,
+    _PendingWrite,
+    _resolve,
+)
+from ..change_log import ChangeLog, parse_write
+from ..game import PlayerCharDB
+from ..limit import PermaLimitDB, TimedLimitDB
+from .credentials_db import CredentialsDB
+
+# Временные объекты соединения воркера. Триггеры TEMP могут писать
+# в таблицы всех подключённых БД, но только по неквалифицированным именам,
+# поэтому имена таблиц в файлах пользователя не должны повторяться
+_TEMP_SCHEMA = [
+    """
+    CREATE TEMP VIEW IF NOT EXISTS user_provision AS
+    SELECT
+        c.id, c.discord_id, c.steam64_id,
+        a.version, a.mask,
+        p.char_slot, p.lore_char_slot, p.weight_bytes
+    FROM credentials.credentials AS c
+    LEFT JOIN access.access AS a ON a.id = c.id
+    LEFT JOIN perma_limit.perma_limit AS p ON p.id = c.id;
+    """,
+    """
+    CREATE TEMP TRIGGER IF NOT EXISTS trg_user_provision_insert
+    INSTEAD OF INSERT ON user_provision
+    BEGIN
+        INSERT INTO credentials (discord_id, steam64_id)
+        VALUES (NEW.discord_id, NEW.steam64_id);
+
+        -- Внутри триггера last_insert_rowid() - id из credentials,
+        -- а у access id и есть rowid, так что он не меняется и дальше
+        INSERT INTO access (id, version, mask, access)
+        VALUES (
+            last_insert_rowid(), COALESCE(NEW.version, 0), COALESCE(NEW.mask, 0), x''
+        );
+
+        INSERT INTO perma_limit (id, char_slot, lore_char_slot, weight_bytes)
+        VALUES (
+            last_insert_rowid(), COALESCE(NEW.char_slot, 0),
+            COALESCE(NEW.lore_char_slot, 0), COALESCE(NEW.weight_bytes, 0)
+        );
+    END;
+    """,
+    """
+    CREATE TEMP TRIGGER IF NOT EXISTS trg_user_provision_delete
+    INSTEAD OF DELETE ON user_provision
+    BEGIN
+        DELETE FROM player_char_db WHERE id = OLD.id;
+        DELETE FROM player_char_weight WHERE id = OLD.id;
+        DELETE FROM timed_limit WHERE id = OLD.id;
+        DELETE FROM perma_limit WHERE id = OLD.id;
+        DELETE FROM access WHERE id = OLD.id;
+        DELETE FROM credentials WHERE id = OLD.id;
+    END;
+    """,
+]
+
+
+class UserProvisioningDB(BaseDB):
+    """
+    Создание и удаление пользователя целиком одной записью.
+    Соединения открываются на своём пустом файле с ATTACH всех БД пользователя,
+    запись идёт в TEMP представление user_provision, а его INSTEAD OF триггеры
+    раскладывают её по credentials, access, perma_limit и при удалении
+    вычищают timed_limit и персонажей. Оператор с триггерами атомарен,
+    а группа таких операторов коммитится воркером одной транзакцией.
+
+    В WAL коммит транзакции с несколькими файлами атомарен для каждого файла
+    отдельно: при падении процесса посреди коммита часть файлов может
+    остаться без изменений. Без сбоев другие соединения видят либо всё, либо ничего
+    в пределах каждого файла.
+    """
+
+    _db_name = "user_provisioning"
+
+    _worker_started: bool = False
+    _queue: Queue | None = None
+
+    _attached: tuple[type[BaseDB], ...] = (
+        CredentialsDB,
+        AccessDB,
+        PermaLimitDB,
+        TimedLimitDB,
+        PlayerCharDB,
+    )
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        conn = super()._connect()
+        for db in cls._attached:
+            conn.execute(f"ATTACH DATABASE ? AS {db._db_name};", (str(db._db_path()),))
+            # synchronous задаётся на каждую схему, по умолчанию у ATTACH - FULL
+            conn.execute(f"PRAGMA {db._db_name}.synchronous=NORMAL;")
+
+        for sql in _TEMP_SCHEMA:
+            conn.execute(sql)
+
+        return conn
+
+    @classmethod
+    def set_up(cls) -> None:
+        """Вызывается после set_up всех БД из _attached"""
+        super()._init_db([])
+
+    @classmethod
+    def _find_ids(cls, discord_ids: list[str]) -> dict[str, int]:
+        with cls.read("_find_ids") as conn:
+            cur = conn.execute(
+                """
+                SELECT discord_id, id
+                FROM credentials.credentials
+                WHERE discord_id IN (SELECT value FROM json_each(?))
+                """,
+                (json.dumps(discord_ids, ensure_ascii=False),),
+            )
+            return dict(cur.fetchall())
+
+    @classmethod
+    def _log_changes(
+        cls,
+        done: Iterable[tuple[_PendingWrite, WriteResult | None]],
+    ) -> None:
+        """
+        user_provision - временное представление, поэтому изменения пишутся
+        по настоящим таблицам. id созданных пользователей ищутся одним запросом
+        на пачку, и future каждого INSERT резолвится здесь с lastrowid = id:
+        воркер потом резолвит только ещё не завершённые future.
+        """
+        created: list[_PendingWrite] = []
+        deleted: list[int] = []
+
+        for item, result in done:
+            if item.task is None or result is None:
+                continue
+
+            if parse_write(item.task.sql) == ("insert", "user_provision"):
+                created.append(item)
+
+            else:
+                deleted.append(item.task.key)
+
+        found: dict[str, int] = {}
+        try:
+            if created:
+                found = cls._find_ids([item.task.params[0] for item in created])
+            ids = list(found.values())
+
+            for db, table in (
+                (CredentialsDB, "credentials"),
+                (AccessDB, "access"),
+                (PermaLimitDB, "perma_limit"),
+            ):
+                ChangeLog.append(
+                    db._db_name,
+                    [(table, id, "insert") for id in ids]
+                    + [(table, id, "delete") for id in deleted],
+                )
+
+            # Строки timed_limit и персонажей адресуются uid, а не id
+            if deleted:
+                for db, table in (
+                    (TimedLimitDB, "timed_limit"),
+                    (PlayerCharDB, "player_char_db"),
+                ):
+                    ChangeLog.append(db._db_name, [(table, None, "delete")])
+
+        except Exception:
+            logging.exception(f"DB {cls._db_name} change log append failed")
+
+        # Ненайденные резолвит воркер с lastrowid 0, create доищет их сам
+        for item in created:
+            id = found.get(item.task.params[0])
+            if id is not None:
+                _resolve(item.future, WriteResult(lastrowid=id, rowcount=1))
+
+    @classmethod
+    def create(
+        cls,
+        discord_id: str,
+        steam64_id: str | None = None,
+        version: int = 0,
+        access: dict[str, bool] | None = None,
+        char_slot: int = 0,
+        lore_char_slot: int = 0,
+        weight_bytes: int = 0,
+    ) -> WriteFuture:
+        """
+        Создаёт credentials, access и perma_limit пользователя.
+        lastrowid результата - id нового пользователя, как у CredentialsDB.create.
+        """
+        mask = AccessKeys.to_mask(access or {})
+
+        written = cls.submit_write(
+            SQLTask(
+                """
+                INSERT INTO user_provision (
+                    discord_id, steam64_id, version, mask,
+                    char_slot, lore_char_slot, weight_bytes
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    discord_id,
+                    steam64_id,
+                    version,
+                    mask,
+                    char_slot,
+                    lore_char_slot,
+                    weight_bytes,
+                ),
+            )
+        )
+
+        future = WriteFuture()
+
+        def resolve(fut: WriteFuture) -> None:
+            if fut.cancelled():
+                future.cancel()
+                return
+
+            if fut.exception() is not None:
+                _resolve(future, exc=fut.exception())
+                return
+
+            id = fut.result().lastrowid
+            if not id:
+                try:
+                    id = cls._find_ids([discord_id])[discord_id]
+
+                except Exception as exc:
+                    _resolve(future, exc=exc)
+                    return
+
+            # lastrowid оператора с INSTEAD OF всегда 0, поэтому кэш
+            # (в том числе отрицательный по id) чистится здесь, по найденному id
+            CredentialsDB._invalidate(id, discord_id, steam64_id)
+            _resolve(future, WriteResult(lastrowid=id, rowcount=1))
+
+        AccessDB._on_commit(
+            future,
+            lambda perms: perms.update({future.result().lastrowid: (version, mask)}),
+        )
+        written.add_done_callback(resolve)
+        return future
+
+    @classmethod
+    def delete(cls, id: int) -> WriteFuture:
+        """
+        Удаляет пользователя вместе с лимитами и персонажами.
+        rowcount результата всегда 0: INSTEAD OF триггеры его не считают.
+        """
+        future = cls.submit_write(
+            SQLTask("DELETE FROM user_provision WHERE id = ?", (id,), key=id)
+        )
+        CredentialsDB._invalidate_on_commit(future, id=id)
+        AccessDB._on_commit(future, lambda perms: perms.pop(id, None))
+        return future
@@ -0,0 +1,32 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+
+except ImportError:
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+"""orjson необязателен, без него используется json из стандартной библиотеки"""
+
+
+def loads(data: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Компактный UTF-8 JSON, как у JSONResponse"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from typing import Any
+
+METRICS = os.environ.get("SPF_METRICS", "1") == "1"
+"""Собирать метрики, при выключении observe/inc ничего не делают"""
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+Sample = tuple[str, dict[str, str], float]
+"""(имя, метки, значение) для сборщиков в духе Prometheus"""
+
+_registry: list["_Metric"] = []
+_collectors: list[Callable[[], Iterable[tuple[str, str, str, list[Sample]]]]] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    """
+    Значения пишутся в шард своего потока без локов, /metrics складывает шарды.
+    Лок на каждое наблюдение стоил бы больше, чем само наблюдение.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._local = threading.local()
+        self._shards: list[dict[tuple[str, ...], Any]] = []
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _shard(self) -> dict[tuple[str, ...], Any]:
+        try:
+            return self._local.values
+
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def _snapshot(self) -> list[dict[tuple[str, ...], Any]]:
+        with self._lock:
+            shards = list(self._shards)
+
+        return [dict(shard) for shard in shards]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not METRICS:
+            return
+
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        values: dict[tuple[str, ...], float] = {}
+        for shard in self._snapshot():
+            for key, value in shard.items():
+                values[key] = values.get(key, 0.0) + value
+
+        return [
+            f"{self.name}{_labels(self.label_names, key)} {value}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    """Кумулятивные бакеты считаются только при выдаче, observe - один bisect"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self._width = len(buckets) + 1
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not METRICS:
+            return
+
+        # Счётчики по бакетам (+Inf последним), затем сумма
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            entry = shard[labels] = [0] * (self._width + 1)
+
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def _samples(self) -> list[str]:
+        values: dict[tuple[str, ...], list] = {}
+        for shard in self._snapshot():
+            for key, entry in shard.items():
+                merged = values.setdefault(key, [0] * (self._width + 1))
+                for i, count in enumerate(entry):
+                    merged[i] += count
+
+        lines = []
+        for key, entry in values.items():
+            counts, total = entry[:-1], entry[-1]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = _labels(self.label_names, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+            labels = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+        return lines
+
+
+def register_collector(
+    collector: Callable[[], Iterable[tuple[str, str, str, list[Sample]]]],
+) -> None:
+    """
+    collector вызывается на каждый /metrics и отдаёт (имя, help, тип, сэмплы),
+    для значений, которые уже где-то считаются (глубина очередей и т.п.)
+    """
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    blocks = [metric.render() for metric in _registry]
+
+    for collector in _collectors:
+        for name, help, kind, samples in collector():
+            lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for sample_name, labels, value in samples:
+                names = tuple(labels)
+                values = tuple(labels[n] for n in names)
+                lines.append(f"{sample_name}{_labels(names, values)} {value}")
+            blocks.append("\n".join(lines))
+
+    return "\n".join(blocks) + "\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "spf_http_request_seconds",
+    "Время обработки HTTP запроса по шаблону маршрута",
+    ("method", "route", "status"),
+)
+
+
+class HTTPMetricsMiddleware:
+    """
+    ASGI middleware без BaseHTTPMiddleware, чтобы не обёртывать тело ответа.
+    Метка route - шаблон пути (/users/{value}), а не сам путь,
+    неизвестные пути собираются под unmatched.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not METRICS:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                f"{status // 100}xx",
+            )
@@ -0,0 +1,82 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+import json_codec
+from db_control import ChangeLog
+from router.responses import FastJSONResponse
+
+router = APIRouter()
+
+_STREAM_TIMEOUT = 15.0
+"""Как часто слать keep-alive комментарий в SSE при отсутствии изменений"""
+
+
+@router.get("/changes")
+async def changes(
+    since: int = 0,
+    limit: int = Query(1000, ge=1, le=10000),
+    timeout: float = Query(0.0, ge=0.0, le=60.0),
+):
+    """
+    Изменения с seq > since. При timeout > 0 ждёт появления новых записей.
+    Если since < oldest_seq - 1, часть изменений уже удалена и клиенту
+    нужно перечитать данные целиком.
+    """
+    if timeout > 0:
+        items = await ChangeLog.wait(since, timeout, limit)
+
+    else:
+        items = await asyncio.to_thread(ChangeLog.since, since, limit)
+
+    return FastJSONResponse(
+        {
+            "changes": [c.to_dict() for c in items],
+            # Без записей курсор не сдвигается: seq, выданный после чтения,
+            # иначе был бы пропущен следующим запросом
+            "last_seq": items[-1].seq if items else since,
+            "oldest_seq": ChangeLog.oldest_seq(),
+        },
+        status_code=200,
+    )
+
+
+@router.get("/changes/stream")
+async def changes_stream(request: Request, since: int | None = None):
+    """SSE поток изменений, поддерживает Last-Event-ID при переподключении"""
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id:
+        try:
+            since = int(last_event_id)
+
+        except ValueError:
+            since = -1
+
+        if since < 0:
+            raise HTTPException(status_code=400, detail="invalid Last-Event-ID")
+
+    if since is None:
+        since = ChangeLog.last_seq()
+
+    async def events() -> AsyncIterator[bytes]:
+        seq = since
+        while not await request.is_disconnected():
+            items = await ChangeLog.wait(seq, _STREAM_TIMEOUT)
+            if not items:
+                yield b": keep-alive\n\n"
+                continue
+
+            seq = items[-1].seq
+            yield b"".join(
+                b"id: %d\nevent: change\ndata: %s\n\n"
+                % (c.seq, json_codec.dumps(c.to_dict()))
+                for c in items
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -1,25 +1,66 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+import hashlib
+import json
+from typing import Any
+
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
 
 from config import AccessKeys, USER_GET_TYPE
 
 router = APIRouter()
 
+_CACHE_CONTROL = "public, max-age=3600"
+
+
+class _StaticJSON:
+    """Тело и ETag считаются один раз при импорте, данные не меняются до рестарта"""
+
+    def __init__(self, payload: Any) -> None:
+        self.body = json.dumps(
+            payload,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.headers = {"ETag": self.etag, "Cache-Control": _CACHE_CONTROL}
+
+    def _matches(self, if_none_match: str | None) -> bool:
+        if not if_none_match:
+            return False
+
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") == self.etag:
+                return True
+
+        return False
+
+    def respond(self, request: Request) -> Response:
+        if self._matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=self.headers)
+
+        return Response(
+            self.body,
+            status_code=200,
+            media_type="application/json",
+            headers=self.headers,
+        )
+
+
+_INFO_ACCESS = _StaticJSON(
+    {
+        "all_access_keys": AccessKeys.get_all_access_keys(),
+        "base_access": AccessKeys.get_base_access(),
+    }
+)
+_INFO_USER_GET_TYPE = _StaticJSON(USER_GET_TYPE)
+
 
 @router.get("/users/info/access")
-async def info_access():
-    return JSONResponse(
-        {
-            "all_access_keys": AccessKeys.get_all_access_keys(),
-            "base_access": AccessKeys.get_base_access(),
-        },
-        status_code=200,
-    )
+async def info_access(request: Request):
+    return _INFO_ACCESS.respond(request)
 
 
 @router.get("/users/info/user_get_type")
-async def info_user_get_type():
-    return JSONResponse(
-        USER_GET_TYPE,
-        status_code=200,
-    )
+async def info_user_get_type(request: Request):
+    return _INFO_USER_GET_TYPE.respond(request)
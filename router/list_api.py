@@ -0,0 +1,50 @@
+from collections.abc import AsyncIterator, Callable
+from typing import Any, Literal
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+import json_codec
+from db_control import BaseDB, CredentialsDB, PlayerCharDB, TimedLimitDB
+from router.responses import raw_json_response
+
+router = APIRouter()
+
+ListKind = Literal["users", "player_chars", "timed_limits"]
+
+_LISTS: dict[str, tuple[type[BaseDB], Callable[..., list[dict[str, Any]]], str]] = {
+    "users": (CredentialsDB, CredentialsDB.list_page, "id"),
+    "player_chars": (PlayerCharDB, PlayerCharDB.list_page, "uid"),
+    "timed_limits": (TimedLimitDB, TimedLimitDB.list_page, "uid"),
+}
+_JSON_PAGES: dict[str, Callable[[int, int], tuple[bytes, int | None]]] = {
+    "users": CredentialsDB.list_page_json,
+    "player_chars": PlayerCharDB.list_page_json,
+    "timed_limits": TimedLimitDB.list_page_json,
+}
+
+
+@router.get("/list/{kind}")
+async def list_page(
+    kind: ListKind,
+    after: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    db = _LISTS[kind][0]
+    # Страница собирается в JSON самим SQLite, без промежуточных dict
+    items, next_after = await db.run_read(_JSON_PAGES[kind], after, limit)
+
+    return raw_json_response(
+        b'{"items":' + items + b',"next_after":' + json_codec.dumps(next_after) + b"}"
+    )
+
+
+@router.get("/export/{kind}")
+async def export_ndjson(kind: ListKind, after: int = 0):
+    db, page, key = _LISTS[kind]
+
+    async def lines() -> AsyncIterator[bytes]:
+        async for rows in db.aiter_pages(page, key, after=after):
+            yield b"".join(json_codec.dumps(row) + b"\n" for row in rows)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
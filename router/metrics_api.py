@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render(),
+        status_code=200,
+        media_type="text/plain; version=0.0.4",
+    )
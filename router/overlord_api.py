@@ -1,9 +1,17 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
+from db_control import BaseDB
+
 router = APIRouter()
 
 
 @router.get("/ping")
 async def ping_overlord():
     return JSONResponse({"ok": True}, status_code=200)
+
+
+@router.get("/stats/db")
+async def db_stats():
+    """Глубина очередей записи, возраст старейшей задачи и время коммитов по БД"""
+    return JSONResponse(BaseDB.all_write_stats(), status_code=200)
@@ -0,0 +1,17 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+
+import json_codec
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse, сериализующий через orjson, если он установлен"""
+
+    def render(self, content: Any) -> bytes:
+        return json_codec.dumps(content)
+
+
+def raw_json_response(body: bytes, status_code: int = 200) -> Response:
+    """Ответ из уже готового JSON, например собранного в SQLite"""
+    return Response(body, status_code=status_code, media_type="application/json")
@@ -1,18 +1,103 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+import asyncio
+from typing import Any
 
-from config import USER_GET_TYPE_L
-from db_control import CredentialsDB
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from config import DB_ATTACH, USER_GET_TYPE_L
+from db_control import (
+    AccessDB,
+    CredentialsDB,
+    PermaLimitDB,
+    PlayerCharDB,
+    TimedLimitDB,
+    UserProfileDB,
+)
+from router.responses import FastJSONResponse
 
 router = APIRouter()
 
+USERS_BATCH_LIMIT = 1000
 
-@router.get("/users/{value}")
-async def get_users_cred(value: str, type: USER_GET_TYPE_L | None = None):
+PROFILE_FIELDS = {
+    "access": AccessDB.aget,
+    "perma_limit": PermaLimitDB.aget,
+    "timed_limit": TimedLimitDB.alist_active,
+    "player_char": PlayerCharDB.alist_by_owner,
+}
+
+
+class UsersBatchRequest(BaseModel):
+    id: list[int] = []
+    discord: list[str] = []
+    steam64: list[str] = []
+
+
+@router.post("/users/batch")
+async def get_users_cred_batch(body: UsersBatchRequest):
+    if len(body.id) + len(body.discord) + len(body.steam64) > USERS_BATCH_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"batch is limited to {USERS_BATCH_LIMIT} values",
+        )
+
+    found = await CredentialsDB.aget_many(body.id, body.discord, body.steam64)
+
+    return FastJSONResponse(
+        {
+            "id": {str(k): v for k, v in found["id"].items()},
+            "discord": found["discord_id"],
+            "steam64": found["steam64_id"],
+        },
+        status_code=200,
+    )
+
+
+class DirtyAck(BaseModel):
+    id: int
+    dirty_seq: int
+
+
+class DirtyAckRequest(BaseModel):
+    items: list[DirtyAck]
+    """id и dirty_seq из ответа /users/dirty"""
+
+
+@router.get("/users/dirty")
+async def get_users_dirty(after: int = 0, limit: int = Query(100, ge=1, le=1000)):
+    items = await CredentialsDB.alist_dirty(after, limit)
+
+    return FastJSONResponse(
+        {
+            "items": items,
+            "next_after": items[-1]["id"] if len(items) == limit else None,
+        },
+        status_code=200,
+    )
+
+
+@router.post("/users/dirty/ack")
+async def ack_users_dirty(body: DirtyAckRequest):
+    if len(body.items) > USERS_BATCH_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"ack is limited to {USERS_BATCH_LIMIT} items",
+        )
+
+    result = await CredentialsDB.clear_dirty_many(
+        (item.id, item.dirty_seq) for item in body.items
+    )
+    return FastJSONResponse({"cleared": result.rowcount}, status_code=200)
+
+
+async def _resolve_cred(
+    value: str,
+    type: USER_GET_TYPE_L | None,
+) -> dict[str, Any] | None:
     _disp = {
-        "id": CredentialsDB.get_by_id,
-        "discord": CredentialsDB.get_by_discord,
-        "steam64": CredentialsDB.get_by_steam,
+        "id": CredentialsDB.aget_by_id,
+        "discord": CredentialsDB.aget_by_discord,
+        "steam64": CredentialsDB.aget_by_steam,
     }
 
     resolve_type = type or "id"
@@ -31,5 +116,46 @@ async def get_users_cred(value: str, type: USER_GET_TYPE_L | None = None):
     else:
         value_casted = value
 
-    resp = func(value_casted)
-    return JSONResponse(resp, status_code=200)
+    return await func(value_casted)
+
+
+@router.get("/users/{value}")
+async def get_users_cred(value: str, type: USER_GET_TYPE_L | None = None):
+    resp = await _resolve_cred(value, type)
+    return FastJSONResponse(resp, status_code=200)
+
+
+@router.get("/users/{value}/profile")
+async def get_users_profile(
+    value: str,
+    type: USER_GET_TYPE_L | None = None,
+    fields: str | None = None,
+):
+    if fields is None:
+        requested = list(PROFILE_FIELDS)
+
+    else:
+        requested = [x.strip() for x in fields.split(",") if x.strip()]
+        unknown = [x for x in requested if x not in PROFILE_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"unknown profile fields: {', '.join(unknown)}",
+            )
+
+    cred = await _resolve_cred(value, type)
+    if cred is None:
+        return FastJSONResponse(None, status_code=200)
+
+    id = cred["id"]
+
+    if DB_ATTACH and set(requested) == set(PROFILE_FIELDS):
+        profile = await UserProfileDB.aget_profile(id)
+        return FastJSONResponse(profile, status_code=200)
+
+    results = await asyncio.gather(*(PROFILE_FIELDS[x](id) for x in requested))
+
+    return FastJSONResponse(
+        {"credentials": cred, **dict(zip(requested, results))},
+        status_code=200,
+    )
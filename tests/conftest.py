@@ -0,0 +1,39 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from db_control import (  # noqa: E402
+    AccessDB,
+    BaseDB,
+    CredentialsDB,
+    PermaLimitDB,
+    PlayerCharDB,
+    TimedLimitDB,
+    UserProvisioningDB,
+)
+
+USER_DBS = (CredentialsDB, AccessDB, PermaLimitDB, TimedLimitDB, PlayerCharDB)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def dbs(tmp_path_factory: pytest.TempPathFactory):
+    """
+    Все БД в одном временном каталоге на сессию: data/dbs считается от cwd,
+    а воркеры записи и пулы чтения живут на классах, а не на файлах.
+    """
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("spf"))
+
+    for db in USER_DBS:
+        db.set_up()
+    UserProvisioningDB.set_up()
+
+    yield USER_DBS
+
+    BaseDB.close_all()
+    os.chdir(cwd)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import pytest
+
+from config import AccessKeys
+from db_control import AccessDB, SQLTask
+from db_control.base_db import WriteFuture
+
+_BASE = AccessKeys.get_base_access()
+
+
+@pytest.fixture
+def perms(monkeypatch: pytest.MonkeyPatch):
+    """Права в памяти только на время теста, остальные тесты читают из БД"""
+    monkeypatch.setattr(AccessDB, "_perms", None)
+    AccessDB.warm()
+
+
+def _commit(future: WriteFuture) -> None:
+    # Хуки _on_commit выполняет воркер после set_result, барьер flush ждёт их
+    future.result()
+    asyncio.run(AccessDB.flush())
+
+
+def _stored(id: int) -> tuple[int, int] | None:
+    with AccessDB.read() as conn:
+        row = conn.execute("SELECT version, mask FROM access WHERE id = ?", (id,))
+        return row.fetchone()
+
+
+def _legacy(id: int, version: int, access: dict[str, bool]) -> None:
+    """Строка в старом формате: JSON в access и mask = NULL"""
+    _commit(
+        AccessDB.submit_write(
+            SQLTask(
+                "INSERT INTO access (id, version, access) VALUES (?, ?, ?)",
+                (id, version, json.dumps(access)),
+            )
+        )
+    )
+
+
+def test_warm_keeps_a_write_committed_during_the_scan(
+    perms,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    id = 700_001
+    _commit(AccessDB.create(id, 1, {"update_note": True}))
+    scan = AccessDB._scan_perms.__func__
+    scans = []
+
+    def racing(cls):
+        snapshot = scan(cls)
+        if not scans:
+            # Запись закоммитилась после чтения, но до установки карты
+            _commit(AccessDB.update(id, access={"update_user": True}))
+        scans.append(snapshot)
+        return snapshot
+
+    monkeypatch.setattr(AccessDB, "_scan_perms", classmethod(racing))
+    AccessDB.warm()
+
+    assert len(scans) == 2
+    assert AccessDB._perms[id] == _stored(id)
+    assert AccessDB.has(id, AccessKeys.UPDATE_USER)
+    assert not AccessDB.has(id, AccessKeys.UPDATE_NOTE)
+
+
+def test_perms_follow_writes(perms):
+    id = 700_002
+    _commit(AccessDB.create(id, 1, {"update_note": True}))
+    assert AccessDB._perms[id] == _stored(id) == (1, AccessKeys.UPDATE_NOTE.bit)
+
+    _commit(AccessDB.update(id, version=2))
+    assert AccessDB._perms[id] == _stored(id) == (2, AccessKeys.UPDATE_NOTE.bit)
+
+    _commit(AccessDB.update(id, access={"all_access": True}))
+    assert AccessDB._perms[id] == _stored(id) == (2, AccessKeys.ALL.bit)
+    assert AccessDB.has(id, AccessKeys.DELETE_USER)
+
+    _commit(AccessDB.delete(id))
+    assert id not in AccessDB._perms and _stored(id) is None
+    assert AccessDB.get(id) is None
+
+
+def test_legacy_json_row_is_converted_on_read():
+    id = 700_003
+    _legacy(id, 1, {"update_note": True, "unknown": True})
+
+    assert AccessDB.get_mask(id) == AccessKeys.UPDATE_NOTE.bit
+    asyncio.run(AccessDB.flush())
+    assert _stored(id) == (1, AccessKeys.UPDATE_NOTE.bit)
+
+
+@pytest.mark.parametrize("warm", [False, True])
+def test_reversion(warm: bool, monkeypatch: pytest.MonkeyPatch):
+    # Свои версии на каждый параметр, reversion задевает всех с from_version
+    old, new, other = (7_000 + 10 * warm + n for n in range(3))
+    ids = [700_010 + 10 * warm + n for n in range(4)]
+    _commit(AccessDB.create(ids[0], old, {"update_note": True}))
+    _legacy(ids[1], old, {"update_user": True})
+    _commit(AccessDB.create(ids[2], other, {"update_note": True}))
+    _legacy(ids[3], other, {"update_user": True})
+    if warm:
+        # Прогрев до reversion: дальше карту ведут только хуки
+        monkeypatch.setattr(AccessDB, "_perms", None)
+        AccessDB.warm()
+        asyncio.run(AccessDB.flush())
+
+    _commit(AccessDB.reversion(old, new, grant={"create_user": True}))
+
+    note, user, create = (
+        AccessKeys.UPDATE_NOTE.bit,
+        AccessKeys.UPDATE_USER.bit,
+        AccessKeys.CREATE_USER.bit,
+    )
+    assert _stored(ids[0]) == (new, note | create)
+    assert _stored(ids[1]) == (new, user | create)
+    assert _stored(ids[2]) == (other, note)
+    assert _stored(ids[3])[0] == other
+
+    _commit(AccessDB.reversion(new, old, access=_BASE))
+    assert _stored(ids[0]) == _stored(ids[1]) == (old, AccessKeys.get_base_mask())
+
+    if warm:
+        for id in ids:
+            assert AccessDB._perms[id] == _stored(id)
+
+    with pytest.raises(ValueError):
+        AccessDB.reversion(old, new, access=_BASE, grant=_BASE)
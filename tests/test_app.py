@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+import app
+from db_control import AccessDB, BaseDB, ChangeLog, TimedLimitExpiry
+
+
+def test_shutdown_closes_dbs_when_drain_fails(monkeypatch: pytest.MonkeyPatch):
+    async def noop() -> None:
+        pass
+
+    async def fail(*args) -> None:
+        raise RuntimeError("stop failed")
+
+    monkeypatch.setattr(AccessDB, "_perms", AccessDB._perms)
+    monkeypatch.setattr(app.Constants, "start", lambda: None)
+    monkeypatch.setattr(app.Constants, "stop", noop)
+    monkeypatch.setattr(TimedLimitExpiry, "start", lambda: None)
+    monkeypatch.setattr(TimedLimitExpiry, "stop", noop)
+    monkeypatch.setattr(ChangeLog, "start", lambda: None)
+    monkeypatch.setattr(ChangeLog, "stop", fail)
+    monkeypatch.setattr(BaseDB, "drain_all", fail)
+
+    closed = []
+    monkeypatch.setattr(BaseDB, "close_all", lambda: closed.append(True))
+
+    async def run() -> None:
+        async with app.lifespan(app.app):
+            pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+
+    assert closed == [True]
@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from db_control import CredentialsDB
+from db_control import cache as cache_module
+from db_control.base_db import WriteFuture
+from db_control.cache import TTLCache
+
+_KINDS = ("id", "discord_id", "steam64_id")
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _commit(future: WriteFuture) -> None:
+    # Колбэки future выполняет воркер после set_result, барьер flush ждёт их
+    future.result()
+    asyncio.run(CredentialsDB.flush())
+
+
+def _cached(user: dict) -> dict[str, tuple[bool, object]]:
+    return {kind: CredentialsDB._cache.get((kind, user[kind])) for kind in _KINDS}
+
+
+def test_fill_is_dropped_when_epoch_moves():
+    cache = TTLCache()
+    epoch = cache.epoch
+
+    # Пока шло чтение, запись успела инвалидировать кэш
+    cache.invalidate("other")
+    cache.put("key", "stale", epoch=epoch)
+    assert cache.get("key") == (False, None)
+
+    cache.put("key", "fresh", epoch=cache.epoch)
+    assert cache.get("key") == (True, "fresh")
+
+
+def test_negative_entries_use_their_own_ttl(clock: list[float]):
+    cache = TTLCache(ttl=60.0, negative_ttl=5.0)
+    cache.put("missing", None)
+    cache.put("present", "value")
+
+    assert cache.get("missing") == (True, None)
+    assert cache.stats()["negative_hits"] == 1
+
+    clock[0] += 5.0
+    assert cache.get("missing") == (False, None)
+    assert cache.get("present") == (True, "value")
+
+    clock[0] += 55.0
+    assert cache.get("present") == (False, None)
+    assert cache.stats()["expirations"] == 2
+
+
+def test_tag_drops_every_key_kind():
+    id = CredentialsDB.create("cache-tag", "cache-tag-s").result().lastrowid
+    user = CredentialsDB.get_by_id(id)
+    assert all(hit for hit, _ in _cached(user).values())
+
+    _commit(CredentialsDB.set_dirty(id))
+    assert not any(hit for hit, _ in _cached(user).values())
+
+
+@pytest.mark.parametrize(
+    ("old", "new"),
+    [
+        (("cache-d-old", "cache-d-s"), ("cache-d-new", None)),
+        (("cache-s-d", "cache-s-old"), (None, "cache-s-new")),
+    ],
+)
+def test_changed_identifier_is_not_served_from_cache(
+    old: tuple[str, str],
+    new: tuple[str | None, str | None],
+):
+    id = CredentialsDB.create(*old).result().lastrowid
+    before = CredentialsDB.get_by_id(id)
+    # Отрицательный ответ по новому значению тоже должен уйти
+    assert CredentialsDB.get_by_discord(new[0] or "cache-absent") is None
+    assert CredentialsDB.get_by_steam(new[1] or "cache-absent") is None
+
+    _commit(CredentialsDB.update(id, *new))
+
+    after = CredentialsDB.get_by_id(id)
+    assert after["discord_id"] == (new[0] or before["discord_id"])
+    assert after["steam64_id"] == (new[1] or before["steam64_id"])
+    assert CredentialsDB.get_by_discord(after["discord_id"])["id"] == id
+    assert CredentialsDB.get_by_steam(after["steam64_id"])["id"] == id
+
+    if new[0] is not None:
+        assert CredentialsDB.get_by_discord(old[0]) is None
+
+    if new[1] is not None:
+        assert CredentialsDB.get_by_steam(old[1]) is None
@@ -0,0 +1,140 @@
+import asyncio
+import sqlite3
+import threading
+from collections import deque
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from db_control import ChangeLog
+from router import changes_api
+
+
+def _get(path: str, **kwargs) -> httpx.Response:
+    app = FastAPI()
+    app.include_router(changes_api.router)
+
+    async def call() -> httpx.Response:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await c.get(path, **kwargs)
+
+    return asyncio.run(call())
+
+
+def test_empty_page_keeps_the_cursor(monkeypatch: pytest.MonkeyPatch):
+    # Запись появилась между since() и ответом: курсор не должен её перепрыгнуть
+    monkeypatch.setattr(ChangeLog, "since", classmethod(lambda cls, seq, limit: []))
+    monkeypatch.setattr(ChangeLog, "_seq", 100)
+
+    body = _get("/changes", params={"since": 7}).json()
+    assert body["changes"] == []
+    assert body["last_seq"] == 7
+
+
+@pytest.mark.parametrize("last_event_id", ["abc", "1.5", "-3"])
+def test_stream_rejects_bad_last_event_id(last_event_id: str):
+    response = _get("/changes/stream", headers={"Last-Event-ID": last_event_id})
+    assert response.status_code == 400
+
+
+def _private_log(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Отдельный файл журнала, сессионный ChangeLog восстановит monkeypatch"""
+    monkeypatch.setattr(ChangeLog, "_conn", None)
+    monkeypatch.setattr(ChangeLog, "_path", None)
+    monkeypatch.setattr(ChangeLog, "_seq", 0)
+    monkeypatch.setattr(ChangeLog, "_recent", deque(maxlen=ChangeLog._memory_size))
+    return tmp_path / "change_log.db"
+
+
+def test_failed_maintain_rolls_back(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    ChangeLog.open(_private_log(tmp_path, monkeypatch))
+    try:
+        conn = ChangeLog._conn
+        conn.execute(
+            """
+            CREATE TRIGGER fail_delete BEFORE DELETE ON change_log
+            BEGIN SELECT RAISE(ABORT, 'delete failed'); END;
+            """
+        )
+        ChangeLog.append("test", [("t", 1, "insert")])
+
+        with pytest.raises(sqlite3.IntegrityError):
+            ChangeLog.maintain(now=2**40)
+        assert not conn.in_transaction
+
+        # Следующие изменения по-прежнему попадают на диск
+        ChangeLog.append("test", [("t", 2, "insert")])
+        count = conn.execute("SELECT COUNT(*) FROM change_log").fetchone()
+        assert count == (2,)
+
+    finally:
+        ChangeLog.close()
+
+
+def test_seq_survives_retention_emptying_the_log(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    path = _private_log(tmp_path, monkeypatch)
+
+    ChangeLog.open(path)
+    ChangeLog.append("test", [("t", 1, "insert"), ("t", 2, "insert")])
+    last = ChangeLog.last_seq()
+
+    # Ретеншн удаляет все записи
+    ChangeLog.maintain(now=2**40)
+    count = ChangeLog._conn.execute("SELECT COUNT(*) FROM change_log").fetchone()
+    assert count == (0,)
+    ChangeLog.close()
+
+    monkeypatch.setattr(ChangeLog, "_seq", 0)
+    ChangeLog.open(path)
+    try:
+        assert ChangeLog.last_seq() == last
+        ChangeLog.append("test", [("t", 3, "insert")])
+        assert ChangeLog.last_seq() == last + 1
+
+    finally:
+        ChangeLog.close()
+
+
+def test_timed_out_waits_do_not_leak_waiters():
+    async def scenario() -> None:
+        for _ in range(50):
+            assert await ChangeLog.wait(ChangeLog.last_seq(), 0.001) == []
+
+    before = len(ChangeLog._waiters)
+    asyncio.run(scenario())
+    assert len(ChangeLog._waiters) == before
+
+
+def test_wait_reads_the_log_off_the_event_loop(monkeypatch: pytest.MonkeyPatch):
+    threads = []
+    since = ChangeLog.since.__func__
+
+    def record(cls, seq: int, limit: int = 1000):
+        threads.append(threading.current_thread())
+        return since(cls, seq, limit)
+
+    monkeypatch.setattr(ChangeLog, "since", classmethod(record))
+    ChangeLog.append("test", [("t", 1, "update")])
+
+    asyncio.run(ChangeLog.wait(ChangeLog.last_seq() - 1, 1.0))
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_changes_page_lists_appended_changes():
+    since = ChangeLog.last_seq()
+    ChangeLog.append("test", [("t", "k1", "update")])
+
+    body = _get("/changes", params={"since": since}).json()
+    assert [(c["db"], c["table"], c["key"]) for c in body["changes"]] == [
+        ("test", "t", "k1")
+    ]
+    assert body["last_seq"] == since + 1
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+from config import Constants
+
+
+class _Overlord:
+    """HTTP поверх unix-сокета: отвечает по очереди из responses"""
+
+    def __init__(self, responses: list[tuple[int, dict[str, str], bytes]]):
+        self.responses = responses
+        self.requests: list[dict[str, str]] = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # httpx держит соединение открытым, запросы идут по нему подряд
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+
+            except asyncio.IncompleteReadError:
+                writer.close()
+                return
+
+            lines = head.decode().split("\r\n")[1:]
+            self.requests.append(
+                {k.lower(): v for k, _, v in (x.partition(": ") for x in lines if x)}
+            )
+
+            status, headers, body = self.responses.pop(0)
+            writer.write(
+                f"HTTP/1.1 {status} X\r\n".encode()
+                + b"".join(f"{k}: {v}\r\n".encode() for k, v in headers.items())
+                + f"content-length: {len(body)}\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+
+
+@pytest.fixture
+def overlord_socket(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    SPF_OVERLORD_SOCKET читается при импорте config и попадает в _socket,
+    поэтому подменяется сам _socket. Состояние Constants восстановит monkeypatch.
+    """
+    socket = tmp_path / "overlord.sock"
+    monkeypatch.setattr(Constants, "_socket", socket)
+    monkeypatch.setattr(Constants, "_data", {})
+    monkeypatch.setattr(Constants, "_etag", None)
+    monkeypatch.setattr(Constants, "_fetched_at", None)
+    monkeypatch.setattr(Constants, "_client", None)
+    monkeypatch.setattr(Constants, "_task", None)
+    monkeypatch.setattr(Constants, "_revalidating", None)
+    # Фоновый цикл делает только первый запрос, остальные задаёт тест
+    monkeypatch.setattr(Constants, "_refresh_interval", 60.0)
+    return socket
+
+
+def test_overlord_revalidation(overlord_socket: Path):
+    config = {"motd": "hello"}
+    overlord = _Overlord(
+        [
+            (200, {"etag": '"v1"'}, json.dumps(config).encode()),
+            (304, {"etag": '"v1"'}, b""),
+            (503, {}, b""),
+        ]
+    )
+
+    async def scenario() -> None:
+        server = await asyncio.start_unix_server(overlord.handle, overlord_socket)
+        async with server:
+            Constants.start()
+            while Constants._fetched_at is None:
+                await asyncio.sleep(0.01)
+            assert Constants.get_all_const() == config
+            assert Constants._etag == '"v1"'
+
+            fetched_at = Constants._fetched_at
+            assert await Constants.req_from_over() is True
+            assert overlord.requests[1]["if-none-match"] == '"v1"'
+            assert Constants._fetched_at > fetched_at
+            assert Constants.get_all_const() == config
+
+            # Устаревший снимок отдаётся сразу, ревалидация идёт в фоне
+            Constants._fetched_at = time.monotonic() - 2 * Constants._refresh_interval
+            assert Constants.get_all_const() == config
+            revalidating = Constants._revalidating
+            assert revalidating is not None
+            assert await revalidating is False
+            assert Constants.get_all_const() == config
+            assert Constants._etag == '"v1"'
+
+            loop_task = Constants._task
+            await Constants.stop()
+            assert loop_task.cancelled()
+            assert Constants._task is None and Constants._revalidating is None
+            assert Constants._client is None
+
+    asyncio.run(scenario())
+    assert overlord.responses == []
@@ -0,0 +1,40 @@
+from db_control import CredentialsDB
+
+
+def _dirty(id: int) -> dict | None:
+    for row in CredentialsDB.list_dirty(id - 1, 1):
+        if row["id"] == id:
+            return row
+
+    return None
+
+
+def test_ack_clears_what_was_read():
+    id = CredentialsDB.create("dirty-read", None).result().lastrowid
+    row = _dirty(id)
+    assert row is not None and row["dirty_seq"] == 0
+
+    ack = CredentialsDB.clear_dirty_many([(id, row["dirty_seq"])])
+    assert ack.result().rowcount == 1
+    assert _dirty(id) is None
+    assert CredentialsDB.get_by_id(id)["dirty"] is False
+
+
+def test_set_dirty_between_read_and_ack_is_kept():
+    id = CredentialsDB.create("dirty-race", None).result().lastrowid
+    seen = _dirty(id)["dirty_seq"]
+
+    # Пользователь изменился после чтения ленты, но до ack
+    CredentialsDB.set_dirty(id).result()
+
+    assert CredentialsDB.clear_dirty_many([(id, seen)]).result().rowcount == 0
+    row = _dirty(id)
+    assert row is not None and row["dirty_seq"] == seen + 1
+
+    ack = CredentialsDB.clear_dirty_many([(id, row["dirty_seq"])])
+    assert ack.result().rowcount == 1
+    assert _dirty(id) is None
+
+
+def test_empty_ack_is_a_no_op():
+    assert CredentialsDB.clear_dirty_many([]).result().rowcount == 0
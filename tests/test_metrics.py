@@ -0,0 +1,13 @@
+from db_control import CredentialsDB
+from db_control.base_db import _READ_SECONDS
+
+
+def test_credential_lookups_have_their_own_read_labels():
+    # Отсутствующие значения: чтение из БД, а не из кэша
+    CredentialsDB.get_by_id(10**12)
+    CredentialsDB.get_by_discord("metrics-absent")
+    CredentialsDB.get_by_steam("metrics-absent")
+
+    rendered = _READ_SECONDS.render()
+    for field in ("id", "discord_id", "steam64_id"):
+        assert f'db="credentials",method="get_by_{field}"' in rendered
@@ -0,0 +1,99 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from db_control import BaseDB, SQLTask
+
+from conftest import USER_DBS
+
+
+def _base_schema(db: type[BaseDB], monkeypatch: pytest.MonkeyPatch) -> list[SQLTask]:
+    """Схема из set_up без миграций, как в файлах до появления _migrations"""
+    captured: list[SQLTask] = []
+    # set_up зовёт super()._init_db, поэтому подменяется метод BaseDB
+    monkeypatch.setattr(
+        BaseDB,
+        "_init_db",
+        classmethod(lambda cls, sql_t: captured.extend(sql_t)),
+    )
+    db.set_up()
+    return captured
+
+
+def _schema(conn: sqlite3.Connection) -> list[tuple]:
+    return conn.execute(
+        "SELECT type, name, sql FROM sqlite_master ORDER BY type, name"
+    ).fetchall()
+
+
+def _version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+MIGRATED = [db for db in USER_DBS if db._migrations]
+
+
+@pytest.mark.parametrize("db", MIGRATED, ids=lambda db: db._db_name)
+def test_live_db_is_at_latest_version(db: type[BaseDB]):
+    with db.read() as conn:
+        assert _version(conn) == len(db._migrations)
+
+
+@pytest.mark.parametrize("db", MIGRATED, ids=lambda db: db._db_name)
+def test_legacy_file_migrates_once(
+    db: type[BaseDB],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    conn = sqlite3.connect(tmp_path / "legacy.db", isolation_level=None)
+    for task in _base_schema(db, monkeypatch):
+        conn.execute(task.sql, task.params or ())
+    assert _version(conn) == 0
+
+    db._migrate(conn)
+    assert _version(conn) == len(db._migrations)
+    schema = _schema(conn)
+
+    # Повторный запуск, как при каждом старте, ничего не меняет
+    db._migrate(conn)
+    assert _version(conn) == len(db._migrations)
+    assert _schema(conn) == schema
+    conn.close()
+
+
+@pytest.mark.parametrize("db", USER_DBS, ids=lambda db: db._db_name)
+def test_set_up_is_idempotent(db: type[BaseDB]):
+    with db.read() as conn:
+        schema, version = _schema(conn), _version(conn)
+
+    db.set_up()
+
+    with db.read() as conn:
+        assert _version(conn) == version
+        assert _schema(conn) == schema
+
+
+def test_failed_migration_rolls_back(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    # Подкласс регистрируется в BaseDB._registry, close_all его видеть не должен
+    monkeypatch.setattr(BaseDB, "_registry", [*BaseDB._registry])
+
+    class Broken(BaseDB):
+        _db_name = "broken"
+        _migrations = [
+            [SQLTask("CREATE TABLE a (id INTEGER PRIMARY KEY);")],
+            [
+                SQLTask("CREATE TABLE b (id INTEGER PRIMARY KEY);"),
+                SQLTask("INSERT INTO missing VALUES (1);"),
+            ],
+        ]
+
+    conn = sqlite3.connect(tmp_path / "broken.db", isolation_level=None)
+
+    with pytest.raises(sqlite3.OperationalError):
+        Broken._migrate(conn)
+
+    assert _version(conn) == 1
+    names = {row[1] for row in _schema(conn)}
+    assert "a" in names and "b" not in names
+    conn.close()
@@ -0,0 +1,48 @@
+import pytest
+
+from db_control import (
+    AccessDB,
+    BaseDB,
+    CredentialsDB,
+    PermaLimitDB,
+    PlayerCharDB,
+    SQLTask,
+    TimedLimitDB,
+    UserProfileDB,
+)
+
+
+def test_profile_db_has_own_name_and_shares_the_file():
+    names = [db._db_name for db in BaseDB._registry if db._db_name]
+    assert len(names) == len(set(names))
+
+    assert UserProfileDB._db_name != CredentialsDB._db_name
+    assert UserProfileDB._db_path() == CredentialsDB._db_path()
+
+
+def test_joined_profile_reads_credentials():
+    id = CredentialsDB.create("profile-d", "profile-s").result().lastrowid
+
+    profile = UserProfileDB._get_profile_joined(id, 0)
+    assert profile is not None
+    assert profile["credentials"] == CredentialsDB.get_by_id(id)
+
+
+@pytest.mark.parametrize("content_ids", ['{"a": 1}', '"c1"', "not json", "[1, 2]"])
+def test_joined_and_split_profiles_match(content_ids: str):
+    id = CredentialsDB.create(f"match-{content_ids}", None).result().lastrowid
+    AccessDB.create(id, access={"update_note": True}).result()
+    PermaLimitDB.create(id, 2, 1, 100).result()
+    TimedLimitDB.create(id, 1, 10, 2_000).result()
+    uid = PlayerCharDB.create(id, "char", "norm", ["c1"]).result().lastrowid
+    PlayerCharDB.submit_write(
+        SQLTask(
+            "UPDATE player_char_db SET content_ids = ? WHERE uid = ?",
+            (content_ids, uid),
+        )
+    ).result()
+
+    joined = UserProfileDB._get_profile_joined(id, 1_000)
+    assert joined == UserProfileDB._get_profile_split(id, 1_000)
+    expected = [1, 2] if content_ids.startswith("[") else []
+    assert joined["player_char"][0]["content_ids"] == expected
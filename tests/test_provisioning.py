@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+import pytest
+
+from db_control import AccessDB, CredentialsDB, PermaLimitDB, UserProvisioningDB
+
+
+def test_create_clears_negative_cache_for_new_id():
+    # id выдаются по AUTOINCREMENT, следующий за пробным и достанется create
+    new_id = CredentialsDB.create("prov-probe", None).result().lastrowid + 1
+    assert CredentialsDB.get_by_id(new_id) is None
+    assert CredentialsDB.get_by_discord("prov-cached") is None
+
+    result = UserProvisioningDB.create("prov-cached", "prov-cached-s").result()
+
+    assert result.lastrowid == new_id
+    assert CredentialsDB.get_by_id(new_id)["discord_id"] == "prov-cached"
+    assert CredentialsDB.get_by_discord("prov-cached")["id"] == new_id
+    assert CredentialsDB.get_by_steam("prov-cached-s")["id"] == new_id
+
+
+def test_cancelled_awaiter_does_not_break_resolve(caplog: pytest.LogCaptureFixture):
+    caplog.set_level(logging.ERROR)
+
+    future = UserProvisioningDB.create("prov-cancelled")
+    future.cancel()
+    asyncio.run(UserProvisioningDB.flush())
+
+    assert future.cancelled()
+    assert CredentialsDB.get_by_discord("prov-cancelled") is not None
+    # Ошибка в done-колбэке не всплывает, concurrent.futures её только логирует
+    assert not [r for r in caplog.records if r.levelno >= logging.ERROR]
+
+
+def test_create_writes_access_and_limits_under_the_new_id():
+    id = UserProvisioningDB.create(
+        "prov-rows",
+        version=3,
+        access={"update_note": True},
+        char_slot=2,
+        lore_char_slot=1,
+        weight_bytes=500,
+    ).result().lastrowid
+
+    assert CredentialsDB.get_by_id(id)["discord_id"] == "prov-rows"
+    access = AccessDB.get(id)
+    assert access["version"] == 3 and access["access"]["update_note"] is True
+    assert PermaLimitDB.get(id) == {
+        "id": id,
+        "char_slot": 2,
+        "lore_char_slot": 1,
+        "weight_bytes": 500,
+    }
+
+
+def test_batched_creates_resolve_to_their_own_ids(monkeypatch: pytest.MonkeyPatch):
+    find_ids = UserProvisioningDB._find_ids.__func__
+    lookups = []
+
+    def counted(cls, discord_ids: list[str]) -> dict[str, int]:
+        lookups.append(len(discord_ids))
+        return find_ids(cls, discord_ids)
+
+    monkeypatch.setattr(UserProvisioningDB, "_find_ids", classmethod(counted))
+
+    names = [f"prov-batch-{i}" for i in range(50)]
+    futures = [UserProvisioningDB.create(name) for name in names]
+    ids = [future.result().lastrowid for future in futures]
+
+    assert len(set(ids)) == len(names)
+    for name, id in zip(names, ids):
+        assert CredentialsDB.get_by_id(id)["discord_id"] == name
+
+    # Один поиск на пачку воркера, без доисков по одному
+    assert sum(lookups) == len(names)
@@ -0,0 +1,175 @@
+import re
+import time
+from collections.abc import Callable
+
+import pytest
+
+from db_control import (
+    AccessDB,
+    BaseDB,
+    CredentialsDB,
+    EffectiveLimits,
+    PermaLimitDB,
+    PlayerCharDB,
+    TimedLimitDB,
+    TimedLimitExpiry,
+    UserProfileDB,
+)
+
+_SCAN = re.compile(r"^SCAN (\S+)")
+_SUBQUERY = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\S+)")
+
+
+def _plans(dbs: tuple[type[BaseDB], ...], call: Callable[[], object]) -> list:
+    """Выполняет call и возвращает (sql, план) каждого SELECT, который он сделал"""
+    statements: list[tuple[type[BaseDB], str]] = []
+
+    for db in dbs:
+        with db.read() as conn:
+            conn.set_trace_callback(
+                lambda sql, db=db: statements.append((db, sql))
+            )
+
+    try:
+        call()
+
+    finally:
+        for db in dbs:
+            with db.read() as conn:
+                conn.set_trace_callback(None)
+
+    out = []
+    for db, sql in statements:
+        if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            continue
+
+        with db.read() as conn:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        out.append((sql, plan))
+
+    return out
+
+
+def _full_scans(plan: list[str]) -> list[str]:
+    # SCAN подзапроса или json_each - не обход таблицы
+    subqueries = {m.group(1) for d in plan if (m := _SUBQUERY.match(d))}
+    return [
+        detail
+        for detail in plan
+        if (m := _SCAN.match(detail))
+        and "VIRTUAL TABLE" not in detail
+        and m.group(1) not in subqueries
+        and not m.group(1).startswith("(")
+    ]
+
+
+LOOKUPS: dict[str, tuple[tuple[type[BaseDB], ...], Callable[[], object]]] = {
+    "credentials.get_by_id": ((CredentialsDB,), lambda: CredentialsDB.get_by_id(1)),
+    "credentials.get_by_discord": (
+        (CredentialsDB,),
+        lambda: CredentialsDB.get_by_discord("d"),
+    ),
+    "credentials.get_by_steam": (
+        (CredentialsDB,),
+        lambda: CredentialsDB.get_by_steam("s"),
+    ),
+    "credentials.get_many": (
+        (CredentialsDB,),
+        lambda: CredentialsDB.get_many([1, 2], ["d1", "d2"], ["s1", "s2"]),
+    ),
+    "credentials.list_page": ((CredentialsDB,), lambda: CredentialsDB.list_page(5)),
+    "credentials.list_page_json": (
+        (CredentialsDB,),
+        lambda: CredentialsDB.list_page_json(5),
+    ),
+    "credentials.list_dirty": ((CredentialsDB,), lambda: CredentialsDB.list_dirty(5)),
+    "access.get": ((AccessDB,), lambda: AccessDB.get(1)),
+    "access.get_mask": ((AccessDB,), lambda: AccessDB.get_mask(1)),
+    "access.get_by_version": ((AccessDB,), lambda: AccessDB.get_by_version(1)),
+    "perma_limit.get": ((PermaLimitDB,), lambda: PermaLimitDB.get(1)),
+    "timed_limit.get": ((TimedLimitDB,), lambda: TimedLimitDB.get(1)),
+    "timed_limit.list_by_owner": (
+        (TimedLimitDB,),
+        lambda: TimedLimitDB.list_by_owner(1),
+    ),
+    "timed_limit.list_active": (
+        (TimedLimitDB,),
+        lambda: TimedLimitDB.list_active(1, 100),
+    ),
+    "timed_limit.list_page": ((TimedLimitDB,), lambda: TimedLimitDB.list_page(5)),
+    "timed_limit.list_page_json": (
+        (TimedLimitDB,),
+        lambda: TimedLimitDB.list_page_json(5),
+    ),
+    "timed_limit.expiry_due": (
+        (TimedLimitDB,),
+        lambda: TimedLimitExpiry._due(int(time.time())),
+    ),
+    "timed_limit.expiry_next": ((TimedLimitDB,), TimedLimitExpiry._next_expired),
+    "effective_limits.get_many": (
+        (PermaLimitDB, TimedLimitDB),
+        lambda: EffectiveLimits.get_many([1, 2], 0),
+    ),
+    "player_char.get": ((PlayerCharDB,), lambda: PlayerCharDB.get(1)),
+    "player_char.list_by_owner": (
+        (PlayerCharDB,),
+        lambda: PlayerCharDB.list_by_owner(1),
+    ),
+    "player_char.list_page": ((PlayerCharDB,), lambda: PlayerCharDB.list_page(5)),
+    "player_char.list_page_json": (
+        (PlayerCharDB,),
+        lambda: PlayerCharDB.list_page_json(5),
+    ),
+    "player_char.list_by_content": (
+        (PlayerCharDB,),
+        lambda: PlayerCharDB.list_by_content("c"),
+    ),
+    "player_char.owners_of_content": (
+        (PlayerCharDB,),
+        lambda: PlayerCharDB.owners_of_content("c"),
+    ),
+    "player_char.owns_content": (
+        (PlayerCharDB,),
+        lambda: PlayerCharDB.owns_content(1, "c"),
+    ),
+    "player_char.used_weight_many": (
+        (PlayerCharDB,),
+        lambda: PlayerCharDB.used_weight_many([1, 2]),
+    ),
+    "player_char.weight_of_content": (
+        (PlayerCharDB,),
+        lambda: PlayerCharDB.weight_of_content(["a", "b"]),
+    ),
+    "profile.joined": (
+        (UserProfileDB,),
+        lambda: UserProfileDB._get_profile_joined(1, 100),
+    ),
+}
+
+
+@pytest.fixture(autouse=True)
+def no_memory_caches(monkeypatch: pytest.MonkeyPatch):
+    # Чтения из кэшей не доходят до SQLite и не дают плана
+    CredentialsDB._cache.clear()
+    monkeypatch.setattr(AccessDB, "_perms", None)
+
+
+@pytest.mark.parametrize("name", list(LOOKUPS))
+def test_lookup_uses_index(name: str):
+    dbs, call = LOOKUPS[name]
+    plans = _plans(dbs, call)
+
+    assert plans, f"{name} made no SELECT"
+    for sql, plan in plans:
+        assert not _full_scans(plan), f"{name} scans a table:\n{sql}\n{plan}"
+
+
+def test_full_scan_is_detected():
+    def unindexed() -> None:
+        with CredentialsDB.read() as conn:
+            conn.execute(
+                "SELECT id FROM credentials WHERE steam64_id || '' = 's'"
+            ).fetchall()
+
+    [(_, plan)] = _plans((CredentialsDB,), unindexed)
+    assert _full_scans(plan)
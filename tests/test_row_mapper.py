@@ -0,0 +1,44 @@
+import json
+import sqlite3
+
+from db_control.row_mapper import RowMapper, bool_col, json_list_col
+
+_ROWS = RowMapper("id", bool_col("flag"), json_list_col("items"))
+
+_VALUES = [
+    (1, 1, "[1, 2]"),
+    (2, 0, '{"a": 1}'),
+    (3, 1, "not json"),
+    (4, 0, None),
+]
+
+
+def test_many_and_one_apply_converters():
+    expected = [
+        {"id": 1, "flag": True, "items": [1, 2]},
+        {"id": 2, "flag": False, "items": []},
+        {"id": 3, "flag": True, "items": []},
+        {"id": 4, "flag": False, "items": []},
+    ]
+
+    assert _ROWS.many(_VALUES) == expected
+    assert _ROWS.one(_VALUES[0]) == expected[0]
+    assert _ROWS.one(None) is None
+
+
+def test_many_without_converters():
+    rows = RowMapper("a", "b")
+    assert rows.many([(1, 2), (3, 4)]) == [{"a": 1, "b": 2}, {"a": 3, "b": 4}]
+
+
+def test_json_object_matches_many():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER, flag INTEGER, items TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", _VALUES)
+
+    raw = conn.execute(
+        _ROWS.json_array_sql(f"SELECT {_ROWS.select} FROM t ORDER BY id", "id")
+    ).fetchone()[0]
+
+    assert json.loads(raw) == _ROWS.many(_VALUES)
+    conn.close()
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+from db_control import TimedLimitDB, TimedLimitExpiry
+
+# Раньше expired всех остальных тестов, run_once(now=_NOW) трогает только свои строки
+_NOW = 100
+_OWNER = 800_001
+
+
+def test_run_once_expires_in_batches(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(TimedLimitExpiry, "_batch_size", 3)
+    monkeypatch.setattr(TimedLimitExpiry, "_listeners", [])
+    batches: list[list[dict]] = []
+    TimedLimitExpiry.subscribe(batches.append)
+
+    due = [
+        TimedLimitDB.create(_OWNER, 1, 10, _NOW - 10 + i).result().lastrowid
+        for i in range(7)
+    ]
+    later = TimedLimitDB.create(_OWNER, 1, 10, _NOW + 30).result().lastrowid
+
+    assert asyncio.run(TimedLimitExpiry.run_once(now=_NOW)) == 7
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert [row["uid"] for batch in batches for row in batch] == due
+    assert {TimedLimitDB.get(uid)["status"] for uid in due} == {"expired"}
+    assert TimedLimitDB.get(later)["status"] == "active"
+    assert TimedLimitExpiry._next_expired() == _NOW + 30
+
+    assert asyncio.run(TimedLimitExpiry.run_once(now=_NOW)) == 0
+    assert len(batches) == 3
+
+
+def test_loop_sleeps_until_next_expired_and_wakes_on_commit(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    passes: list[float] = []
+
+    async def run_once(cls, now: int | None = None) -> int:
+        passes.append(time.time())
+        return 0
+
+    next_expired = time.time() + 30
+    monkeypatch.setattr(TimedLimitExpiry, "run_once", classmethod(run_once))
+    monkeypatch.setattr(
+        TimedLimitExpiry,
+        "_next_expired",
+        classmethod(lambda cls: next_expired),
+    )
+
+    async def scenario() -> None:
+        TimedLimitExpiry.start()
+        try:
+            while TimedLimitExpiry._deadline is None:
+                await asyncio.sleep(0.01)
+            assert TimedLimitExpiry._deadline == pytest.approx(next_expired, abs=1)
+
+            # Лимит позже ближайшего не будит, раньше - будит сразу
+            await TimedLimitDB.create(_OWNER, 1, 10, int(next_expired) + 60)
+            await asyncio.sleep(0.1)
+            assert len(passes) == 1
+
+            await TimedLimitDB.create(_OWNER, 1, 10, int(time.time()) + 5)
+            while len(passes) < 2:
+                await asyncio.sleep(0.01)
+
+        finally:
+            await TimedLimitExpiry.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5.0))
+    assert TimedLimitExpiry.wake not in TimedLimitDB._commit_listeners
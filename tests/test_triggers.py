@@ -0,0 +1,157 @@
+import random
+
+import pytest
+
+from db_control import (
+    EffectiveLimits,
+    PermaLimitDB,
+    PlayerCharDB,
+    SQLTask,
+    TimedLimitDB,
+)
+
+_NOW = 1_000_000
+_OPS = 300
+
+
+def _owners(seed: int) -> list[int]:
+    # Свой диапазон id на каждый seed, чтобы не пересекаться с другими тестами
+    return [900_000 + seed * 10 + i for i in range(5)]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_timed_limit_totals_follow_random_writes(seed: int):
+    rnd = random.Random(seed)
+    owners = _owners(seed)
+    PermaLimitDB.create(owners[0], 2, 1, 100).result()
+    uids: list[int] = []
+
+    def row() -> dict:
+        return {
+            "char_slot": rnd.randint(0, 3),
+            "weight_bytes": rnd.randint(0, 1_000),
+            "expired": _NOW + rnd.randint(-500, 500),
+            "status": rnd.choice(["active", "active", "expired", "disabled"]),
+        }
+
+    for _ in range(_OPS):
+        op = rnd.choice(["create", "create", "update", "owner", "delete"])
+        if op == "create" or not uids:
+            future = TimedLimitDB.create(rnd.choice(owners), **row())
+            uids.append(future.result().lastrowid)
+
+        elif op == "update":
+            fields = row()
+            picked = rnd.sample(sorted(fields), rnd.randint(1, len(fields)))
+            TimedLimitDB.update(
+                rnd.choice(uids),
+                **{k: v for k, v in fields.items() if k in picked},
+            ).result()
+
+        elif op == "owner":
+            TimedLimitDB.submit_write(
+                SQLTask(
+                    "UPDATE timed_limit SET id = ? WHERE uid = ?",
+                    (rnd.choice(owners), rnd.choice(uids)),
+                )
+            ).result()
+
+        else:
+            TimedLimitDB.delete(uids.pop(rnd.randrange(len(uids)))).result()
+
+    with TimedLimitDB.read() as conn:
+        for id in owners:
+            total = conn.execute(
+                """
+                SELECT char_slot, weight_bytes, next_expired
+                FROM timed_limit_total
+                WHERE id = ?
+                """,
+                (id,),
+            ).fetchone()
+            live = conn.execute(
+                """
+                SELECT COALESCE(SUM(char_slot), 0), COALESCE(SUM(weight_bytes), 0),
+                       MIN(expired)
+                FROM timed_limit
+                WHERE id = ? AND status = 'active'
+                """,
+                (id,),
+            ).fetchone()
+            assert (total or (0, 0, None)) == live
+
+            unexpired = conn.execute(
+                """
+                SELECT COALESCE(SUM(char_slot), 0), COALESCE(SUM(weight_bytes), 0)
+                FROM timed_limit
+                WHERE id = ? AND status = 'active' AND expired > ?
+                """,
+                (id, _NOW),
+            ).fetchone()
+            perma = PermaLimitDB.get(id) or {"char_slot": 0, "weight_bytes": 0}
+            limits = EffectiveLimits.get(id, _NOW)
+            assert limits["char_slot"] == perma["char_slot"] + unexpired[0]
+            assert limits["weight_bytes"] == perma["weight_bytes"] + unexpired[1]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_content_index_and_weights_follow_random_writes(seed: int):
+    rnd = random.Random(seed)
+    owners = _owners(seed)
+    contents = [f"trg-{seed}-c{i}" for i in range(8)]
+    uids: list[int] = []
+
+    def content_ids() -> list[str]:
+        # С повторами: в индекс content_id персонажа попадает один раз
+        return rnd.choices(contents, k=rnd.randint(0, 5))
+
+    for _ in range(_OPS):
+        op = rnd.choice(["create", "update", "owner", "delete", "weight", "unweight"])
+        if op == "create" or not uids:
+            future = PlayerCharDB.create(rnd.choice(owners), "c", "norm", content_ids())
+            uids.append(future.result().lastrowid)
+
+        elif op == "update":
+            PlayerCharDB.update(rnd.choice(uids), content_ids=content_ids()).result()
+
+        elif op == "owner":
+            PlayerCharDB.submit_write(
+                SQLTask(
+                    "UPDATE player_char_db SET id = ? WHERE uid = ?",
+                    (rnd.choice(owners), rnd.choice(uids)),
+                )
+            ).result()
+
+        elif op == "delete":
+            PlayerCharDB.delete(uids.pop(rnd.randrange(len(uids)))).result()
+
+        elif op == "weight":
+            weights = {c: rnd.randint(0, 1_000) for c in rnd.sample(contents, 3)}
+            PlayerCharDB.set_content_weights(weights).result()
+
+        else:
+            PlayerCharDB.delete_content_weight(rnd.choice(contents)).result()
+
+    assert PlayerCharDB.find_weight_drift() == []
+
+    with PlayerCharDB.read() as conn:
+        indexed = conn.execute(
+            """
+            SELECT uid, content_id, id
+            FROM player_char_content
+            WHERE id IN (SELECT value FROM json_each(?))
+            ORDER BY uid, content_id
+            """,
+            (str(owners),),
+        ).fetchall()
+        expected = conn.execute(
+            """
+            SELECT DISTINCT p.uid, je.value, p.id
+            FROM player_char_db AS p, json_each(p.content_ids) AS je
+            WHERE p.id IN (SELECT value FROM json_each(?))
+            ORDER BY p.uid, je.value
+            """,
+            (str(owners),),
+        ).fetchall()
+
+    assert indexed == expected
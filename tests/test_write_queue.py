@@ -0,0 +1,216 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from db_control import BaseDB, SQLTask, WriteQueueFull
+from db_control.base_db import WriteFuture, _PendingWrite
+
+
+@pytest.fixture
+def tiny(monkeypatch: pytest.MonkeyPatch):
+    """БД без воркера с очередью на одну задачу: вторая запись упирается в предел"""
+    monkeypatch.setattr(BaseDB, "_registry", [*BaseDB._registry])
+
+    class Tiny(BaseDB):
+        _db_name = "tiny"
+        _queue = None
+        _queue_maxsize = 1
+        _block_timeout = 0.3
+
+    yield Tiny
+
+    if Tiny._handoff_executor is not None:
+        Tiny._handoff_executor.shutdown(wait=True)
+
+
+def test_full_queue_does_not_block_the_loop(tiny: type[BaseDB]):
+    async def scenario() -> tuple[float, float]:
+        tiny.submit_write(SQLTask("SELECT 1"))
+
+        start = time.perf_counter()
+        second = tiny.submit_write(SQLTask("SELECT 2"))
+        submitted = time.perf_counter() - start
+
+        with pytest.raises(WriteQueueFull):
+            await second
+
+        return submitted, time.perf_counter() - start
+
+    submitted, rejected = asyncio.run(scenario())
+    assert submitted < 0.05
+    assert rejected >= tiny._block_timeout
+    assert tiny.write_stats()["waited"] == 1
+
+
+def test_waiting_writes_keep_their_order(tiny: type[BaseDB]):
+    async def scenario() -> list[str]:
+        for sql in ("SELECT 1", "SELECT 2", "SELECT 3"):
+            tiny.submit_write(SQLTask(sql))
+
+        # Место освобождается по одному, как это делал бы воркер
+        queue = tiny._get_queue()
+        order = []
+        for _ in range(3):
+            item = await asyncio.to_thread(queue.get, timeout=1.0)
+            order.append(item.task.sql)
+
+        return order
+
+    assert asyncio.run(scenario()) == ["SELECT 1", "SELECT 2", "SELECT 3"]
+
+
+def test_drain_all_reports_a_full_queue(
+    tiny: type[BaseDB],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(tiny, "_worker_started", True, raising=False)
+    tiny.submit_write(SQLTask("SELECT 1"))
+
+    # Барьер не встаёт в полную очередь: False вместо WriteQueueFull наружу
+    assert asyncio.run(BaseDB.drain_all(timeout=5.0)) is False
+
+
+@pytest.fixture
+def make_db(monkeypatch: pytest.MonkeyPatch):
+    """Подклассы BaseDB со своим воркером и таблицей t, имя - имя файла БД"""
+    monkeypatch.setattr(BaseDB, "_registry", [*BaseDB._registry])
+    made: list[type[BaseDB]] = []
+
+    def make(name: str, **attrs) -> type[BaseDB]:
+        db = type(name, (BaseDB,), {"_db_name": name, "_queue": None, **attrs})
+        db._worker_started = False
+        db._init_db([SQLTask("CREATE TABLE IF NOT EXISTS t (v INTEGER UNIQUE)")])
+        made.append(db)
+        return db
+
+    yield make
+
+    for db in made:
+        if db._journal_conn is not None:
+            with db._journal_lock:
+                db._journal_conn.close()
+
+
+@pytest.fixture
+def journaled(make_db) -> type[BaseDB]:
+    # Ждать повтор пачки секунду незачем
+    return make_db("journaled", _journal=True, _retry_delay=0.01)
+
+
+def test_failed_batch_keeps_journal_rows_until_commit(
+    journaled: type[BaseDB],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    execute_batch = journaled._execute_batch.__func__
+    journal_rows = []
+
+    def flaky(cls, conn, batch):
+        jconn = cls._journal_conn
+        journal_rows.append(jconn.execute("SELECT COUNT(*) FROM journal").fetchone())
+        if len(journal_rows) == 1:
+            raise sqlite3.OperationalError("disk I/O error")
+
+        execute_batch(cls, conn, batch)
+
+    monkeypatch.setattr(journaled, "_execute_batch", classmethod(flaky))
+
+    result = journaled.submit_write(SQLTask("INSERT INTO t (v) VALUES (1)")).result(5)
+
+    # Повтор видит строку журнала, упавшая пачка её не удалила
+    assert journal_rows == [(1,), (1,)]
+    assert result.rowcount == 1
+    assert journaled.write_stats()["retried"] == 1
+    with journaled.read() as conn:
+        assert conn.execute("SELECT v FROM t").fetchall() == [(1,)]
+
+
+def _pending(*sqls: str) -> list[_PendingWrite]:
+    return [_PendingWrite(SQLTask(sql), WriteFuture()) for sql in sqls]
+
+
+def test_batch_commits_in_one_transaction(make_db):
+    db = make_db("group")
+    batch = _pending(*(f"INSERT INTO t (v) VALUES ({v})" for v in range(20)))
+    statements = []
+
+    conn = db._connect()
+    try:
+        conn.set_trace_callback(statements.append)
+        db._execute_batch(conn, batch)
+
+    finally:
+        conn.close()
+
+    assert statements.count("COMMIT;") == 1
+    assert [item.future.result().lastrowid for item in batch] == list(range(1, 21))
+    stats = db.write_stats()
+    assert (stats["batches"], stats["tasks"], stats["max_batch"]) == (1, 20, 20)
+    assert stats["batch_fallbacks"] == 0
+
+
+def test_bad_statement_does_not_fail_the_batch(make_db):
+    db = make_db("fallback")
+    batch = _pending(
+        "INSERT INTO t (v) VALUES (1)",
+        "INSERT INTO t (v) VALUES (1)",
+        "INSERT INTO t (v) VALUES (2)",
+    )
+
+    conn = db._connect()
+    try:
+        db._execute_batch(conn, batch)
+        rows = conn.execute("SELECT v FROM t ORDER BY v").fetchall()
+
+    finally:
+        conn.close()
+
+    good, bad, after = (item.future for item in batch)
+    assert good.result().rowcount == after.result().rowcount == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        bad.result()
+
+    assert rows == [(1,), (2,)]
+    stats = db.write_stats()
+    assert (stats["batch_fallbacks"], stats["failed"]) == (1, 1)
+
+
+def test_awaited_write_is_readable(make_db):
+    db = make_db("awaited")
+
+    async def scenario() -> None:
+        result = await db.submit_write(SQLTask("INSERT INTO t (v) VALUES (7)"))
+        assert result.rowcount == 1
+        with db.read() as conn:
+            assert conn.execute("SELECT v FROM t").fetchall() == [(7,)]
+
+        with pytest.raises(sqlite3.IntegrityError):
+            await db.submit_write(SQLTask("INSERT INTO t (v) VALUES (7)"))
+
+    asyncio.run(scenario())
+
+
+def test_flush_waits_for_earlier_writes(make_db, monkeypatch: pytest.MonkeyPatch):
+    db = make_db("flushed")
+    execute_batch = db._execute_batch.__func__
+
+    def slow(cls, conn, batch):
+        time.sleep(0.01)
+        execute_batch(cls, conn, batch)
+
+    monkeypatch.setattr(db, "_batch_size", 1)
+    monkeypatch.setattr(db, "_execute_batch", classmethod(slow))
+
+    async def scenario() -> list[WriteFuture]:
+        futures = [
+            db.submit_write(SQLTask(f"INSERT INTO t (v) VALUES ({v})"))
+            for v in range(10)
+        ]
+        await db.flush()
+        return futures
+
+    futures = asyncio.run(scenario())
+    assert all(future.done() for future in futures)
+    with db.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (10,)